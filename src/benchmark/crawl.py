@@ -0,0 +1,168 @@
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import ClassVar
+
+import typer
+
+from benchmark.site import SyntheticSite
+from download import BackendName
+from smashdown.client import (
+    FileWriter,
+    GameInfo,
+    LxmlParser,
+    PageParser,
+    Parser,
+    SmashClient,
+    SongInfo,
+)
+from smashdown.database import Database, DatabaseBackend, Site
+from smashdown.downloader import Downloader
+from smashdown.sharded_database import ShardedDatabase
+from smashdown.sqlite_database import SQLiteDatabase
+from smashdown.updater import Updater
+
+app = typer.Typer(add_completion=False)
+
+
+@dataclass
+class Stopwatch:
+    total: float = 0.0
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.total += time.perf_counter() - start
+
+
+class TimedDatabase(Database):
+    save_stopwatch: ClassVar[Stopwatch] = Stopwatch()
+
+    def save(self) -> None:
+        with self.save_stopwatch.measure():
+            super().save()
+
+
+class TimedSQLiteDatabase(SQLiteDatabase):
+    save_stopwatch: ClassVar[Stopwatch] = TimedDatabase.save_stopwatch
+
+    def save(self) -> None:
+        with self.save_stopwatch.measure():
+            super().save()
+
+
+class TimedShardedDatabase(ShardedDatabase):
+    save_stopwatch: ClassVar[Stopwatch] = TimedDatabase.save_stopwatch
+
+    def save(self) -> None:
+        with self.save_stopwatch.measure():
+            super().save()
+
+
+@dataclass
+class TimedParser(PageParser):
+    parser: PageParser
+    stopwatch: Stopwatch
+
+    def get_game_list_from_home_page(self, html: str) -> list[GameInfo]:
+        with self.stopwatch.measure():
+            return self.parser.get_game_list_from_home_page(html)
+
+    def get_song_list_from_game_page(self, html: str) -> list[SongInfo]:
+        with self.stopwatch.measure():
+            return self.parser.get_song_list_from_game_page(html)
+
+
+@app.command()
+def crawl(
+    game_count: int = typer.Option(1_000, help="number of games of the site"),
+    songs_per_game: int = typer.Option(10, help="average number of songs per game"),
+    brstm_size: int = typer.Option(3_000_000, help="average size of the brstm files"),
+    download_count: int = typer.Option(100, help="number of brstm files to download"),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    journal: bool = typer.Option(False, help="use the journal mode of the json db"),
+    lxml: bool = typer.Option(False, help="use the lxml parser"),
+    workers: int = typer.Option(1, help="number of workers of the last two stages"),
+) -> None:
+    """Run `update-game-list`, `update-game-song-lists` and `download-musics`
+    against a local synthetic site, without naps, and report the throughput
+    of each stage."""
+    site = SyntheticSite(
+        game_count=game_count, songs_per_game=songs_per_game, brstm_size=brstm_size
+    )
+    site.start()
+    print(
+        f"synthetic site: {game_count} games, {site.song_count} songs,"
+        f" brstm files of about {brstm_size / 1e6:.1f} MB"
+    )
+    print(
+        f"{'stage':<24} {'requests':>9} {'time (s)':>9} {'req/s':>8} {'MB/s':>8}"
+        f" {'db save (s)':>12} {'parse (s)':>10}"
+    )
+    parse_stopwatch = Stopwatch()
+    save_stopwatch = TimedDatabase.save_stopwatch
+    try:
+        with TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            (tmp_dir / "html").mkdir()
+            db = _build_db(tmp_dir, site.base_url, backend, journal)
+            client = SmashClient(
+                base_url=site.base_url,
+                writer=FileWriter(output_dir=tmp_dir / "html", timestamp=0),
+                limiter=None,
+                parser=TimedParser(LxmlParser() if lxml else Parser(), parse_stopwatch),
+            )
+            updater = Updater(client=client, db=db)
+            downloader = Downloader(client=client, db=db, output_dir=tmp_dir / "brstm")
+            stages: list[tuple[str, Callable[[], None]]] = [
+                ("update-game-list", updater.update_game_list),
+                (
+                    "update-game-song-lists",
+                    lambda: updater.update_game_song_lists(game_count, workers),
+                ),
+                (
+                    "download-musics",
+                    lambda: downloader.download_brstm_files(download_count, workers),
+                ),
+            ]
+            for name, stage in stages:
+                request_count, bytes_sent = site.request_count, site.bytes_sent
+                save_time, parse_time = save_stopwatch.total, parse_stopwatch.total
+                start = time.perf_counter()
+                stage()
+                elapsed = time.perf_counter() - start
+                requests = site.request_count - request_count
+                megabytes = (site.bytes_sent - bytes_sent) / 1e6
+                print(
+                    f"{name:<24} {requests:>9} {elapsed:>9.2f}"
+                    f" {requests / elapsed:>8.1f} {megabytes / elapsed:>8.1f}"
+                    f" {save_stopwatch.total - save_time:>12.2f}"
+                    f" {parse_stopwatch.total - parse_time:>10.2f}"
+                )
+    finally:
+        site.stop()
+
+
+def _build_db(
+    tmp_dir: Path, base_url: str, backend: BackendName, journal: bool
+) -> DatabaseBackend:
+    if backend == BackendName.sqlite:
+        return TimedSQLiteDatabase(tmp_dir / "db.sqlite", base_url=base_url)
+    if backend == BackendName.sharded:
+        return TimedShardedDatabase(tmp_dir / "db", base_url=base_url)
+    db = TimedDatabase(site=Site(base_url=base_url)).with_output_file(
+        tmp_dir / "db.json"
+    )
+    if journal:
+        db.with_journal()
+    return db
+
+
+if __name__ == "__main__":
+    app()
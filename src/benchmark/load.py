@@ -0,0 +1,120 @@
+import gc
+import hashlib
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from typing import Any
+
+import pydantic
+import typer
+
+from smashdown.database import (
+    FORMAT_VERSION,
+    Checksum,
+    Database,
+    _gc_paused,
+    get_checksum_file,
+)
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def load(
+    song_count: int = typer.Option(1_000_000, help="number of songs in the database"),
+    songs_per_game: int = typer.Option(20, help="number of songs per game"),
+) -> None:
+    """Compare the startup time of the validated and fast database loads."""
+    with TemporaryDirectory() as tmp:
+        db_file = Path(tmp) / "db.json"
+        start = time.perf_counter()
+        write_database_file(db_file, song_count, songs_per_game)
+        size = db_file.stat().st_size / 1e6
+        print(
+            f"{song_count} songs, {size:.1f} MB written in"
+            f" {time.perf_counter() - start:.1f} s"
+        )
+
+        _time_load("validated (json.load + validate_python)", _load_legacy, db_file)
+        _time_load(
+            "validated (model_validate_json)",
+            lambda file: Database.build_from_file(file, fast_load=False),
+            db_file,
+        )
+        _time_load("fast (stdlib json)", _load_fast_with_stdlib_json, db_file)
+        _time_load("fast (fastest json codec)", Database.build_from_file, db_file)
+
+
+def write_database_file(db_file: Path, song_count: int, songs_per_game: int) -> None:
+    """Write a synthetic database file (and its checksum) without pydantic."""
+    rand = Random(123)
+    games: list[dict[str, Any]] = []
+    for song_id in range(1, song_count + 1):
+        if (song_id - 1) % songs_per_game == 0:
+            game_id = len(games) + 1
+            games.append(
+                dict(
+                    id=game_id,
+                    title=f"Game {game_id}",
+                    songs=[],
+                    is_deleted_from_site=False,
+                    download_timestamps=[1_600_000_000 + rand.randint(0, 10**7)],
+                    old_visits=None,
+                )
+            )
+        download_info = None
+        if rand.random() < 0.5:
+            download_info = dict(
+                location=f"{game_id}_game/{song_id}_song.brstm",
+                timestamp=1_600_000_000 + song_id,
+                file_md5=f"{song_id:032x}",
+            )
+        games[-1]["songs"].append(
+            dict(
+                id=song_id,
+                title=f"Song {song_id}",
+                is_deleted_from_site=False,
+                brstm_download_info=download_info,
+                brstm_download_failure=None,
+                added_timestamp=None,
+            )
+        )
+    site = dict(
+        base_url="http://idontexist.net",
+        games=games,
+        download_timestamps=[1_600_000_000],
+        old_visits=None,
+    )
+    data = json.dumps(dict(site=site), indent=2).encode()
+    db_file.write_bytes(data)
+    checksum = Checksum(
+        format_version=FORMAT_VERSION, md5=hashlib.md5(data).hexdigest()
+    )
+    get_checksum_file(db_file).write_text(checksum.model_dump_json())
+
+
+def _load_legacy(file: Path) -> Database:
+    with file.open() as fh:
+        return pydantic.TypeAdapter(Database).validate_python(json.load(fh))
+
+
+def _load_fast_with_stdlib_json(file: Path) -> Database:
+    with _gc_paused():
+        return Database._construct(json.loads(file.read_bytes()))
+
+
+def _time_load(name: str, loader: Callable[[Path], Database], db_file: Path) -> None:
+    gc.collect()
+    start = time.perf_counter()
+    db = loader(db_file)
+    duration = time.perf_counter() - start
+    assert db.site.games
+    print(f"{name:>40}: {duration:6.2f} s")
+    del db
+
+
+if __name__ == "__main__":
+    app()
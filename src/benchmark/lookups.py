@@ -0,0 +1,73 @@
+import time
+from collections.abc import Callable, Sequence
+from pathlib import Path
+from random import Random
+from typing import Any
+
+import typer
+
+from benchmark.synthetic import build_database
+from smashdown.database import Database
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def lookups(
+    song_counts: list[int] = typer.Option(
+        [1_000, 10_000, 100_000], help="catalogue sizes (number of songs) to test"
+    ),
+    songs_per_game: int = typer.Option(20, help="number of songs per game"),
+    lookup_count: int = typer.Option(10_000, help="number of lookups per size"),
+) -> None:
+    """Time the id and path lookups of the database for growing catalogues.
+
+    With the indexes, the time per lookup should stay flat.
+    """
+    print(
+        f"{'songs':>10} {'index build (ms)':>17} {'game (us)':>10}"
+        f" {'song (us)':>10} {'game of song (us)':>18} {'path (us)':>10}"
+    )
+    for song_count in song_counts:
+        game_count = max(1, song_count // songs_per_game)
+        db = build_database(game_count=game_count, songs_per_game=songs_per_game)
+        song_total = game_count * songs_per_game
+        rand = Random(123)
+        game_ids = [rand.randint(1, game_count) for _ in range(lookup_count)]
+        song_ids = [rand.randint(1, song_total) for _ in range(lookup_count)]
+        paths = _get_downloaded_paths(db, rand, lookup_count)
+
+        start = time.perf_counter()
+        db.get_game_from_id(1)
+        build = time.perf_counter() - start
+
+        game_time = _time_per_call(db.get_game_from_id, game_ids)
+        song_time = _time_per_call(db.get_song_from_id, song_ids)
+        game_of_song_time = _time_per_call(db.get_game_from_song_id, song_ids)
+        path_time = _time_per_call(db.get_song_from_downloaded_path, paths)
+        print(
+            f"{song_total:>10} {build * 1e3:>17.1f} {game_time * 1e6:>10.2f}"
+            f" {song_time * 1e6:>10.2f} {game_of_song_time * 1e6:>18.2f}"
+            f" {path_time * 1e6:>10.2f}"
+        )
+
+
+def _get_downloaded_paths(db: Database, rand: Random, count: int) -> list[Path]:
+    paths = [
+        song.brstm_download_info.location
+        for game in db.site.games
+        for song in game.songs
+        if song.brstm_download_info is not None
+    ]
+    return [rand.choice(paths) for _ in range(count)]
+
+
+def _time_per_call(function: Callable[[Any], object], args: Sequence[Any]) -> float:
+    start = time.perf_counter()
+    for arg in args:
+        function(arg)
+    return (time.perf_counter() - start) / len(args)
+
+
+if __name__ == "__main__":
+    app()
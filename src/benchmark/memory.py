@@ -0,0 +1,76 @@
+import multiprocessing
+import resource
+import time
+from collections.abc import Callable
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import typer
+
+from benchmark.load import write_database_file
+from smashdown.catalogue import Catalogue
+from smashdown.database import Database
+
+app = typer.Typer(add_completion=False)
+
+
+def _load_nothing(db_file: Path) -> object:
+    return None
+
+
+def _load_database(db_file: Path) -> object:
+    return Database.build_from_file(db_file)
+
+
+def _load_catalogue(db_file: Path) -> object:
+    return Catalogue.build_from_file(db_file)
+
+
+LOADERS: dict[str, Callable[[Path], object]] = {
+    "imports only": _load_nothing,
+    "Database (fast load)": _load_database,
+    "Catalogue": _load_catalogue,
+}
+
+
+@app.command()
+def memory(
+    song_count: int = typer.Option(1_000_000, help="number of songs in the database"),
+    songs_per_game: int = typer.Option(20, help="number of songs per game"),
+) -> None:
+    """Compare the peak memory (RSS) and the time of the full database load
+    and of the compact catalogue used by the read-only commands.
+
+    Each load runs in a new process, so that its peak RSS is measured alone.
+    """
+    with TemporaryDirectory() as tmp:
+        db_file = Path(tmp) / "db.json"
+        write_database_file(db_file, song_count, songs_per_game)
+        size = db_file.stat().st_size / 1e6
+        print(f"{song_count} songs, {size:.1f} MB")
+        print(f"{'load':>22} {'time (s)':>9} {'peak RSS (MB)':>14}")
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            for name in LOADERS:
+                duration, peak = pool.apply(_measure, (name, db_file))
+                print(f"{name:>22} {duration:>9.2f} {peak:>14.0f}")
+
+
+def _measure(name: str, db_file: Path) -> tuple[float, float]:
+    start = time.perf_counter()
+    LOADERS[name](db_file)
+    duration = time.perf_counter() - start
+    return duration, _get_peak_rss()
+
+
+def _get_peak_rss() -> float:
+    """Return the peak RSS of the process, in MB."""
+    # unlike ru_maxrss, not inherited from the parent process
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1e3
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,54 @@
+import time
+from collections.abc import Callable
+
+import typer
+
+from benchmark.synthetic import build_game_page, build_home_page
+from smashdown.client import LxmlParser, PageParser, Parser
+
+app = typer.Typer(add_completion=False)
+
+PARSERS: dict[str, PageParser] = {"bs4": Parser(), "lxml": LxmlParser()}
+
+
+@app.command()
+def parser(
+    game_count: int = typer.Option(5_000, help="number of games of the home page"),
+    song_count: int = typer.Option(500, help="number of songs of the game page"),
+    repeat: int = typer.Option(3, help="number of parses per page (the best is kept)"),
+) -> None:
+    """Time the parsers on a large synthetic home page and game page, and check
+    that they return the same results."""
+    home_page = build_home_page(game_count)
+    game_page = build_game_page(song_count)
+    print(
+        f"home page: {game_count} games ({len(home_page) / 1e6:.1f} MB),"
+        f" game page: {song_count} songs ({len(game_page) / 1e3:.0f} kB)"
+    )
+    print(f"{'parser':>8} {'home page (ms)':>15} {'game page (ms)':>15}")
+    results = {}
+    for name, page_parser in PARSERS.items():
+        home_time, games = _best_time(
+            lambda: page_parser.get_game_list_from_home_page(home_page), repeat
+        )
+        game_time, songs = _best_time(
+            lambda: page_parser.get_song_list_from_game_page(game_page), repeat
+        )
+        results[name] = (games, songs)
+        print(f"{name:>8} {home_time * 1e3:>15.1f} {game_time * 1e3:>15.1f}")
+    if len({repr(result) for result in results.values()}) != 1:
+        print("The parsers return different results.")
+        raise typer.Exit(code=1)
+
+
+def _best_time(function: Callable[[], object], repeat: int) -> tuple[float, object]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,172 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Optional
+
+import typer
+
+from benchmark.synthetic import build_history
+from smashdown.archive import (
+    HOME_PAGE,
+    HtmlArchive,
+    PageNotArchived,
+    parse_game_page,
+)
+from smashdown.client import LxmlParser, Parser, SongInfo
+from smashdown.database import Database, Game, Site
+from smashdown.replay import ReplayClient
+from smashdown.scheduler import RevisitScheduler
+from smashdown.updater import Updater
+
+app = typer.Typer(add_completion=False)
+
+DAY = 24 * 3600
+
+# returns the games to visit at a time, within a budget of requests
+GameSelector = Callable[[Database, int, int], list[Game]]
+
+
+def select_by_last_checked(db: Database, timestamp: int, budget: int) -> list[Game]:
+    return db.get_games_by_last_checked(budget)
+
+
+def select_by_change_rate(db: Database, timestamp: int, budget: int) -> list[Game]:
+    scheduler = RevisitScheduler(clock=lambda: timestamp)
+    return scheduler.get_games_to_visit(db.get_games_by_last_checked(None), budget)
+
+
+ORDERS: dict[str, GameSelector] = {
+    "last-checked": select_by_last_checked,
+    "change-rate": select_by_change_rate,
+}
+
+
+@dataclass
+class CrawlResult:
+    requests: int = 0
+    # time the new songs were found, by id
+    found: dict[int, int] = field(default_factory=dict)
+
+
+@app.command()
+def revisit(
+    archive_dir: Optional[Path] = typer.Option(
+        None, help="html archive to replay (by default, a synthetic history)"
+    ),
+    game_count: int = typer.Option(1_000, help="number of games of the synthetic site"),
+    days: int = typer.Option(365, help="number of days of the synthetic history"),
+    budget: int = typer.Option(20, help="number of game pages visited per day"),
+    warm_up: float = typer.Option(
+        0.5,
+        help="part of the history crawled in the 'last-checked' order before the evaluation",
+    ),
+    lxml: bool = typer.Option(False, help="use the lxml parser"),
+) -> None:
+    """Replay the history of an html archive to compare the orders of the
+    game visits: how many new songs each one finds, and how long after they
+    appeared, with the same number of requests.
+
+    The archive tells what each game page was at any time.  The site is
+    crawled from the start of the history with --budget game visits per day
+    (and a visit of the home page) in the 'last-checked' order, then the
+    rest of the history is crawled again from that state in each order.
+    """
+    with TemporaryDirectory() as tmp:
+        if archive_dir is None:
+            archive = HtmlArchive(Path(tmp))
+            build_history(archive, game_count, days)
+            print(f"synthetic history: {game_count} games, {days} days")
+        else:
+            archive = HtmlArchive(archive_dir)
+        client = ReplayClient(
+            archive=archive, parser=LxmlParser() if lxml else Parser()
+        )
+        client.parse_all()
+        home_page_timestamps = [
+            entry.timestamp for entry in archive.get_history(HOME_PAGE)
+        ]
+        start, end = min(home_page_timestamps), max(home_page_timestamps)
+        evaluation_start = start + int((end - start) * warm_up)
+        first_seen = _get_first_seen(archive, client)
+
+        db = Database(site=Site(base_url="http://replay"))
+        _crawl(db, client, select_by_last_checked, start, evaluation_start, budget)
+        appeared = sum(
+            1 for timestamp in first_seen.values() if timestamp > evaluation_start
+        )
+        print(
+            f"evaluation: {(end - evaluation_start) // DAY} days, {budget} game"
+            f" visits per day, {appeared} songs added to the site"
+        )
+        print(
+            f"{'order':<14} {'requests':>9} {'new songs':>10}"
+            f" {'songs/request':>14} {'mean delay (days)':>18}"
+        )
+        for name, select in ORDERS.items():
+            copy = Database(site=db.site.model_copy(deep=True))
+            result = _crawl(copy, client, select, evaluation_start, end, budget)
+            # not the songs of the site before the evaluation, found late
+            new_songs = {
+                song_id: timestamp
+                for song_id, timestamp in result.found.items()
+                if first_seen[song_id] > evaluation_start
+            }
+            found = len(new_songs)
+            delays = [
+                timestamp - first_seen[song_id]
+                for song_id, timestamp in new_songs.items()
+            ]
+            mean_delay = sum(delays) / len(delays) / DAY if delays else 0.0
+            print(
+                f"{name:<14} {result.requests:>9} {found:>10}"
+                f" {found / max(1, result.requests):>14.3f} {mean_delay:>18.1f}"
+            )
+
+
+def _get_first_seen(archive: HtmlArchive, client: ReplayClient) -> dict[int, int]:
+    """Return the time of the first version of a game page listing each song."""
+    first_seen: dict[int, int] = {}
+    for entry in archive.get_entries():
+        game_id = parse_game_page(entry.page)
+        if game_id is None:
+            continue
+        client.timestamp = entry.timestamp
+        for song in client.get_song_list(game_id):
+            first_seen.setdefault(song.id, entry.timestamp)
+    return first_seen
+
+
+def _crawl(
+    db: Database,
+    client: ReplayClient,
+    select: GameSelector,
+    start: int,
+    end: int,
+    budget: int,
+) -> CrawlResult:
+    """Crawl the site as it was from `start` to `end`, with a visit of the
+    home page and `budget` game visits per day."""
+    result = CrawlResult()
+    timestamp = start
+    updater = Updater(client=client, db=db, clock=lambda: timestamp)
+    while timestamp < end:
+        client.timestamp = timestamp
+        updater.update_game_list()
+        for game in select(db, timestamp, budget):
+            known_song_ids = {song.id for song in game.songs}
+            song_list: list[SongInfo] | None
+            try:
+                song_list = client.get_song_list(game.id)
+            except PageNotArchived:
+                song_list = None
+            updater.record_song_list(game, song_list, timestamp)
+            result.requests += 1
+            for song in song_list or ():
+                if song.id not in known_song_ids:
+                    result.found[song.id] = timestamp
+        timestamp += DAY
+    return result
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,84 @@
+import time
+from random import Random
+
+import typer
+
+from benchmark.synthetic import build_database
+from smashdown.database import Game
+
+app = typer.Typer(add_completion=False)
+
+START = 1_600_000_000
+
+
+@app.command()
+def scheduling(
+    game_counts: list[int] = typer.Option(
+        [10_000, 50_000, 100_000], help="numbers of games to test"
+    ),
+    max_count: int = typer.Option(100, help="number of games taken per lookup"),
+    visit_count: int = typer.Option(1_000, help="number of visits per size"),
+) -> None:
+    """Time the choice of the next games to visit for growing sites.
+
+    'sort' is the time to take the first `max_count` games by sorting all of
+    them, 'build' the time to build the frontier on the first lookup, and
+    the other columns the time of a visit followed by a lookup of the next
+    `max_count` games: visits recorded in order (each one newer than the
+    others, like a crawl), and visits older than the last one (recorded late
+    by a worker, or read from another database).  With the heap of the
+    visited games, none of them should grow with the number of games.
+    """
+    print(
+        f"{'games':>8} {'sort (ms)':>10} {'build (ms)':>11}"
+        f" {'lookup (us)':>12} {'in order (us)':>14} {'out of order (us)':>18}"
+    )
+    for game_count in game_counts:
+        db = build_database(game_count=game_count, songs_per_game=1)
+        rand = Random(123)
+
+        start = time.perf_counter()
+        _sort_games(db.get_games(), max_count)
+        sort = time.perf_counter() - start
+
+        start = time.perf_counter()
+        db.get_games_by_last_checked(max_count)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(visit_count):
+            db.get_games_by_last_checked(max_count)
+        lookup = (time.perf_counter() - start) / visit_count
+
+        timestamp = START + 20_000_000
+        start = time.perf_counter()
+        for _ in range(visit_count):
+            timestamp += 1
+            (game,) = db.get_games_by_last_checked(1)
+            db.add_game_visit(game, timestamp)
+            db.get_games_by_last_checked(max_count)
+        in_order = (time.perf_counter() - start) / visit_count
+
+        games = db.get_games()
+        start = time.perf_counter()
+        for _ in range(visit_count):
+            game = rand.choice(games)
+            db.add_game_visit(game, START + rand.randint(0, 10_000_000))
+            db.get_games_by_last_checked(max_count)
+        out_of_order = (time.perf_counter() - start) / visit_count
+        print(
+            f"{game_count:>8} {sort * 1e3:>10.1f} {build * 1e3:>11.1f}"
+            f" {lookup * 1e6:>12.1f} {in_order * 1e6:>14.1f}"
+            f" {out_of_order * 1e6:>18.1f}"
+        )
+
+
+def _sort_games(games: list[Game], count: int) -> list[Game]:
+    """Return the first `count` games to visit by sorting all the games."""
+    games = [game for game in games if not game.is_deleted_from_site]
+    games.sort(key=lambda game: (game.last_checked is not None, game.last_checked))
+    return games[:count]
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,81 @@
+import time
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+
+import typer
+
+from benchmark.synthetic import build_database
+from smashdown.database import Database, DatabaseBackend, Song
+from smashdown.sharded_database import ShardedDatabase
+
+app = typer.Typer(add_completion=False)
+
+START = 1_600_000_000
+
+
+@app.command()
+def sharded(
+    song_counts: list[int] = typer.Option(
+        [10_000, 100_000, 1_000_000], help="numbers of songs to test"
+    ),
+    songs_per_game: int = typer.Option(20, help="number of songs per game"),
+    save_count: int = typer.Option(20, help="number of saves per size"),
+) -> None:
+    """Time the save of the database after the visit of one game (a new song
+    and a new visit, like `update-game-song-lists` for a single game), and
+    its open, for growing catalogues.
+
+    The json database rewrites the whole file, the journal mode appends the
+    changes (but the file is rewritten on compaction, and read in full on
+    open), and the sharded database rewrites the shard of the game and its
+    index: its save time should not grow with the catalogue.
+    """
+    print(
+        f"{'songs':>9} {'json save (ms)':>15} {'journal save (ms)':>18}"
+        f" {'sharded save (ms)':>18} {'json open (s)':>14} {'sharded open (s)':>17}"
+    )
+    for song_count in song_counts:
+        with TemporaryDirectory() as tmp:
+            tmp_dir = Path(tmp)
+            rand = Random(123)
+            game_count = song_count // songs_per_game
+            db = build_database(game_count=game_count, songs_per_game=songs_per_game)
+            db.with_output_file(tmp_dir / "db.json").save()
+            ShardedDatabase.build_from_database(tmp_dir / "db", db)
+
+            start = time.perf_counter()
+            json_db = Database.build_from_file(tmp_dir / "db.json")
+            json_open = time.perf_counter() - start
+            json_save = _time_saves(json_db, rand, game_count, save_count)
+            journal_db = json_db.with_journal(compaction_threshold=1_000_000)
+            journal_save = _time_saves(journal_db, rand, game_count, save_count)
+
+            start = time.perf_counter()
+            sharded_db = ShardedDatabase(tmp_dir / "db")
+            sharded_open = time.perf_counter() - start
+            sharded_save = _time_saves(sharded_db, rand, game_count, save_count)
+        print(
+            f"{song_count:>9} {json_save * 1e3:>15.1f} {journal_save * 1e3:>18.2f}"
+            f" {sharded_save * 1e3:>18.2f} {json_open:>14.2f} {sharded_open:>17.2f}"
+        )
+
+
+def _time_saves(
+    db: DatabaseBackend, rand: Random, game_count: int, save_count: int
+) -> float:
+    """Return the mean time of a save after the visit of a random game."""
+    total = 0.0
+    for _ in range(save_count):
+        game = db.get_game_from_id(rand.randint(1, game_count))
+        song_id = 10_000_000 + rand.randrange(1_000_000_000)
+        db.add_song(game, Song(id=song_id, title=f"Song {song_id}"))
+        db.add_game_visit(game, START + rand.randint(0, 10_000_000))
+        start = time.perf_counter()
+        db.save()
+        total += time.perf_counter() - start
+    return total / save_count
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,114 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from typing import Any
+
+from benchmark.synthetic import build_title, render_game_page, render_home_page
+
+
+@dataclass
+class SyntheticGame:
+    id: int
+    title: str
+    songs: list[tuple[int, str]]
+
+
+@dataclass
+class SyntheticSite:
+    """Local HTTP server generating a synthetic site, with the markup of the
+    real site: `game_count` games with about `songs_per_game` songs each, and
+    brstm files of about `brstm_size` bytes.
+
+    The number of requests and of bytes sent are counted in `request_count`
+    and `bytes_sent`.
+    """
+
+    game_count: int
+    songs_per_game: int = 10
+    brstm_size: int = 3_000_000
+    seed: int = 123
+    request_count: int = field(default=0, init=False)
+    bytes_sent: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        rand = Random(self.seed)
+        self.games: dict[int, SyntheticGame] = {}
+        self.brstm_sizes: dict[int, int] = {}
+        song_id = 0
+        for game_id in range(1, self.game_count + 1):
+            songs = []
+            for _ in range(rand.randint(0, 2 * self.songs_per_game)):
+                song_id += 1
+                songs.append((song_id, build_title(rand)))
+                self.brstm_sizes[song_id] = rand.randint(
+                    self.brstm_size // 2, self.brstm_size * 3 // 2
+                )
+            self.games[game_id] = SyntheticGame(game_id, build_title(rand), songs)
+        self.home_page = render_home_page(
+            [(game.id, game.title, len(game.songs)) for game in self.games.values()]
+        ).encode()
+        # the brstm files are slices of the same random bytes
+        self._payload = rand.randbytes(self.brstm_size * 3 // 2)
+        self._lock = threading.Lock()
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                data, content_type = site.get_content(self.path)
+                if data is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with site._lock:
+                    site.request_count += 1
+                    site.bytes_sent += len(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    @property
+    def song_count(self) -> int:
+        return len(self.brstm_sizes)
+
+    def get_content(self, path: str) -> tuple[bytes | None, str]:
+        if path == "/":
+            return self.home_page, "text/html; charset=utf-8"
+        if m := re.fullmatch(r"/game/(\d+)", path):
+            game = self.games.get(int(m.group(1)))
+            if game is None:
+                return None, ""
+            return render_game_page(game.songs).encode(), "text/html; charset=utf-8"
+        if m := re.fullmatch(r"/brstm/(\d+)", path):
+            size = self.brstm_sizes.get(int(m.group(1)))
+            if size is None:
+                return None, ""
+            return self._payload[:size], "application/octet-stream"
+        return None, ""
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
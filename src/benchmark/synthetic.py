@@ -0,0 +1,153 @@
+from pathlib import Path
+from random import Random
+
+from smashdown.archive import HOME_PAGE, HtmlArchive, get_game_page
+from smashdown.database import Database, FileDownloadInfo, Game, Site, Song
+
+
+def build_database(
+    game_count: int,
+    songs_per_game: int,
+    downloaded_ratio: float = 0.5,
+    visited_ratio: float = 0.5,
+    seed: int = 123,
+) -> Database:
+    """Return a synthetic database, with `game_count * songs_per_game` songs."""
+    rand = Random(seed)
+    site = Site(base_url="http://idontexist.net", download_timestamps=[1_600_000_000])
+    song_id = 0
+    for game_id in range(1, game_count + 1):
+        songs: list[Song] = []
+        for _ in range(songs_per_game):
+            song_id += 1
+            download_info = None
+            if rand.random() < downloaded_ratio:
+                download_info = FileDownloadInfo(
+                    location=Path(f"{game_id}_game/{song_id}_song.brstm"),
+                    timestamp=1_600_000_000 + song_id,
+                    file_md5=f"{song_id:032x}",
+                )
+            songs.append(
+                Song(
+                    id=song_id,
+                    title=f"Song {song_id}",
+                    brstm_download_info=download_info,
+                )
+            )
+        timestamps: list[int] = []
+        if rand.random() < visited_ratio:
+            timestamps = [1_600_000_000 + rand.randint(0, 10_000_000)]
+        site.games.append(
+            Game(
+                id=game_id,
+                title=f"Game {game_id}",
+                songs=songs,
+                download_timestamps=timestamps,
+            )
+        )
+    return Database(site=site).with_random(Random(seed))
+
+
+# (share of the games, new songs per day) of the games of a synthetic history:
+# most games never change, a few are active
+GAME_ACTIVITIES = [(0.8, 0.0), (0.15, 1 / 60), (0.05, 1 / 4)]
+
+
+def build_history(
+    archive: HtmlArchive,
+    game_count: int,
+    days: int,
+    start: int = 1_600_000_000,
+    seed: int = 123,
+) -> None:
+    """Fill the `archive` with a synthetic history of the site: the home page
+    every day, and each game page when it changes.  Each game gains songs at
+    a constant rate picked from `GAME_ACTIVITIES`."""
+    rand = Random(seed)
+    shares = [share for share, _ in GAME_ACTIVITIES]
+    rates = [rate for _, rate in GAME_ACTIVITIES]
+    titles = [build_title(rand) for _ in range(game_count)]
+    game_rates = rand.choices(rates, weights=shares, k=game_count)
+    songs: list[list[tuple[int, str]]] = [[] for _ in range(game_count)]
+    song_id = 0
+    for day in range(days):
+        timestamp = start + day * 24 * 3600
+        for i in range(game_count):
+            if day == 0:
+                new_song_count = rand.randint(1, 20)
+            else:
+                new_song_count = int(rand.random() < game_rates[i])
+            for _ in range(new_song_count):
+                song_id += 1
+                songs[i].append((song_id, build_title(rand)))
+            if new_song_count:
+                archive.add_page(
+                    get_game_page(i + 1), timestamp, render_game_page(songs[i])
+                )
+        home_page = render_home_page(
+            [(i + 1, titles[i], len(songs[i])) for i in range(game_count)]
+        )
+        archive.add_page(HOME_PAGE, timestamp, home_page)
+
+
+TITLE_WORDS = ["Main", "Theme", "Battle", "Forest", "Café", "Tom & Jerry", "<Boss>"]
+
+
+def build_home_page(game_count: int, seed: int = 123) -> str:
+    """Return a synthetic home page listing `game_count` games."""
+    rand = Random(seed)
+    return render_home_page(
+        [
+            (game_id, build_title(rand), rand.randint(0, 50))
+            for game_id in range(1, game_count + 1)
+        ]
+    )
+
+
+def build_game_page(song_count: int, seed: int = 123) -> str:
+    """Return a synthetic game page listing `song_count` songs."""
+    rand = Random(seed)
+    return render_game_page(
+        [(song_id, build_title(rand)) for song_id in range(1, song_count + 1)]
+    )
+
+
+def build_title(rand: Random) -> str:
+    return " ".join(rand.choices(TITLE_WORDS, k=rand.randint(1, 4)))
+
+
+def render_home_page(games: list[tuple[int, str, int]]) -> str:
+    """Return the home page listing the `games` (id, title, song count), with
+    the markup of the site."""
+    rows = []
+    for game_id, title, song_count in games:
+        plural = "" if song_count == 1 else "s"
+        rows.append(
+            f'<tr><td style="text-align:left;"><a href="/game/{game_id}">'
+            f"{_escape(title)}</a></td><td>{song_count} song{plural}</td></tr>"
+        )
+    return _render_page(rows)
+
+
+def render_game_page(songs: list[tuple[int, str]]) -> str:
+    """Return a game page listing the `songs` (id, title), with the markup of
+    the site."""
+    rows = [
+        f'<tr><td style="text-align:left;"><a href="/song/{song_id}">'
+        f"{_escape(title)}</a></td><td>{len(title) % 9 + 1}:00</td></tr>"
+        for song_id, title in songs
+    ]
+    return _render_page(rows)
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _render_page(rows: list[str]) -> str:
+    return (
+        "<!DOCTYPE HTML>\n<html><head><title>Site</title></head><body>\n"
+        '<a href="/">Home</a>\n<table>\n'
+        + "\n".join(rows)
+        + "\n</table>\n</body></html>\n"
+    )
@@ -0,0 +1,58 @@
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import typer
+
+from benchmark.synthetic import build_database
+from smashdown.database import KEPT_VISITS, Database
+
+app = typer.Typer(add_completion=False)
+
+START = 1_600_000_000
+DAY = 24 * 3600
+
+
+@app.command()
+def visits(
+    crawl_counts: list[int] = typer.Option(
+        [10, 100, 1_000], help="numbers of crawls of the site to test"
+    ),
+    game_count: int = typer.Option(5_000, help="number of games"),
+    songs_per_game: int = typer.Option(20, help="number of songs per game"),
+) -> None:
+    """Compare the size and the load time of a json database whose games have
+    been visited once per crawl, with all their visits and with the last
+    `KEPT_VISITS` (after `compact-db`)."""
+    print(
+        f"{'crawls':>7} {'all (MB)':>9} {'kept (MB)':>10}"
+        f" {'all load (s)':>13} {'kept load (s)':>14}"
+    )
+    for crawl_count in crawl_counts:
+        db = build_database(game_count=game_count, songs_per_game=songs_per_game)
+        timestamps = [START + i * DAY for i in range(crawl_count)]
+        db.site.download_timestamps = list(timestamps)
+        for game in db.site.games:
+            game.download_timestamps = list(timestamps)
+        with TemporaryDirectory() as tmp:
+            db_file = Path(tmp) / "db.json"
+            db.with_output_file(db_file).save()
+            all_size, all_load = _measure(db_file)
+            db.drop_old_visits(KEPT_VISITS)
+            db.compact()
+            kept_size, kept_load = _measure(db_file)
+        print(
+            f"{crawl_count:>7} {all_size:>9.1f} {kept_size:>10.1f}"
+            f" {all_load:>13.2f} {kept_load:>14.2f}"
+        )
+
+
+def _measure(db_file: Path) -> tuple[float, float]:
+    """Return the size (in MB) and the load time of the database file."""
+    start = time.perf_counter()
+    Database.build_from_file(db_file)
+    return db_file.stat().st_size / 1e6, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    app()
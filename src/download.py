@@ -1,20 +1,66 @@
+import asyncio
 import datetime
 import logging
+import signal
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
+from enum import Enum
 from pathlib import Path
+from typing import Optional
 
 import typer
 
-from smashdown.client import Client, FileWriter, SmashClient
-from smashdown.database import Database, Site
-from smashdown.downloader import Downloader
+from smashdown.archive import ArchiveWriter, HtmlArchive
+from smashdown.async_client import AsyncSmashClient
+from smashdown.async_downloader import AsyncDownloader
+from smashdown.async_updater import AsyncUpdater
+from smashdown.catalogue import Catalogue
+from smashdown.client import (
+    Client,
+    FileWriter,
+    LxmlParser,
+    PageParser,
+    Parser,
+    SmashClient,
+    Writer,
+)
+from smashdown.crawler import Crawler
+from smashdown.database import (
+    KEPT_VISITS,
+    Database,
+    DatabaseBackend,
+    DatabaseStatistics,
+    Site,
+    read_statistics,
+)
+from smashdown.downloader import Downloader, set_download_seed
+from smashdown.http_cache import ValidatorCache, get_http_cache_file
+from smashdown.rate import AdaptiveRateController
+from smashdown.replay import replay_archive
+from smashdown.sharded_database import ShardedDatabase
+from smashdown.sqlite_database import SQLiteDatabase
 from smashdown.updater import Updater
 from util import compute_md5_hash, url_parser
 
 app = typer.Typer(add_completion=False)
 
 
+class BackendName(str, Enum):
+    json = "json"
+    sqlite = "sqlite"
+    sharded = "sharded"
+
+
+class ParserName(str, Enum):
+    bs4 = "bs4"
+    lxml = "lxml"
+
+
+class GameOrder(str, Enum):
+    last_checked = "last-checked"
+    change_rate = "change-rate"
+
+
 @app.command()
 def download_musics(
     base_url: str = typer.Option(
@@ -22,19 +68,57 @@ def download_musics(
         help="the base url of the site, for example 'http://www.smashcustommusic.com'",
         parser=url_parser,
     ),
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
     max_count: int = typer.Option(..., help="maximum number of file to download"),
     output_dir: Path = typer.Option(
         ..., help="directory in which to save the music files"
     ),
-    nap_time: tuple[int, int] = typer.Option(
-        (60, 120), help="min/max nap time between two downloads"
+    journal: bool = typer.Option(
+        False,
+        help="append the changes to a journal file next to the database file, instead of rewriting the whole database after each change",
+    ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    max_in_flight: int = typer.Option(
+        0,
+        help="if > 0, use the asynchronous client, with at most this number of requests at the same time",
+    ),
+    min_interval: float = typer.Option(
+        10.0,
+        help="minimum interval, in seconds, between two requests to the site (the interval is adapted to the responses of the site)",
+    ),
+    max_interval: float = typer.Option(
+        120.0,
+        help="maximum interval, in seconds, between two requests to the site",
+    ),
+    workers: int = typer.Option(
+        1,
+        help="number of threads downloading the files at the same time (the interval between two requests applies to all of them)",
+    ),
+    seed: Optional[int] = typer.Option(
+        None,
+        help="download the songs in the stable order given by this seed, each run starting where the previous one with the same seed stopped (by default, in a random order)",
     ),
 ) -> None:
-    client = SmashClient(base_url=base_url, nap_time=nap_time)
-    db = _get_db(db_file, base_url=base_url)
+    db = _get_db(db_file, base_url=base_url, backend=backend, journal=journal)
+    set_download_seed(db, seed)
+    if max_in_flight > 0:
+        async_app = AsyncApp(
+            client=AsyncSmashClient(
+                base_url=base_url,
+                max_in_flight=max_in_flight,
+                limiter=_get_limiter(min_interval, max_interval),
+            ),
+            db=db,
+        )
+        asyncio.run(
+            async_app.download_musics(output_dir=output_dir, max_count=max_count)
+        )
+        return
+    client = SmashClient(
+        base_url=base_url, limiter=_get_limiter(min_interval, max_interval)
+    )
     app = App(client=client, db=db)
-    app.download_musics(output_dir=output_dir, max_count=max_count)
+    app.download_musics(output_dir=output_dir, max_count=max_count, workers=workers)
 
 
 @app.command()
@@ -44,25 +128,68 @@ def update_game_list(
         help="the base url of the site, for example 'http://www.smashcustommusic.com'",
         parser=url_parser,
     ),
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
     output_dir: Path = typer.Option(
         ..., help="directory in which to save the html files"
     ),
-    nap_time: tuple[int, int] = typer.Option(
-        (60, 120), help="min/max nap time between two downloads"
+    journal: bool = typer.Option(
+        False,
+        help="append the changes to a journal file next to the database file, instead of rewriting the whole database after each change",
+    ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    max_in_flight: int = typer.Option(
+        0,
+        help="if > 0, use the asynchronous client, with at most this number of requests at the same time",
+    ),
+    min_interval: float = typer.Option(
+        10.0,
+        help="minimum interval, in seconds, between two requests to the site (the interval is adapted to the responses of the site)",
+    ),
+    max_interval: float = typer.Option(
+        120.0,
+        help="maximum interval, in seconds, between two requests to the site",
+    ),
+    parser: ParserName = typer.Option(
+        ParserName.bs4,
+        help="parser of the html pages ('lxml' is much faster on large pages)",
+    ),
+    http_cache: bool = typer.Option(
+        False,
+        help="send conditional requests for the html pages, and don't parse the pages that haven't changed (the validators are saved next to the database file)",
+    ),
+    archive: bool = typer.Option(
+        False,
+        help="store the html pages in a compressed archive in the output directory, instead of one file per page",
     ),
 ) -> None:
+    writer = _get_writer(output_dir, archive)
+    db = _get_db(db_file, base_url=base_url, backend=backend, journal=journal)
+    if max_in_flight > 0:
+        async_app = AsyncApp(
+            client=AsyncSmashClient(
+                base_url=base_url,
+                writer=writer,
+                max_in_flight=max_in_flight,
+                parser=_get_parser(parser),
+                limiter=_get_limiter(min_interval, max_interval),
+            ),
+            db=db,
+        )
+        if http_cache:
+            logging.warning("The HTTP cache is not used with the asynchronous client.")
+        asyncio.run(async_app.update_game_list())
+        return
     client = SmashClient(
         base_url=base_url,
-        writer=FileWriter(
-            output_dir=output_dir,
-            timestamp=int(time.time()),
-        ),
-        nap_time=nap_time,
+        writer=writer,
+        limiter=_get_limiter(min_interval, max_interval),
+        parser=_get_parser(parser),
+        cache=_get_http_cache(db_file, http_cache),
     )
-    db = _get_db(db_file, base_url=base_url)
     app = App(client=client, db=db)
     app.update_game_list()
+    if client.cache is not None:
+        client.cache.save()
 
 
 @app.command()
@@ -72,29 +199,81 @@ def update_game_song_lists(
         help="the base url of the site, for example 'http://www.smashcustommusic.com'",
         parser=url_parser,
     ),
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
     max_count: int = typer.Option(..., help="maximum number of file to download"),
     output_dir: Path = typer.Option(
         ..., help="directory in which to save the html files"
     ),
-    nap_time: tuple[int, int] = typer.Option(
-        (60, 120), help="min/max nap time between two downloads"
+    journal: bool = typer.Option(
+        False,
+        help="append the changes to a journal file next to the database file, instead of rewriting the whole database after each change",
+    ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    workers: int = typer.Option(
+        1,
+        help="number of threads downloading the game pages at the same time (the interval between two requests applies to all of them)",
+    ),
+    max_in_flight: int = typer.Option(
+        0,
+        help="if > 0, use the asynchronous client, with at most this number of requests at the same time",
+    ),
+    min_interval: float = typer.Option(
+        10.0,
+        help="minimum interval, in seconds, between two requests to the site (the interval is adapted to the responses of the site)",
+    ),
+    max_interval: float = typer.Option(
+        120.0,
+        help="maximum interval, in seconds, between two requests to the site",
+    ),
+    parser: ParserName = typer.Option(
+        ParserName.bs4,
+        help="parser of the html pages ('lxml' is much faster on large pages)",
+    ),
+    http_cache: bool = typer.Option(
+        False,
+        help="send conditional requests for the html pages, and don't parse the pages that haven't changed (the validators are saved next to the database file)",
+    ),
+    archive: bool = typer.Option(
+        False,
+        help="store the html pages in a compressed archive in the output directory, instead of one file per page",
+    ),
+    order: GameOrder = typer.Option(
+        GameOrder.last_checked,
+        help="order of the games: 'last-checked' visits the oldest visits first, 'change-rate' the games with the most new songs expected from their history",
     ),
 ) -> None:
-    """Select --max-count games to be updated, starting with the ones that have
-    been visited a long time ago.
+    """Select --max-count games to be updated, starting with the ones never
+    visited, then the ones that have been visited a long time ago (or that
+    are the most likely to have new songs with --order change-rate).
     """
+    writer = _get_writer(output_dir, archive)
+    db = _get_db(db_file, base_url=base_url, backend=backend, journal=journal)
+    if max_in_flight > 0:
+        async_app = AsyncApp(
+            client=AsyncSmashClient(
+                base_url=base_url,
+                writer=writer,
+                max_in_flight=max_in_flight,
+                parser=_get_parser(parser),
+                limiter=_get_limiter(min_interval, max_interval),
+            ),
+            db=db,
+        )
+        if http_cache:
+            logging.warning("The HTTP cache is not used with the asynchronous client.")
+        asyncio.run(async_app.update_game_song_lists(max_count=max_count, order=order))
+        return
     client = SmashClient(
         base_url=base_url,
-        writer=FileWriter(
-            output_dir=output_dir,
-            timestamp=int(time.time()),
-        ),
-        nap_time=nap_time,
+        writer=writer,
+        limiter=_get_limiter(min_interval, max_interval),
+        parser=_get_parser(parser),
+        cache=_get_http_cache(db_file, http_cache),
     )
-    db = _get_db(db_file, base_url=base_url)
     app = App(client=client, db=db)
-    app.update_game_song_lists(max_count=max_count)
+    app.update_game_song_lists(max_count=max_count, workers=workers, order=order)
+    if client.cache is not None:
+        client.cache.save()
 
 
 @app.command()
@@ -104,13 +283,39 @@ def update_game_song_lists_by_using_homepage(
         help="the base url of the site, for example 'http://www.smashcustommusic.com'",
         parser=url_parser,
     ),
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
     max_count: int = typer.Option(..., help="maximum number of file to download"),
     output_dir: Path = typer.Option(
         ..., help="directory in which to save the html files"
     ),
-    nap_time: tuple[int, int] = typer.Option(
-        (60, 120), help="min/max nap time between two downloads"
+    journal: bool = typer.Option(
+        False,
+        help="append the changes to a journal file next to the database file, instead of rewriting the whole database after each change",
+    ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    workers: int = typer.Option(
+        1,
+        help="number of threads downloading the game pages at the same time (the interval between two requests applies to all of them)",
+    ),
+    min_interval: float = typer.Option(
+        10.0,
+        help="minimum interval, in seconds, between two requests to the site (the interval is adapted to the responses of the site)",
+    ),
+    max_interval: float = typer.Option(
+        120.0,
+        help="maximum interval, in seconds, between two requests to the site",
+    ),
+    parser: ParserName = typer.Option(
+        ParserName.bs4,
+        help="parser of the html pages ('lxml' is much faster on large pages)",
+    ),
+    http_cache: bool = typer.Option(
+        False,
+        help="send conditional requests for the html pages, and don't parse the pages that haven't changed (the validators are saved next to the database file)",
+    ),
+    archive: bool = typer.Option(
+        False,
+        help="store the html pages in a compressed archive in the output directory, instead of one file per page",
     ),
 ) -> None:
     """Select --max-count games to be updated, choosing at random among the
@@ -118,23 +323,164 @@ def update_game_song_lists_by_using_homepage(
     """
     client = SmashClient(
         base_url=base_url,
-        writer=FileWriter(
-            output_dir=output_dir,
-            timestamp=int(time.time()),
-        ),
-        nap_time=nap_time,
+        writer=_get_writer(output_dir, archive),
+        limiter=_get_limiter(min_interval, max_interval),
+        parser=_get_parser(parser),
+        cache=_get_http_cache(db_file, http_cache),
     )
-    db = _get_db(db_file, base_url=base_url)
+    db = _get_db(db_file, base_url=base_url, backend=backend, journal=journal)
     app = App(client=client, db=db)
-    app.update_game_song_lists_by_using_homepage(max_count=max_count)
+    app.update_game_song_lists_by_using_homepage(max_count=max_count, workers=workers)
+    if client.cache is not None:
+        client.cache.save()
+
+
+@app.command()
+def crawl(
+    base_url: str = typer.Option(
+        ...,
+        help="the base url of the site, for example 'http://www.smashcustommusic.com'",
+        parser=url_parser,
+    ),
+    db_file: Path = typer.Option(..., help="database file"),
+    output_dir: Path = typer.Option(
+        ..., help="directory in which to save the music files"
+    ),
+    archive_dir: Path = typer.Option(
+        ..., help="directory of the compressed archive of the html pages"
+    ),
+    journal: bool = typer.Option(
+        False,
+        help="append the changes to a journal file next to the database file at each checkpoint, instead of rewriting the whole database",
+    ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    workers: int = typer.Option(
+        2,
+        help="number of threads fetching the pages and the files at the same time (the interval between two requests applies to all of them)",
+    ),
+    min_interval: float = typer.Option(
+        10.0,
+        help="minimum interval, in seconds, between two requests to the site (the interval is adapted to the responses of the site)",
+    ),
+    max_interval: float = typer.Option(
+        120.0,
+        help="maximum interval, in seconds, between two requests to the site",
+    ),
+    parser: ParserName = typer.Option(
+        ParserName.bs4,
+        help="parser of the html pages ('lxml' is much faster on large pages)",
+    ),
+    http_cache: bool = typer.Option(
+        False,
+        help="send conditional requests for the html pages, and don't parse the pages that haven't changed (the validators are saved next to the database file)",
+    ),
+    checkpoint_interval: float = typer.Option(
+        300.0, help="interval, in seconds, between two saves of the database"
+    ),
+    game_list_interval: float = typer.Option(
+        24 * 3600.0, help="interval, in seconds, between two visits of the home page"
+    ),
+    revisit_interval: float = typer.Option(
+        7 * 24 * 3600.0, help="interval, in seconds, between two visits of a game"
+    ),
+    retry_interval: float = typer.Option(
+        3600.0,
+        help="delay, in seconds, before a failed page or download is tried again",
+    ),
+    exit_when_idle: bool = typer.Option(
+        False, help="stop when there is nothing left to do, instead of waiting"
+    ),
+) -> None:
+    """Update the game list, the song lists and download the songs, until
+    SIGTERM (or Ctrl-C) is received.
+
+    A single database is kept in memory, and saved every --checkpoint-interval
+    seconds and before exiting.
+    """
+    client = SmashClient(
+        base_url=base_url,
+        writer=ArchiveWriter(HtmlArchive(archive_dir)),
+        limiter=_get_limiter(min_interval, max_interval),
+        parser=_get_parser(parser),
+        cache=_get_http_cache(db_file, http_cache),
+    )
+    crawler = Crawler(
+        client=client,
+        db=_get_db(db_file, base_url=base_url, backend=backend, journal=journal),
+        output_dir=output_dir,
+        workers=workers,
+        cache=client.cache,
+        checkpoint_interval=checkpoint_interval,
+        game_list_interval=game_list_interval,
+        revisit_interval=revisit_interval,
+        retry_interval=retry_interval,
+        exit_when_idle=exit_when_idle,
+    )
+
+    def stop(signum: int, frame: object) -> None:
+        logging.info(f"Signal {signum} received, stopping the crawl.")
+        crawler.stop()
+        client.interrupt()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    crawler.run()
+
+
+@app.command()
+def rebuild_from_archive(
+    base_url: str = typer.Option(
+        ...,
+        help="the base url of the site, for example 'http://www.smashcustommusic.com'",
+        parser=url_parser,
+    ),
+    archive_dir: Path = typer.Option(..., help="html archive directory"),
+    db_file: Path = typer.Option(..., help="new database file"),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    processes: int = typer.Option(
+        0, help="number of processes parsing the pages (0: number of CPUs)"
+    ),
+    parser: ParserName = typer.Option(
+        ParserName.bs4,
+        help="parser of the html pages ('lxml' is much faster on large pages)",
+    ),
+) -> None:
+    """Build a new database by replaying the pages of an html archive, without
+    accessing the site."""
+    if db_file.exists():
+        raise typer.BadParameter(f"'{db_file}' already exists")
+    archive = HtmlArchive(archive_dir)
+    db: DatabaseBackend
+    if backend == BackendName.sqlite:
+        db = SQLiteDatabase(db_file, base_url=base_url)
+    elif backend == BackendName.sharded:
+        db = ShardedDatabase(db_file, base_url=base_url)
+    else:
+        # saved only once, at the end
+        db = Database(site=Site(base_url=base_url))
+    replay_archive(archive, db, parser=_get_parser(parser), processes=processes or None)
+    if isinstance(db, Database):
+        db.with_output_file(db_file)
+    db.save()
 
 
 @app.command()
 def statistics(
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
 ) -> None:
-    db = Database.build_from_file(db_file)
-    stats = db.get_statistics()
+    """Show the statistics saved with the database (or counted from the
+    database if they are missing or out of date)."""
+    if backend == BackendName.sqlite:
+        stats = SQLiteDatabase(db_file).get_statistics()
+    elif backend == BackendName.sharded:
+        # read from the indexes of the shards
+        stats = ShardedDatabase(db_file).get_statistics()
+    else:
+        stats = (
+            read_statistics(db_file)
+            or Catalogue.build_from_file(db_file).compute_statistics()
+        )
     print(f"games: {stats.games}")
     print(f"games visited: {stats.games_visited}")
     print(f"games not visited: {stats.games_not_visited}")
@@ -146,64 +492,222 @@ def statistics(
     print(f"songs downloaded: {stats.songs_downloaded}")
     print(f"songs not downloaded: {stats.songs_not_downloaded}")
     print(f"songs deleted from site: {stats.songs_deleted_from_site}")
+    print(f"songs with a download failure: {stats.songs_with_download_failure}")
+
+
+@app.command()
+def check_statistics(
+    db_file: Path = typer.Option(..., help="database file"),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+) -> None:
+    """Count the statistics from all the games and songs of the database, and
+    compare them to the ones shown by the statistics command."""
+    stats: DatabaseStatistics | None
+    if backend == BackendName.sqlite:
+        sqlite_db = SQLiteDatabase(db_file)
+        stats = sqlite_db.get_statistics()
+        counted = sqlite_db.to_database().compute_statistics()
+    elif backend == BackendName.sharded:
+        sharded_db = ShardedDatabase(db_file)
+        stats = sharded_db.get_statistics()
+        counted = sharded_db.to_database().compute_statistics()
+    else:
+        stats = read_statistics(db_file)
+        if stats is None:
+            print("no up-to-date statistics saved with the database")
+            raise typer.Exit(code=1)
+        counted = Catalogue.build_from_file(db_file).compute_statistics()
+    consistent = True
+    for field in fields(DatabaseStatistics):
+        value, expected = getattr(stats, field.name), getattr(counted, field.name)
+        if value != expected:
+            print(f"{field.name}: {value} (counted: {expected})")
+            consistent = False
+    if not consistent:
+        raise typer.Exit(code=1)
+    print("statistics consistent")
 
 
 @app.command()
 def check_md5(
-    db_file: Path = typer.Option(..., help="json database file"),
+    db_file: Path = typer.Option(..., help="database file"),
     song_dir: Path = typer.Option(
         ..., help="directory in which the music files are saved"
     ),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
 ) -> None:
-    db = Database.build_from_file(db_file)
+    if backend == BackendName.sqlite:
+        catalogue = Catalogue.build_from_games(SQLiteDatabase(db_file).get_games())
+    elif backend == BackendName.sharded:
+        catalogue = Catalogue.build_from_games(ShardedDatabase(db_file).get_games())
+    else:
+        catalogue = Catalogue.build_from_file(db_file)
     count = 0
-    for game in db.site.games:
-        for song in game.songs:
-            if song.brstm_download_info is None:
-                continue
-            path = song_dir / song.brstm_download_info.location
-            computed = compute_md5_hash(path)
+    for song in catalogue.get_downloaded_songs():
+        path = song_dir / song.location
+        computed = compute_md5_hash(path)
+
+        count += 1
+        if count % 1000 == 0:
+            print("done:", count)
+        if computed != song.file_md5:
+            print("failed:", path, computed, song.file_md5)
+
+
+@app.command()
+def compact_db(
+    db_file: Path = typer.Option(..., help="database file"),
+    backend: BackendName = typer.Option(BackendName.json, help="database backend"),
+    kept_visits: int = typer.Option(
+        KEPT_VISITS, min=1, help="number of visits kept for the site and each game"
+    ),
+) -> None:
+    """Drop the old visits of the site and of the games (keeping their
+    number, and the times of the first and latest ones), and rewrite the
+    database to shrink it."""
+    size = _get_size(db_file)
+    if backend == BackendName.sqlite:
+        sqlite_db = SQLiteDatabase(db_file)
+        count = sqlite_db.drop_old_visits(kept_visits)
+        sqlite_db.compact()
+    elif backend == BackendName.sharded:
+        sharded_db = ShardedDatabase(db_file)
+        count = sharded_db.drop_old_visits(kept_visits)
+        sharded_db.save()
+    else:
+        db = Database.build_from_file(db_file)
+        count = db.drop_old_visits(kept_visits)
+        # with the changes of the journal
+        db.compact()
+    print(f"visits dropped: {count}")
+    print(f"size: {size / 1e6:.1f} MB -> {_get_size(db_file) / 1e6:.1f} MB")
+
 
-            count += 1
-            if count % 1000 == 0:
-                print("done:", count)
-            if computed != song.brstm_download_info.file_md5:
-                print("failed:", path, computed, song.brstm_download_info.file_md5)
+def _get_size(path: Path) -> int:
+    """Return the size of the database file, or of the files of a sharded
+    database."""
+    if path.is_dir():
+        return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    return path.stat().st_size
 
 
-def _get_db(db_file: Path, base_url: str) -> Database:
+def _get_db(
+    db_file: Path,
+    base_url: str,
+    backend: BackendName = BackendName.json,
+    journal: bool = False,
+) -> DatabaseBackend:
+    if backend == BackendName.sqlite:
+        if journal:
+            logging.warning("The journal mode is not used with the SQLite backend.")
+        return SQLiteDatabase(db_file, base_url=base_url)
+    if backend == BackendName.sharded:
+        if journal:
+            logging.warning("The journal mode is not used with the sharded backend.")
+        return ShardedDatabase(db_file, base_url=base_url)
     if db_file.exists():
         db = Database.build_from_file(db_file)
-        return db
     else:
         logging.info("New database created.")
-        return Database(
+        db = Database(
             site=Site(
                 base_url=base_url,
             )
         ).with_output_file(db_file)
+    if journal:
+        db.with_journal()
+    return db
+
+
+def _get_writer(output_dir: Path, archive: bool) -> Writer:
+    if archive:
+        return ArchiveWriter(HtmlArchive(output_dir))
+    return FileWriter(
+        output_dir=output_dir,
+        timestamp=int(time.time()),
+    )
+
+
+def _get_http_cache(db_file: Path, http_cache: bool) -> ValidatorCache | None:
+    if not http_cache:
+        return None
+    return ValidatorCache(get_http_cache_file(db_file))
+
+
+def _get_parser(parser: ParserName) -> PageParser:
+    if parser == ParserName.lxml:
+        return LxmlParser()
+    return Parser()
+
+
+def _get_limiter(min_interval: float, max_interval: float) -> AdaptiveRateController:
+    return AdaptiveRateController(min_interval=min_interval, max_interval=max_interval)
 
 
 @dataclass
 class App:
     client: Client
-    db: Database
+    db: DatabaseBackend
 
     def update_game_list(self) -> None:
         updater = Updater(client=self.client, db=self.db)
         updater.update_game_list()
 
-    def update_game_song_lists(self, max_count: int) -> None:
+    def update_game_song_lists(
+        self,
+        max_count: int,
+        workers: int = 1,
+        order: GameOrder = GameOrder.last_checked,
+    ) -> None:
         updater = Updater(client=self.client, db=self.db)
-        updater.update_game_song_lists(max_count=max_count)
+        if order == GameOrder.change_rate:
+            updater.update_game_song_lists_by_change_rate(
+                max_count=max_count, workers=workers
+            )
+        else:
+            updater.update_game_song_lists(max_count=max_count, workers=workers)
 
-    def update_game_song_lists_by_using_homepage(self, max_count: int) -> None:
+    def update_game_song_lists_by_using_homepage(
+        self, max_count: int, workers: int = 1
+    ) -> None:
         updater = Updater(client=self.client, db=self.db)
-        updater.update_game_song_lists_by_using_home_page(max_count=max_count)
+        updater.update_game_song_lists_by_using_home_page(
+            max_count=max_count, workers=workers
+        )
 
-    def download_musics(self, output_dir: Path, max_count: int) -> None:
+    def download_musics(
+        self, output_dir: Path, max_count: int, workers: int = 1
+    ) -> None:
         downloader = Downloader(client=self.client, db=self.db, output_dir=output_dir)
-        downloader.download_brstm_files(max_count=max_count)
+        downloader.download_brstm_files(max_count=max_count, workers=workers)
+
+
+@dataclass
+class AsyncApp:
+    client: AsyncSmashClient
+    db: DatabaseBackend
+
+    async def update_game_list(self) -> None:
+        async with self.client:
+            updater = AsyncUpdater(client=self.client, db=self.db)
+            await updater.update_game_list()
+
+    async def update_game_song_lists(
+        self, max_count: int, order: GameOrder = GameOrder.last_checked
+    ) -> None:
+        async with self.client:
+            updater = AsyncUpdater(client=self.client, db=self.db)
+            if order == GameOrder.change_rate:
+                await updater.update_game_song_lists_by_change_rate(max_count=max_count)
+            else:
+                await updater.update_game_song_lists(max_count=max_count)
+
+    async def download_musics(self, output_dir: Path, max_count: int) -> None:
+        async with self.client:
+            downloader = AsyncDownloader(
+                client=self.client, db=self.db, output_dir=output_dir
+            )
+            await downloader.download_brstm_files(max_count=max_count)
 
 
 if __name__ == "__main__":
@@ -11,7 +11,7 @@ from metadata.checker import FFMPEGChecker
 from metadata.counters import Counters
 from metadata.entry import Entry, read_entries
 from metadata.identifier import MplayerIdentifier
-from smashdown.database import Database, Game, Song
+from smashdown.catalogue import Catalogue, DownloadedSong
 
 app = typer.Typer(add_completion=False)
 
@@ -45,10 +45,10 @@ def extract_brstm_data(
     else:
         logging.info(f"Creating a new entry list (file '{output_file}' doesn't exist')")
         entries = []
-    db = Database.build_from_file(file=db_file)
+    catalogue = Catalogue.build_from_file(db_file)
     entries, counters = extract(
         root_dir=root_dir,
-        db=db,
+        catalogue=catalogue,
         entry_list=entries,
         force=force,
         max_count=max_count,
@@ -61,7 +61,7 @@ def extract_brstm_data(
 
 def extract(
     root_dir: Path,
-    db: Database,
+    catalogue: Catalogue,
     entry_list: list[Entry],
     force: bool,
     max_count: int = 0,
@@ -73,12 +73,10 @@ def extract(
     logging.info(f"Got {len(files)} file(s) from {root_dir}")
 
     file_set = set(files)
-    files2songs: dict[Path, tuple[Game, Song]] = dict()
-    for game in db.site.games:
-        for song in game.songs:
-            if song.brstm_download_info is not None:
-                if song.brstm_download_info.location in file_set:
-                    files2songs[song.brstm_download_info.location] = (game, song)
+    files2songs: dict[Path, DownloadedSong] = dict()
+    for song in catalogue.get_downloaded_songs():
+        if song.location in file_set:
+            files2songs[song.location] = song
 
     counters = Counters()
     for entry_path in entries.keys():
@@ -127,9 +125,9 @@ def extract(
             entry.loop_start = identifier_results.loop_start
             entry.loop_end = identifier_results.loop_end
             entry.duration = identifier_results.duration
-            game, song = files2songs[file]
+            song = files2songs[file]
             entry.title = song.title
-            entry.game_title = game.title
+            entry.game_title = song.game_title
             logging.debug(f"File '{file}' successfully identified.")
             counters.successes.append(full_path)
 
@@ -4,71 +4,69 @@ import pytest
 
 from metadata.entry import Entry
 from metadata.extract import extract
-from smashdown.database import Database, FileDownloadInfo, Game, Site, Song
+from smashdown.catalogue import Catalogue
+from smashdown.database import FileDownloadInfo, Game, Song
 
 
 @pytest.fixture
-def database() -> Database:
-    return Database(
-        site=Site(
-            base_url="https://idontexist.net",
-            games=[
-                Game(
-                    id=100,
-                    title="English game",
-                    songs=[
-                        Song(
-                            id=1,
-                            title="English song",
-                            brstm_download_info=FileDownloadInfo(
-                                location=Path("english/onetwothree_en.brstm"),
-                                timestamp=123,
-                                file_md5="abc",
-                            ),
+def catalogue() -> Catalogue:
+    return Catalogue.build_from_games(
+        [
+            Game(
+                id=100,
+                title="English game",
+                songs=[
+                    Song(
+                        id=1,
+                        title="English song",
+                        brstm_download_info=FileDownloadInfo(
+                            location=Path("english/onetwothree_en.brstm"),
+                            timestamp=123,
+                            file_md5="abc",
                         ),
-                    ],
-                ),
-                Game(
-                    id=200,
-                    title="Other game",
-                    songs=[
-                        Song(
-                            id=2,
-                            title="French song",
-                            brstm_download_info=FileDownloadInfo(
-                                location=Path("other/onetwothree_fr.brstm"),
-                                timestamp=123,
-                                file_md5="abc",
-                            ),
+                    ),
+                ],
+            ),
+            Game(
+                id=200,
+                title="Other game",
+                songs=[
+                    Song(
+                        id=2,
+                        title="French song",
+                        brstm_download_info=FileDownloadInfo(
+                            location=Path("other/onetwothree_fr.brstm"),
+                            timestamp=123,
+                            file_md5="abc",
                         ),
-                        Song(
-                            id=3,
-                            title="German song",
-                            brstm_download_info=FileDownloadInfo(
-                                location=Path("other/onetwothree_de.brstm"),
-                                timestamp=123,
-                                file_md5="abc",
-                            ),
+                    ),
+                    Song(
+                        id=3,
+                        title="German song",
+                        brstm_download_info=FileDownloadInfo(
+                            location=Path("other/onetwothree_de.brstm"),
+                            timestamp=123,
+                            file_md5="abc",
                         ),
-                    ],
-                ),
-                Game(
-                    id=300,
-                    title="Strange game",
-                    songs=[
-                        Song(
-                            id=4,
-                            title="Empty song",
-                            brstm_download_info=FileDownloadInfo(
-                                location=Path("strange/empty.brstm"),
-                                timestamp=123,
-                                file_md5="abc",
-                            ),
+                    ),
+                ],
+            ),
+            Game(
+                id=300,
+                title="Strange game",
+                songs=[
+                    Song(
+                        id=4,
+                        title="Empty song",
+                        brstm_download_info=FileDownloadInfo(
+                            location=Path("strange/empty.brstm"),
+                            timestamp=123,
+                            file_md5="abc",
                         ),
-                    ],
-                ),
-            ],
-        )
+                    ),
+                ],
+            ),
+        ]
     )
 
 
@@ -123,12 +121,12 @@ def entries_on_disk() -> list[Entry]:
 
 
 def test_extract(
-    testdata_directory: Path, database: Database, entries_on_disk: list[Entry]
+    testdata_directory: Path, catalogue: Catalogue, entries_on_disk: list[Entry]
 ) -> None:
     root_dir = testdata_directory / "songs"
     entries, counters = extract(
         root_dir=root_dir,
-        db=database,
+        catalogue=catalogue,
         entry_list=[],
         force=True,
     )
@@ -147,12 +145,12 @@ def test_extract(
 
 
 def test_extract_with_force(
-    testdata_directory: Path, database: Database, entries_on_disk: list[Entry]
+    testdata_directory: Path, catalogue: Catalogue, entries_on_disk: list[Entry]
 ) -> None:
     root_dir = testdata_directory / "songs"
     entries, counters = extract(
         root_dir=root_dir,
-        db=database,
+        catalogue=catalogue,
         entry_list=[
             Entry(
                 path=Path("english/onetwothree_en.brstm"),
@@ -183,12 +181,12 @@ def test_extract_with_force(
 
 
 def test_extract_without_force(
-    testdata_directory: Path, database: Database, entries_on_disk: list[Entry]
+    testdata_directory: Path, catalogue: Catalogue, entries_on_disk: list[Entry]
 ) -> None:
     root_dir = testdata_directory / "songs"
     entries, counters = extract(
         root_dir=root_dir,
-        db=database,
+        catalogue=catalogue,
         entry_list=[
             Entry(
                 path=Path("english/onetwothree_en.brstm"),
@@ -232,7 +230,7 @@ def test_extract_without_force(
 
 
 def test_extract_with_not_found_file(
-    testdata_directory: Path, database: Database, entries_on_disk: list[Entry]
+    testdata_directory: Path, catalogue: Catalogue, entries_on_disk: list[Entry]
 ) -> None:
     root_dir = testdata_directory / "songs"
     existing_entry = Entry(
@@ -248,7 +246,7 @@ def test_extract_with_not_found_file(
     )
     entries, counters = extract(
         root_dir=root_dir,
-        db=database,
+        catalogue=catalogue,
         entry_list=[existing_entry],
         force=True,
     )
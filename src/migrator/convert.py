@@ -0,0 +1,95 @@
+import logging
+import re
+from pathlib import Path
+
+import typer
+
+from smashdown.archive import HOME_PAGE, HtmlArchive, get_game_page
+from smashdown.database import Database
+from smashdown.sharded_database import DEFAULT_BUCKET_SIZE, ShardedDatabase
+from smashdown.sqlite_database import SQLiteDatabase
+
+app = typer.Typer(add_completion=False)
+
+
+@app.command()
+def json_to_sqlite(
+    json_file: Path = typer.Option(..., help="json database file (read only)"),
+    sqlite_file: Path = typer.Option(..., help="new SQLite database file"),
+) -> None:
+    if sqlite_file.exists():
+        raise typer.BadParameter(f"'{sqlite_file}' already exists")
+    db = Database.build_from_file(json_file)
+    SQLiteDatabase.build_from_database(sqlite_file, db).close()
+    logging.info(f"Database converted from '{json_file}' to '{sqlite_file}'.")
+
+
+@app.command()
+def sqlite_to_json(
+    sqlite_file: Path = typer.Option(..., help="SQLite database file (read only)"),
+    json_file: Path = typer.Option(..., help="new json database file"),
+) -> None:
+    if json_file.exists():
+        raise typer.BadParameter(f"'{json_file}' already exists")
+    sqlite_db = SQLiteDatabase(sqlite_file)
+    sqlite_db.to_database().with_output_file(json_file).save()
+    sqlite_db.close()
+    logging.info(f"Database converted from '{sqlite_file}' to '{json_file}'.")
+
+
+@app.command()
+def json_to_sharded(
+    json_file: Path = typer.Option(..., help="json database file (read only)"),
+    sharded_dir: Path = typer.Option(..., help="new sharded database directory"),
+    bucket_size: int = typer.Option(
+        DEFAULT_BUCKET_SIZE, help="number of game ids per shard"
+    ),
+) -> None:
+    if sharded_dir.exists():
+        raise typer.BadParameter(f"'{sharded_dir}' already exists")
+    db = Database.build_from_file(json_file)
+    ShardedDatabase.build_from_database(sharded_dir, db, bucket_size=bucket_size)
+    logging.info(f"Database converted from '{json_file}' to '{sharded_dir}'.")
+
+
+@app.command()
+def sharded_to_json(
+    sharded_dir: Path = typer.Option(
+        ..., help="sharded database directory (read only)"
+    ),
+    json_file: Path = typer.Option(..., help="new json database file"),
+) -> None:
+    if json_file.exists():
+        raise typer.BadParameter(f"'{json_file}' already exists")
+    ShardedDatabase(sharded_dir).to_database().with_output_file(json_file).save()
+    logging.info(f"Database converted from '{sharded_dir}' to '{json_file}'.")
+
+
+@app.command()
+def html_to_archive(
+    html_dir: Path = typer.Option(
+        ..., help="directory of the html files written by the commands (read only)"
+    ),
+    archive_dir: Path = typer.Option(..., help="html archive directory"),
+) -> None:
+    """Add the html files of `html_dir` to an archive (the pages already in
+    the archive are skipped)."""
+    archive = HtmlArchive(archive_dir)
+    archived = {(entry.page, entry.timestamp) for entry in archive.get_entries()}
+    files: list[tuple[int, str, Path]] = []
+    for file in html_dir.iterdir():
+        if m := re.fullmatch(r"home_(\d+)\.html", file.name):
+            files.append((int(m.group(1)), HOME_PAGE, file))
+        elif m := re.fullmatch(r"game_(\d+)_(\d+)\.html", file.name):
+            files.append((int(m.group(2)), get_game_page(int(m.group(1))), file))
+    count = 0
+    for timestamp, page, file in sorted(files):
+        if (page, timestamp) not in archived:
+            archive.add_page(page, timestamp, file.read_text(encoding="utf-8"))
+            count += 1
+    logging.info(f"{count} html file(s) added to '{archive_dir}'.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    app()
@@ -87,7 +87,7 @@ def migrate(
             songs=new_songs,
             download_timestamps=[int(time.time())],
         )
-        new_db.site.games.append(new_game)
+        new_db.add_game(new_game)
 
     new_db.save()
 
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import pydantic
+from pydantic import BaseModel
+
+from smashdown.client import Writer
+
+HOME_PAGE = "home"
+INDEX_FILE = "index.jsonl"
+
+
+def get_game_page(game_id: int) -> str:
+    """Return the name of the page of the game `game_id` in the archive."""
+    return f"game_{game_id}"
+
+
+def parse_game_page(page: str) -> int | None:
+    """Return the game id of a game page name, or None for other pages."""
+    if m := re.fullmatch(r"game_(\d+)", page):
+        return int(m.group(1))
+    return None
+
+
+class PageNotArchived(Exception):
+    pass
+
+
+class ArchiveEntry(BaseModel):
+    """Version of a page received at `timestamp`, stored in the segment file
+    `segment` at `offset`."""
+
+    page: str
+    timestamp: int
+    sha256: str
+    segment: int
+    offset: int
+    length: int
+
+
+@dataclass
+class HtmlArchive:
+    """Archive of the html pages received, in a directory.
+
+    Each distinct content is stored once, compressed, in append-only segment
+    files (a new segment is started when the current one is larger than
+    `segment_size`).  The index file has one line per version of a page
+    (name of the page, timestamp and location of the content): it is read
+    in memory when the archive is opened.
+
+    The content is written before the index line, so a crash can only leave
+    unused bytes at the end of a segment, or a truncated index line, which
+    is ignored.  It is thread-safe.
+    """
+
+    directory: Path
+    segment_size: int = 64 * 1024 * 1024
+    _history: dict[str, list[ArchiveEntry]] = field(default_factory=dict, init=False)
+    _blobs: dict[str, ArchiveEntry] = field(default_factory=dict, init=False)
+    _segment: int = field(default=0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_file = self.directory / INDEX_FILE
+        if not index_file.exists():
+            return
+        content = index_file.read_bytes()
+        for line in content.splitlines():
+            try:
+                entry = ArchiveEntry.model_validate_json(line)
+            except pydantic.ValidationError:
+                logging.warning(f"Invalid line in '{index_file}', ignored.")
+                continue
+            self._add_entry(entry)
+        if content and not content.endswith(b"\n"):
+            # truncated last line: the next lines must not be appended to it
+            with index_file.open("ab") as fh:
+                fh.write(b"\n")
+        logging.info(f"Archive index read from '{index_file}'.")
+
+    def _add_entry(self, entry: ArchiveEntry) -> None:
+        self._history.setdefault(entry.page, []).append(entry)
+        self._blobs.setdefault(entry.sha256, entry)
+        self._segment = max(self._segment, entry.segment)
+
+    def get_segment_file(self, segment: int) -> Path:
+        return get_segment_file(self.directory, segment)
+
+    def add_page(self, page: str, timestamp: int, html: str) -> ArchiveEntry:
+        """Add the version of the `page` received at `timestamp`."""
+        data = html.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            blob = self._blobs.get(sha256)
+            if blob is None:
+                segment, offset, length = self._write_blob(zlib.compress(data))
+            else:
+                segment, offset, length = blob.segment, blob.offset, blob.length
+            entry = ArchiveEntry(
+                page=page,
+                timestamp=timestamp,
+                sha256=sha256,
+                segment=segment,
+                offset=offset,
+                length=length,
+            )
+            with (self.directory / INDEX_FILE).open("a", encoding="utf-8") as fh:
+                fh.write(entry.model_dump_json() + "\n")
+            self._add_entry(entry)
+        logging.info(f"Page {page} archived ({'new' if blob is None else 'known'}).")
+        return entry
+
+    def _write_blob(self, compressed: bytes) -> tuple[int, int, int]:
+        segment_file = self.get_segment_file(self._segment)
+        if segment_file.exists() and segment_file.stat().st_size >= self.segment_size:
+            self._segment += 1
+            segment_file = self.get_segment_file(self._segment)
+        with segment_file.open("ab") as fh:
+            offset = fh.tell()
+            fh.write(compressed)
+            fh.flush()
+            os.fsync(fh.fileno())
+        return self._segment, offset, len(compressed)
+
+    def get_pages(self) -> list[str]:
+        """Return the names of the pages archived."""
+        with self._lock:
+            return list(self._history)
+
+    def get_history(self, page: str) -> list[ArchiveEntry]:
+        """Return the versions of the `page`, in the order they were added."""
+        with self._lock:
+            return list(self._history.get(page, []))
+
+    def get_entries(self) -> list[ArchiveEntry]:
+        """Return the versions of all the pages, by timestamp."""
+        with self._lock:
+            entries = [e for history in self._history.values() for e in history]
+        return sorted(entries, key=lambda entry: entry.timestamp)
+
+    def read_page(self, page: str, timestamp: int) -> str:
+        """Return the version of the `page` received at `timestamp`."""
+        for entry in reversed(self.get_history(page)):
+            if entry.timestamp == timestamp:
+                return self.read_entry(entry)
+        raise PageNotArchived(f"no version of {page} at {timestamp}")
+
+    def read_entry(self, entry: ArchiveEntry) -> str:
+        return read_entry(self.directory, entry)
+
+
+def get_segment_file(directory: Path, segment: int) -> Path:
+    return directory / f"segment_{segment:05d}.bin"
+
+
+def read_entry(directory: Path, entry: ArchiveEntry) -> str:
+    """Return the content of the page version `entry` of the archive in
+    `directory`, without reading the index (for the worker processes)."""
+    with get_segment_file(directory, entry.segment).open("rb") as fh:
+        fh.seek(entry.offset)
+        return zlib.decompress(fh.read(entry.length)).decode("utf-8")
+
+
+@dataclass
+class ArchiveWriter(Writer):
+    """Writer storing the pages in an `HtmlArchive` rather than in separate
+    files.  Unlike `FileWriter`, each page is stored with the time it was
+    received."""
+
+    archive: HtmlArchive
+    clock: Callable[[], float] = time.time
+
+    def write_home_page_html(self, data: str) -> None:
+        self.archive.add_page(HOME_PAGE, int(self.clock()), data)
+
+    def write_game_page_html(self, game_id: int, data: str) -> None:
+        self.archive.add_page(get_game_page(game_id), int(self.clock()), data)
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from abc import abstractmethod
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, Protocol
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+
+from smashdown.client import (
+    USER_AGENT,
+    GameInfo,
+    PageParser,
+    Parser,
+    SongInfo,
+    Writer,
+    check_content_range,
+    check_response,
+    get_range_headers,
+    get_validator,
+)
+from smashdown.rate import AdaptiveRateController, RateLimiter, parse_retry_after
+from smashdown.retry import CircuitBreaker, RequestFailed, RetryPolicy
+
+
+@dataclass
+class AsyncBrstmStream:
+    # see `BrstmStream`
+    offset: int
+    validator: str | None
+    chunks: AsyncIterator[bytes]
+
+
+class AsyncClient(Protocol):
+    @abstractmethod
+    async def get_game_list(self) -> list[GameInfo]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    async def get_song_list(self, game_id: int) -> list[SongInfo]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    async def get_brstm_file(self, song_id: int) -> bytes:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> AsyncContextManager[AsyncBrstmStream]:
+        ...  # pragma:nocover
+
+
+@dataclass
+class AsyncSmashClient(AsyncClient):
+    """Asynchronous counterpart of `SmashClient`.
+
+    At most `max_in_flight` requests are sent at the same time, and requests
+    to the same host are spaced by the `limiter`, without blocking the event
+    loop.  The responses are checked, and the failures retried and recorded
+    by the circuit breaker, like in `SmashClient`.  Use it as an async
+    context manager to close the HTTP session.
+    """
+
+    base_url: str
+    writer: Writer | None = None
+    max_in_flight: int = 4
+    limiter: RateLimiter = field(default_factory=AdaptiveRateController)
+
+    game_url_path_template: str = "/game/{id}"
+    brstm_url_path_template: str = "/brstm/{id}"
+
+    user_agent: str = USER_AGENT
+    parser: PageParser = field(default_factory=Parser)
+    # retries of the transient failures (None to fail at the first one)
+    retry: RetryPolicy | None = field(default_factory=RetryPolicy)
+    # None to never stop
+    breaker: CircuitBreaker | None = field(default_factory=CircuitBreaker)
+    # a hanging connection is a (transient) failure
+    timeout: aiohttp.ClientTimeout = field(
+        default_factory=lambda: aiohttp.ClientTimeout(connect=10.0, sock_read=60.0)
+    )
+
+    def __post_init__(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> AsyncSmashClient:
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_game_list(self) -> list[GameInfo]:
+        html = (await self._get(self.base_url)).decode(errors="replace")
+        if self.writer:
+            self.writer.write_home_page_html(html)
+        return self.parser.get_game_list_from_home_page(html)
+
+    async def get_song_list(self, game_id: int) -> list[SongInfo]:
+        url = urljoin(self.base_url, self.game_url_path_template.format(id=game_id))
+        html = (await self._get(url)).decode(errors="replace")
+        if self.writer:
+            self.writer.write_game_page_html(game_id, html)
+        return self.parser.get_song_list_from_game_page(html)
+
+    async def get_brstm_file(self, song_id: int) -> bytes:
+        url = urljoin(self.base_url, self.brstm_url_path_template.format(id=song_id))
+        return await self._get(url, html=False)
+
+    @asynccontextmanager
+    async def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> AsyncIterator[AsyncBrstmStream]:
+        url = urljoin(self.base_url, self.brstm_url_path_template.format(id=song_id))
+        headers = get_range_headers(offset, validator)
+        async with self._request(
+            url, headers, html=False, statuses=(200, 206, 416)
+        ) as response:
+            if response.status != 416:
+                yield self._build_stream(url, response, offset, chunk_size)
+                return
+        # the range is not satisfiable, we download the whole file (once the
+        # first response is released, to not hold two slots)
+        async with self._request(url, html=False) as response:
+            yield self._build_stream(url, response, 0, chunk_size)
+
+    @staticmethod
+    def _build_stream(
+        url: str, response: aiohttp.ClientResponse, offset: int, chunk_size: int
+    ) -> AsyncBrstmStream:
+        if response.status == 206:
+            check_content_range(url, offset, response.headers.get("Content-Range"))
+        return AsyncBrstmStream(
+            offset=offset if response.status == 206 else 0,
+            validator=get_validator(response.headers),
+            chunks=_iter_chunks(url, response, chunk_size),
+        )
+
+    async def _get(self, url: str, html: bool = True) -> bytes:
+        async with self._request(url, html=html) as response:
+            try:
+                return await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RequestFailed(f"download from {url} interrupted ({e!r})") from e
+
+    @asynccontextmanager
+    async def _request(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None,
+        html: bool = True,
+        statuses: tuple[int, ...] = (200,),
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Send the request, retrying the transient failures, and yield the
+        response if it has one of the `statuses`.  Otherwise, raise
+        `RequestFailed` (or `CircuitOpen` if the site is failing)."""
+        retry = 0
+        while True:
+            # the slot is not kept while waiting for a retry
+            async with self._semaphore:
+                try:
+                    response = await self._get_once(url, headers, html, statuses)
+                except RequestFailed as e:
+                    retry += 1
+                    if (
+                        not e.transient
+                        or self.retry is None
+                        or retry >= self.retry.max_attempts
+                    ):
+                        raise
+                    delay = self.retry.get_delay(retry)
+                    logging.warning(f"{e.message}, retrying in {delay:.1f} seconds.")
+                else:
+                    async with response:
+                        yield response
+                    logging.info(f"Downloaded from {url}.")
+                    return
+            await asyncio.sleep(delay)
+
+    async def _get_once(
+        self,
+        url: str,
+        headers: dict[str, str] | None,
+        html: bool,
+        statuses: tuple[int, ...],
+    ) -> aiohttp.ClientResponse:
+        if self.breaker is not None:
+            self.breaker.before_request()
+        host = urlsplit(url).netloc
+        delay = self.limiter.reserve(host)
+        if delay > 0:
+            logging.info(f"Waiting for {delay:.1f} seconds before {url}.")
+            await asyncio.sleep(delay)
+        logging.debug(f"Downloading from {url} (headers {headers}).")
+        start = time.monotonic()
+        try:
+            response = await self._get_session().get(url, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.limiter.record(host, None, 0.0)
+            self._record_failure()
+            raise RequestFailed(f"request to {url} failed ({e!r})") from e
+        self.limiter.record(
+            host,
+            response.status,
+            time.monotonic() - start,
+            parse_retry_after(response.headers.get("Retry-After")),
+        )
+        try:
+            check_response(
+                url,
+                response.status,
+                response.headers.get("Content-Type"),
+                html,
+                statuses,
+            )
+        except RequestFailed as e:
+            response.release()
+            if e.transient:
+                self._record_failure()
+            elif self.breaker is not None:
+                # the site is up, even if the url is wrong
+                self.breaker.record_success()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return response
+
+    def _record_failure(self) -> None:
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers={"User-Agent": self.user_agent}, timeout=self.timeout
+            )
+        return self._session
+
+
+async def _iter_chunks(
+    url: str, response: aiohttp.ClientResponse, chunk_size: int
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            yield chunk
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise RequestFailed(f"download from {url} interrupted ({e!r})") from e
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from smashdown.async_client import AsyncClient
+from smashdown.database import DatabaseBackend, FileDownloadInfo, Song
+from smashdown.downloader import (
+    Downloader,
+    PartFile,
+    record_download,
+    record_failure,
+    take_songs_to_download,
+)
+from smashdown.retry import RequestFailed
+
+
+@dataclass
+class AsyncDownloader:
+    """Asynchronous counterpart of `Downloader`.
+
+    Files are downloaded concurrently (the concurrency is bounded by the
+    client), and recorded into the database as soon as they are received.
+    A failed download is recorded and skipped, but the run stops if the
+    circuit breaker of the client opens.  The database is saved every
+    `save_batch_size` downloads.
+    """
+
+    client: AsyncClient
+    db: DatabaseBackend
+    output_dir: Path
+    chunk_size: int = 64 * 1024
+    save_batch_size: int = 20
+    clock: Callable[[], float] = time.time
+
+    async def download_brstm_file(self, song: Song) -> None:
+        """Download the brstm file of the `song`.  If the request fails, the
+        failure is recorded in the database before `RequestFailed` is raised
+        (the song will be downloaded by a later run)."""
+        try:
+            await self._download_and_record(song)
+        finally:
+            self.db.save()
+
+    async def _download_and_record(self, song: Song) -> None:
+        game = self.db.get_game_from_song_id(song_id=song.id)
+        music_path = Downloader.get_music_path(Downloader.get_game_path(game), song)
+        try:
+            download_info = await self.fetch_brstm_file(song.id, music_path)
+        except RequestFailed as e:
+            record_failure(self.db, song, e, int(self.clock()))
+            raise
+        record_download(self.db, song, download_info)
+
+    async def fetch_brstm_file(
+        self, song_id: int, music_path: Path
+    ) -> FileDownloadInfo:
+        with PartFile(self.output_dir / music_path) as file:
+            async with self.client.stream_brstm_file(
+                song_id=song_id,
+                chunk_size=self.chunk_size,
+                offset=file.size,
+                validator=file.validator,
+            ) as stream:
+                if stream.offset != file.size:
+                    file.restart()
+                file.validator = stream.validator
+                async for chunk in stream.chunks:
+                    file.write(chunk)
+            md5 = file.commit()
+        logging.info(f"Music saved into {music_path} (md5 {md5}).")
+        return FileDownloadInfo(
+            location=music_path,
+            timestamp=int(self.clock()),
+            file_md5=md5,
+        )
+
+    async def download_brstm_files(self, max_count: int) -> None:
+        # the tasks run in the same thread: no lock is needed
+        unsaved_count = 0
+
+        async def download_or_skip(song: Song) -> None:
+            nonlocal unsaved_count
+            try:
+                await self._download_and_record(song)
+            except RequestFailed:
+                # recorded: the song will be downloaded by a later run
+                pass
+            unsaved_count += 1
+            if unsaved_count >= self.save_batch_size:
+                self.db.save()
+                unsaved_count = 0
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for song in take_songs_to_download(self.db, max_count):
+                    group.create_task(download_or_skip(song))
+        finally:
+            if unsaved_count:
+                self.db.save()
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from smashdown.async_client import AsyncClient
+from smashdown.database import DatabaseBackend, Game
+from smashdown.scheduler import RevisitScheduler
+from smashdown.updater import merge_game_list, merge_song_list
+
+
+@dataclass
+class AsyncUpdater:
+    """Asynchronous counterpart of `Updater`.
+
+    Game pages are fetched concurrently (the concurrency is bounded by the
+    client), and merged into the database as soon as they are received.  The
+    database is saved every `save_batch_size` games.
+    """
+
+    client: AsyncClient
+    db: DatabaseBackend
+    clock: Callable[[], float] = time.time
+    save_batch_size: int = 20
+
+    async def update_game_list(self) -> None:
+        game_list = await self.client.get_game_list()
+        merge_game_list(self.db, game_list, int(self.clock()))
+        self.db.save()
+
+    async def update_game_song_list(self, game: Game) -> None:
+        await self._merge_game_song_list(game)
+        self.db.save()
+
+    async def _merge_game_song_list(self, game: Game) -> None:
+        song_list = await self.client.get_song_list(game.id)
+        merge_song_list(self.db, game, song_list, int(self.clock()))
+
+    async def update_game_song_lists(self, max_count: int) -> None:
+        await self._update_game_song_lists(self.db.get_games_by_last_checked(max_count))
+
+    async def update_game_song_lists_by_change_rate(self, max_count: int) -> None:
+        games = RevisitScheduler().get_games_to_visit(
+            self.db.get_games_by_last_checked(None), max_count
+        )
+        await self._update_game_song_lists(games)
+
+    async def _update_game_song_lists(self, games: list[Game]) -> None:
+        # the tasks run in the same thread: no lock is needed
+        unsaved_count = 0
+
+        async def update(game: Game) -> None:
+            nonlocal unsaved_count
+            await self._merge_game_song_list(game)
+            unsaved_count += 1
+            if unsaved_count >= self.save_batch_size:
+                self.db.save()
+                unsaved_count = 0
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                for game in games:
+                    group.create_task(update(game))
+        finally:
+            if unsaved_count:
+                self.db.save()
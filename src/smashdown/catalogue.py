@@ -0,0 +1,455 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TextIO
+
+import pydantic
+
+from smashdown.database import (
+    KEPT_VISITS,
+    BrstmDownloadFailureSet,
+    BrstmDownloadInfoSet,
+    Change,
+    DatabaseStatistics,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameAdded,
+    GameDeletedFromSiteSet,
+    GameNotFound,
+    GameVisited,
+    OldVisitsDropped,
+    Song,
+    SongAdded,
+    SongDeletedFromSiteSet,
+    SongNotFound,
+    VisitSummary,
+    drop_old_visits,
+    get_last_visit,
+    is_visit_recorded,
+)
+from smashdown.journal import Journal, get_journal_file
+
+# value of the integer columns for None
+NONE = -(2**63)
+
+
+@dataclass(frozen=True, slots=True)
+class DownloadedSong:
+    """A downloaded song, with the titles of the song and its game."""
+
+    song_id: int
+    title: str
+    game_title: str
+    location: Path
+    file_md5: str
+
+
+class Catalogue:
+    """Read-only view of the games and songs of a json database, in a
+    compact form.
+
+    The games and songs are stored by column, in arrays of integers and
+    lists of strings (the failure reasons, repeated a lot, are interned),
+    rather than as pydantic models: a song takes about a tenth of the memory
+    of a `Song` with its `FileDownloadInfo` and `Path`.  The file is read
+    game by game (see `JsonStream`), so the json tree of the whole database
+    is never in memory either.  `Game` and `Song` models are only built
+    when requested, by `get_game` and `get_song`.
+    """
+
+    def __init__(self) -> None:
+        self.game_ids = array("q")
+        self.game_titles: list[str] = []
+        self.game_is_deleted = bytearray()
+        self.game_visits: list[array[int]] = []
+        self.game_old_visits: list[VisitSummary | None] = []
+
+        self.song_ids = array("q")
+        # index of the game of each song
+        self.song_games = array("q")
+        self.song_titles: list[str] = []
+        self.song_is_deleted = bytearray()
+        self.song_added_timestamps = array("q")
+        self.song_locations: list[str | None] = []
+        self.song_download_timestamps = array("q")
+        self.song_md5s: list[str | None] = []
+        # 0 without a failure
+        self.song_failure_counts = array("q")
+        self.song_failure_timestamps = array("q")
+        self.song_failure_reasons: list[str | None] = []
+
+        self._game_indexes: dict[int, int] | None = None
+        self._song_indexes: dict[int, int] | None = None
+        self._songs_of_games: dict[int, list[int]] | None = None
+
+    @staticmethod
+    def build_from_file(file: Path) -> Catalogue:
+        """Read the games and songs of a json database file, and the changes
+        of its journal."""
+        catalogue = Catalogue()
+        with file.open(encoding="utf-8") as fh:
+            stream = JsonStream(fh)
+            for key in stream.read_object_keys():
+                if key != "site":
+                    stream.read_value()
+                    continue
+                for site_key in stream.read_object_keys():
+                    if site_key != "games":
+                        stream.read_value()
+                        continue
+                    for game in stream.read_array_values():
+                        catalogue.add_game(game)
+        logging.info(
+            f"Catalogue read from '{file}' ({len(catalogue.game_ids)} game(s),"
+            f" {len(catalogue.song_ids)} song(s))."
+        )
+        catalogue._replay_journal(Journal(file=get_journal_file(file)))
+        return catalogue
+
+    @staticmethod
+    def build_from_games(games: list[Game]) -> Catalogue:
+        catalogue = Catalogue()
+        for game in games:
+            catalogue.add_game(game.model_dump(mode="json"))
+        return catalogue
+
+    def add_game(self, game: dict[str, Any]) -> None:
+        """Add a game from its json data."""
+        game_index = len(self.game_ids)
+        if self._game_indexes is not None:
+            self._game_indexes.setdefault(game["id"], game_index)
+        self.game_ids.append(game["id"])
+        self.game_titles.append(game["title"])
+        self.game_is_deleted.append(bool(game.get("is_deleted_from_site", False)))
+        self.game_visits.append(array("q", game.get("download_timestamps", ())))
+        old_visits = game.get("old_visits")
+        self.game_old_visits.append(
+            None if old_visits is None else VisitSummary(**old_visits)
+        )
+        for song in game.get("songs", ()):
+            self._add_song(game_index, song)
+
+    def _add_song(self, game_index: int, song: dict[str, Any]) -> None:
+        i = len(self.song_ids)
+        if self._song_indexes is not None:
+            self._song_indexes.setdefault(song["id"], i)
+        if self._songs_of_games is not None:
+            self._songs_of_games.setdefault(game_index, []).append(i)
+        self.song_ids.append(song["id"])
+        self.song_games.append(game_index)
+        self.song_titles.append(song["title"])
+        self.song_is_deleted.append(bool(song.get("is_deleted_from_site", False)))
+        added_timestamp = song.get("added_timestamp")
+        self.song_added_timestamps.append(
+            NONE if added_timestamp is None else added_timestamp
+        )
+        self.song_locations.append(None)
+        self.song_download_timestamps.append(NONE)
+        self.song_md5s.append(None)
+        self.song_failure_counts.append(0)
+        self.song_failure_timestamps.append(NONE)
+        self.song_failure_reasons.append(None)
+        self._set_download_info(i, song.get("brstm_download_info"))
+        self._set_download_failure(i, song.get("brstm_download_failure"))
+
+    def _set_download_info(self, i: int, info: dict[str, Any] | None) -> None:
+        if info is None:
+            self.song_locations[i] = None
+            self.song_download_timestamps[i] = NONE
+            self.song_md5s[i] = None
+        else:
+            self.song_locations[i] = str(info["location"])
+            self.song_download_timestamps[i] = info["timestamp"]
+            self.song_md5s[i] = info["file_md5"]
+
+    def _set_download_failure(self, i: int, failure: dict[str, Any] | None) -> None:
+        if failure is None:
+            self.song_failure_counts[i] = 0
+            self.song_failure_timestamps[i] = NONE
+            self.song_failure_reasons[i] = None
+        else:
+            self.song_failure_counts[i] = failure["count"]
+            self.song_failure_timestamps[i] = failure["timestamp"]
+            self.song_failure_reasons[i] = sys.intern(failure["reason"])
+
+    def _replay_journal(self, journal: Journal) -> None:
+        """Apply the changes of the journal, like `Database._replay_journal`."""
+        adapter: pydantic.TypeAdapter[Change] = pydantic.TypeAdapter(Change)
+        lines = journal.read()
+        for i, line in enumerate(lines):
+            try:
+                change = adapter.validate_json(line)
+            except pydantic.ValidationError:
+                if i < len(lines) - 1:
+                    raise
+                logging.warning(f"Ignoring truncated change in '{journal.file}'.")
+                break
+            if isinstance(change, GameAdded):
+                if change.game.id not in self._get_game_indexes():
+                    self.add_game(change.game.model_dump(mode="json"))
+            elif isinstance(change, SongAdded):
+                if change.song.id not in self._get_song_indexes():
+                    self._add_song(
+                        self._get_game_index(change.game_id),
+                        change.song.model_dump(mode="json"),
+                    )
+            elif isinstance(change, GameDeletedFromSiteSet):
+                index = self._get_game_index(change.game_id)
+                self.game_is_deleted[index] = change.is_deleted_from_site
+            elif isinstance(change, SongDeletedFromSiteSet):
+                index = self._get_song_index(change.song_id)
+                self.song_is_deleted[index] = change.is_deleted_from_site
+            elif isinstance(change, BrstmDownloadInfoSet):
+                info = change.brstm_download_info
+                self._set_download_info(
+                    self._get_song_index(change.song_id),
+                    None if info is None else info.model_dump(mode="json"),
+                )
+            elif isinstance(change, BrstmDownloadFailureSet):
+                failure = change.brstm_download_failure
+                self._set_download_failure(
+                    self._get_song_index(change.song_id),
+                    None if failure is None else failure.model_dump(),
+                )
+            elif isinstance(change, GameVisited):
+                index = self._get_game_index(change.game_id)
+                visits = self.game_visits[index]
+                if not is_visit_recorded(
+                    change.timestamp, visits, self.game_old_visits[index]
+                ):
+                    visits.append(change.timestamp)
+                    self._drop_old_visits(index)
+            elif isinstance(change, OldVisitsDropped):
+                for index in range(len(self.game_ids)):
+                    self._drop_old_visits(index, change.kept_visits)
+        if lines:
+            logging.info(f"{len(lines)} change(s) replayed from '{journal.file}'.")
+
+    def _drop_old_visits(self, index: int, kept_visits: int = KEPT_VISITS) -> None:
+        self.game_old_visits[index] = drop_old_visits(
+            self.game_visits[index], self.game_old_visits[index], kept_visits
+        )
+
+    def _get_game_indexes(self) -> dict[int, int]:
+        if self._game_indexes is None:
+            self._game_indexes = {}
+            for i, game_id in enumerate(self.game_ids):
+                self._game_indexes.setdefault(game_id, i)
+        return self._game_indexes
+
+    def _get_song_indexes(self) -> dict[int, int]:
+        if self._song_indexes is None:
+            self._song_indexes = {}
+            for i, song_id in enumerate(self.song_ids):
+                self._song_indexes.setdefault(song_id, i)
+        return self._song_indexes
+
+    def _get_game_index(self, game_id: int) -> int:
+        index = self._get_game_indexes().get(game_id)
+        if index is None:
+            raise GameNotFound
+        return index
+
+    def _get_song_index(self, song_id: int) -> int:
+        index = self._get_song_indexes().get(song_id)
+        if index is None:
+            raise SongNotFound
+        return index
+
+    def _get_songs_of_games(self) -> dict[int, list[int]]:
+        if self._songs_of_games is None:
+            self._songs_of_games = {}
+            for i, game_index in enumerate(self.song_games):
+                self._songs_of_games.setdefault(game_index, []).append(i)
+        return self._songs_of_games
+
+    def get_game(self, game_id: int) -> Game:
+        """Build the model of the game, with its songs."""
+        index = self._get_game_index(game_id)
+        return Game(
+            id=self.game_ids[index],
+            title=self.game_titles[index],
+            songs=[
+                self._build_song(i) for i in self._get_songs_of_games().get(index, ())
+            ],
+            is_deleted_from_site=bool(self.game_is_deleted[index]),
+            download_timestamps=list(self.game_visits[index]),
+            old_visits=self.game_old_visits[index],
+        )
+
+    def get_song(self, song_id: int) -> Song:
+        """Build the model of the song."""
+        return self._build_song(self._get_song_index(song_id))
+
+    def _build_song(self, i: int) -> Song:
+        location = self.song_locations[i]
+        md5 = self.song_md5s[i]
+        info = None
+        if location is not None and md5 is not None:
+            info = FileDownloadInfo(
+                location=Path(location),
+                timestamp=self.song_download_timestamps[i],
+                file_md5=md5,
+            )
+        failure = None
+        reason = self.song_failure_reasons[i]
+        if reason is not None:
+            failure = DownloadFailure(
+                timestamp=self.song_failure_timestamps[i],
+                count=self.song_failure_counts[i],
+                reason=reason,
+            )
+        added_timestamp = self.song_added_timestamps[i]
+        return Song(
+            id=self.song_ids[i],
+            title=self.song_titles[i],
+            is_deleted_from_site=bool(self.song_is_deleted[i]),
+            brstm_download_info=info,
+            brstm_download_failure=failure,
+            added_timestamp=None if added_timestamp == NONE else added_timestamp,
+        )
+
+    def get_downloaded_songs(self) -> Iterator[DownloadedSong]:
+        for i, location in enumerate(self.song_locations):
+            md5 = self.song_md5s[i]
+            if location is not None and md5 is not None:
+                yield DownloadedSong(
+                    song_id=self.song_ids[i],
+                    title=self.song_titles[i],
+                    game_title=self.game_titles[self.song_games[i]],
+                    location=Path(location),
+                    file_md5=md5,
+                )
+
+    def compute_statistics(self) -> DatabaseStatistics:
+        """Return the statistics counted from all the games and songs, like
+        `Database.compute_statistics`."""
+        stats = DatabaseStatistics()
+        stats.games = len(self.game_ids)
+        oldest_visit: int | None = None
+        for visits, old_visits, is_deleted in zip(
+            self.game_visits, self.game_old_visits, self.game_is_deleted
+        ):
+            last_visit = get_last_visit(visits, old_visits)
+            if last_visit is not None:
+                stats.games_visited += 1
+                if not is_deleted and (
+                    oldest_visit is None or last_visit < oldest_visit
+                ):
+                    oldest_visit = last_visit
+        stats.games_not_visited = stats.games - stats.games_visited
+        stats.games_deleted_from_site = sum(self.game_is_deleted)
+        stats.game_oldest_visit = oldest_visit or 0
+        stats.songs = len(self.song_ids)
+        stats.songs_downloaded = stats.songs - self.song_locations.count(None)
+        stats.songs_not_downloaded = stats.songs - stats.songs_downloaded
+        stats.songs_deleted_from_site = sum(self.song_is_deleted)
+        stats.songs_with_download_failure = (
+            stats.songs - self.song_failure_reasons.count(None)
+        )
+        return stats
+
+
+class JsonStream:
+    """Read a json document value by value, so that the values of a large
+    array can be processed one at a time.
+
+    The text is read by chunks, and each value is decoded by the json
+    module.  Only the objects and arrays read with `read_object_keys` and
+    `read_array_values` are walked through: any other value is decoded
+    whole.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, fh: TextIO) -> None:
+        self._fh = fh
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def read_object_keys(self) -> Iterator[str]:
+        """Iterate over the keys of an object: the value of each key must be
+        read before the next key."""
+        self._expect("{")
+        if self._peek() == "}":
+            self._position += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise ValueError(f"object key expected at {self._position}")
+            self._expect(":")
+            yield key
+            if self._next_separator("}"):
+                return
+
+    def read_array_values(self) -> Iterator[Any]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.read_value()
+            if self._next_separator("]"):
+                return
+
+    def read_value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._read_chunk()
+                continue
+            # a number may continue in the next chunk
+            if end < len(self._buffer) or self._eof:
+                self._position = end
+                return value
+            self._read_chunk()
+
+    def _next_separator(self, closing: str) -> bool:
+        char = self._peek()
+        self._position += 1
+        if char == closing:
+            return True
+        if char != ",":
+            raise ValueError(f"',' or '{closing}' expected at {self._position}")
+        return False
+
+    def _expect(self, char: str) -> None:
+        if self._peek() != char:
+            raise ValueError(f"'{char}' expected at {self._position}")
+        self._position += 1
+
+    def _peek(self) -> str:
+        """Skip the whitespaces and return the next character."""
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in " \t\n\r"
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if self._eof:
+                raise ValueError("unexpected end of the document")
+            self._read_chunk()
+
+    def _read_chunk(self) -> None:
+        chunk = self._fh.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+        # drop the text already read
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
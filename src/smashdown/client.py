@@ -1,17 +1,28 @@
 from __future__ import annotations
 
 import logging
-import random
 import re
-import time
+import threading
 from abc import abstractmethod
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Protocol
-from urllib.parse import urljoin
+from typing import ContextManager, Iterator, Mapping, Protocol
+from urllib.parse import urljoin, urlsplit
 
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
+
+from smashdown.http_cache import PageNotModified, ValidatorCache
+from smashdown.rate import AdaptiveRateController, RateLimiter, parse_retry_after
+from smashdown.retry import (
+    TRANSIENT_STATUSES,
+    CircuitBreaker,
+    RequestFailed,
+    RequestInterrupted,
+    RetryPolicy,
+)
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
 
@@ -34,31 +45,118 @@ class SongInfo:
     title: str
 
 
+@dataclass
+class BrstmStream:
+    # offset of the first chunk in the file: 0 if the server has ignored
+    # the requested range
+    offset: int
+    # ETag of the file, or its Last-Modified date if it has none
+    validator: str | None
+    chunks: Iterator[bytes]
+
+
+def get_validator(headers: Mapping[str, str]) -> str | None:
+    """Return the validator of a file for the `If-Range` header of the
+    requests resuming its download."""
+    return headers.get("ETag") or headers.get("Last-Modified")
+
+
+def get_range_headers(offset: int, validator: str | None) -> dict[str, str]:
+    """Return the headers requesting the file from `offset`, if it still has
+    the `validator`: without one, the server can't tell whether the file has
+    changed, so the whole file is requested."""
+    if offset == 0 or validator is None:
+        return {}
+    return {"Range": f"bytes={offset}-", "If-Range": validator}
+
+
+def check_content_range(url: str, offset: int, content_range: str | None) -> None:
+    """Raise `RequestFailed` if a partial response to `url` doesn't start at
+    the requested `offset`: its bytes would be appended at the wrong place."""
+    m = re.match(r"bytes (\d+)-", content_range or "")
+    if m is None or int(m.group(1)) != offset:
+        raise RequestFailed(
+            f"unexpected range {content_range} for {url}, expected from {offset}",
+            status=206,
+        )
+
+
+def check_response(
+    url: str,
+    status: int,
+    content_type: str | None,
+    html: bool,
+    statuses: tuple[int, ...],
+) -> None:
+    """Raise `RequestFailed` if the response to `url` hasn't one of the
+    `statuses`, or if its content is not html while `html` is expected (or
+    the other way round)."""
+    if status not in statuses:
+        raise RequestFailed(
+            f"status {status} for {url}",
+            status=status,
+            transient=status in TRANSIENT_STATUSES,
+        )
+    if status in (200, 206) and content_type is not None:
+        # an error page sent with a 200 status must not be parsed or saved as
+        # a brstm file
+        is_html = content_type.startswith("text/html")
+        if is_html != html:
+            raise RequestFailed(
+                f"unexpected content type {content_type} for {url}", status=status
+            )
+
+
 class Client(Protocol):
+    # with `conditional`, `PageNotModified` is raised if the page hasn't
+    # changed since the last conditional request.  `RequestFailed` is raised
+    # if the site doesn't give the expected response.
+
     @abstractmethod
-    def get_game_list(self) -> list[GameInfo]:
+    def get_game_list(self, conditional: bool = False) -> list[GameInfo]:
         ...  # pragma:nocover
 
     @abstractmethod
-    def get_song_list(self, game_id: int) -> list[SongInfo]:
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
         ...  # pragma:nocover
 
     @abstractmethod
     def get_brstm_file(self, song_id: int) -> bytes:
         ...  # pragma:nocover
 
+    @abstractmethod
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> ContextManager[BrstmStream]:
+        """Stream the brstm file by chunks, starting at `offset` if the
+        server supports it (and if the file still has the given `validator`)."""
+        ...  # pragma:nocover
+
 
 @dataclass
 class SmashClient(Client):
     base_url: str
     writer: Writer | None = None
-    nap_time: tuple[int, int] | None = (60, 120)
+    # spacing of the requests, shared by the threads using the client (None
+    # to send the requests without waiting)
+    limiter: RateLimiter | None = field(default_factory=AdaptiveRateController)
 
     game_url_path_template: str = "/game/{id}"
     brstm_url_path_template: str = "/brstm/{id}"
 
     user_agent: str = USER_AGENT
-    _first_call: bool = True
+    parser: PageParser = field(default_factory=lambda: Parser())
+    cache: ValidatorCache | None = None
+    # (connect, read) timeouts in seconds: a hanging connection is a failure
+    timeout: tuple[float, float] = (10.0, 60.0)
+    # retries of the transient failures (None to fail at the first one)
+    retry: RetryPolicy | None = field(default_factory=RetryPolicy)
+    # shared by the threads using the client (None to never stop)
+    breaker: CircuitBreaker | None = field(default_factory=CircuitBreaker)
 
     def __post_init__(self) -> None:
         headers = {
@@ -66,44 +164,184 @@ class SmashClient(Client):
         }
         self._session = requests.Session()
         self._session.headers.update(headers)
+        self._interrupted = threading.Event()
 
-    def get_game_list(self) -> list[GameInfo]:
-        self._nap()
-        url = self.base_url
-        logging.debug(f"Downloading from {url}.")
-        result = self._session.get(url)
-        html = result.text
-        logging.info(f"Downloaded from {url}.")
+    def interrupt(self) -> None:
+        """Make the requests waiting for their turn or for a retry raise
+        `RequestInterrupted`, and don't send any new request.  It can be
+        called from any thread (or from a signal handler)."""
+        self._interrupted.set()
+
+    def get_game_list(self, conditional: bool = False) -> list[GameInfo]:
+        html = self._get_page(self.base_url, conditional)
         if self.writer:
             self.writer.write_home_page_html(html)
-        return Parser.get_game_list_from_home_page(html)
+        with self._forgetting_on_failure(self.base_url, conditional):
+            return self.parser.get_game_list_from_home_page(html)
 
-    def get_song_list(self, game_id: int) -> list[SongInfo]:
-        self._nap()
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
         url = urljoin(self.base_url, self.game_url_path_template.format(id=game_id))
-        logging.debug(f"Downloading from {url}.")
-        result = self._session.get(url)
-        html = result.text
-        logging.info(f"Downloaded from {url}.")
+        html = self._get_page(url, conditional)
         if self.writer:
             self.writer.write_game_page_html(game_id, html)
-        return Parser.get_song_list_from_game_page(html)
+        with self._forgetting_on_failure(url, conditional):
+            return self.parser.get_song_list_from_game_page(html)
+
+    @contextmanager
+    def _forgetting_on_failure(self, url: str, conditional: bool) -> Iterator[None]:
+        # a page that can't be parsed must not be skipped as not modified by
+        # the next conditional request
+        try:
+            yield
+        except Exception:
+            if conditional and self.cache is not None:
+                self.cache.forget(url)
+            raise
+
+    def _get_page(self, url: str, conditional: bool) -> str:
+        # only conditional requests use and update the cache, as their
+        # content is merged into the database
+        cache = self.cache if conditional else None
+        headers = {} if cache is None else cache.get_request_headers(url)
+        result = self._get(url, headers=headers, statuses=(200, 304))
+        if cache is not None and not cache.record_response(
+            url, result.status_code, result.headers, result.content
+        ):
+            logging.info(f"Page {url} not modified.")
+            raise PageNotModified
+        return result.text
 
     def get_brstm_file(self, song_id: int) -> bytes:
-        self._nap()
         url = urljoin(self.base_url, self.brstm_url_path_template.format(id=song_id))
-        logging.debug(f"Downloading from {url}.")
-        result = self._session.get(url)
-        binary = result.content
+        return self._get(url, html=False).content
+
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        url = urljoin(self.base_url, self.brstm_url_path_template.format(id=song_id))
+        headers = get_range_headers(offset, validator)
+        result = self._get(
+            url, headers=headers, stream=True, html=False, statuses=(200, 206, 416)
+        )
+        if result.status_code == 416:
+            # the range is not satisfiable, we download the whole file
+            result.close()
+            result = self._get(url, stream=True, html=False)
+        with result:
+            if result.status_code == 206:
+                check_content_range(url, offset, result.headers.get("Content-Range"))
+            yield BrstmStream(
+                offset=offset if result.status_code == 206 else 0,
+                validator=get_validator(result.headers),
+                chunks=_iter_chunks(url, result, chunk_size),
+            )
+        logging.info(f"Downloaded from {url}.")
+
+    def _get(
+        self,
+        url: str,
+        headers: dict[str, str] | None = None,
+        stream: bool = False,
+        html: bool = True,
+        statuses: tuple[int, ...] = (200,),
+    ) -> requests.Response:
+        """Send the request, retrying the transient failures, and return the
+        response if it has one of the `statuses`.  Otherwise, raise
+        `RequestFailed` (or `CircuitOpen` if the site is failing)."""
+        retry = 0
+        while True:
+            try:
+                return self._get_once(url, headers, stream, html, statuses)
+            except RequestFailed as e:
+                retry += 1
+                if (
+                    not e.transient
+                    or self.retry is None
+                    or retry >= self.retry.max_attempts
+                ):
+                    raise
+                delay = self.retry.get_delay(retry)
+                logging.warning(f"{e.message}, retrying in {delay:.1f} seconds.")
+                self._sleep(delay)
+
+    def _get_once(
+        self,
+        url: str,
+        headers: dict[str, str] | None,
+        stream: bool,
+        html: bool,
+        statuses: tuple[int, ...],
+    ) -> requests.Response:
+        if self._interrupted.is_set():
+            raise RequestInterrupted(f"request to {url} not sent")
+        if self.breaker is not None:
+            self.breaker.before_request()
+        host = urlsplit(url).netloc
+        if self.limiter is not None:
+            delay = self.limiter.reserve(host)
+            if delay > 0:
+                logging.info(f"Waiting for {delay:.1f} seconds before {url}.")
+                self._sleep(delay)
+        logging.debug(f"Downloading from {url} (headers {headers}).")
+        try:
+            result = self._session.get(
+                url, headers=headers, stream=stream, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            # including `requests.Timeout` and `requests.ConnectionError`
+            if self.limiter is not None:
+                self.limiter.record(host, None, 0.0)
+            self._record_failure()
+            raise RequestFailed(f"request to {url} failed ({e!r})") from e
+        if self.limiter is not None:
+            self.limiter.record(
+                host,
+                result.status_code,
+                result.elapsed.total_seconds(),
+                parse_retry_after(result.headers.get("Retry-After")),
+            )
+        try:
+            check_response(
+                url,
+                result.status_code,
+                result.headers.get("Content-Type"),
+                html,
+                statuses,
+            )
+        except RequestFailed as e:
+            result.close()
+            if e.transient:
+                self._record_failure()
+            elif self.breaker is not None:
+                # the site is up, even if the url is wrong
+                self.breaker.record_success()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
         logging.info(f"Downloaded from {url}.")
-        return binary
+        return result
+
+    def _sleep(self, delay: float) -> None:
+        if self._interrupted.wait(delay):
+            raise RequestInterrupted("waiting interrupted")
+
+    def _record_failure(self) -> None:
+        if self.breaker is not None:
+            self.breaker.record_failure()
+
 
-    def _nap(self) -> None:
-        if not self._first_call and self.nap_time is not None:
-            duration = random.randint(self.nap_time[0], self.nap_time[1])
-            logging.info(f"Napping for {duration} seconds.")
-            time.sleep(duration)
-        self._first_call = False
+def _iter_chunks(
+    url: str, result: requests.Response, chunk_size: int
+) -> Iterator[bytes]:
+    try:
+        yield from result.iter_content(chunk_size=chunk_size)
+    except requests.RequestException as e:
+        raise RequestFailed(f"download from {url} interrupted ({e!r})") from e
 
 
 class Writer(Protocol):
@@ -132,7 +370,17 @@ class FileWriter(Writer):
         logging.info(f"HTML saved in {file}.")
 
 
-class Parser:
+class PageParser(Protocol):
+    @abstractmethod
+    def get_game_list_from_home_page(self, html: str) -> list[GameInfo]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_song_list_from_game_page(self, html: str) -> list[SongInfo]:
+        ...  # pragma:nocover
+
+
+class Parser(PageParser):
     @staticmethod
     def get_game_list_from_home_page(html: str) -> list[GameInfo]:
         href_game_pattern = re.compile(r"^/game/")
@@ -189,3 +437,95 @@ class Parser:
             )
         logging.info(f"Extracted {len(songs)} song(s) from game page.")
         return songs
+
+
+class LxmlParser(PageParser):
+    """Same results as `Parser`, but using the lxml tree directly, which is
+    much faster than building a BeautifulSoup tree for large home pages."""
+
+    @staticmethod
+    def get_game_list_from_home_page(html: str) -> list[GameInfo]:
+        song_count_pattern = re.compile(r"^(\d+) songs?")
+        id_game_pattern = re.compile(r"/game/(\d+)")
+
+        games: list[GameInfo] = []
+        for anchor in LxmlParser._find_anchors(html, "/game/"):
+            path = anchor.get("href", "")
+            id_match = id_game_pattern.fullmatch(path)
+            if id_match is None:
+                raise ParsingError(message=f"unable to find the game id in {path}")
+            id = int(id_match.group(1))
+            title = LxmlParser._get_text(anchor)
+
+            song_count_match = song_count_pattern.fullmatch(
+                LxmlParser._get_next_sibling_text(anchor.getparent())
+            )
+            if song_count_match is None:
+                raise ParsingError(
+                    message=f"unable to find the song count for game {id}"
+                )
+            song_count = int(song_count_match.group(1))
+
+            games.append(
+                GameInfo(
+                    id=id,
+                    title=title,
+                    song_count=song_count,
+                )
+            )
+        logging.info(f"Parsed {len(games)} game(s) from home page.")
+        return games
+
+    @staticmethod
+    def get_song_list_from_game_page(html: str) -> list[SongInfo]:
+        id_song_pattern = re.compile(r"/song/(\d+)")
+
+        songs: list[SongInfo] = []
+        for anchor in LxmlParser._find_anchors(html, "/song/"):
+            path = anchor.get("href", "")
+            id_match = id_song_pattern.fullmatch(path)
+            if id_match is None:
+                raise ParsingError(message=f"unable to find the song id in {path}")
+            id = int(id_match.group(1))
+            title = LxmlParser._get_text(anchor)
+            songs.append(
+                SongInfo(
+                    id=id,
+                    title=title,
+                )
+            )
+        logging.info(f"Extracted {len(songs)} song(s) from game page.")
+        return songs
+
+    @staticmethod
+    def _find_anchors(html: str, href_prefix: str) -> Iterator[etree._Element]:
+        if not html.strip():
+            return
+        # encoded, because lxml rejects strings with an encoding declaration
+        parser = etree.HTMLParser(encoding="utf-8")
+        root = etree.fromstring(html.encode("utf-8"), parser)
+        if root is None:
+            return
+        for anchor in root.iter("a"):
+            if anchor.get("href", "").startswith(href_prefix):
+                yield anchor
+
+    @staticmethod
+    def _get_text(element: etree._Element) -> str:
+        # like `get_text` of BeautifulSoup: the text of the element and its
+        # descendants, without the comments
+        return "".join(element.itertext())
+
+    @staticmethod
+    def _get_next_sibling_text(element: etree._Element | None) -> str:
+        # BeautifulSoup has text nodes: the next sibling of the element is
+        # its tail text if any, else the next element
+        if element is None:
+            return ""
+        tail: str | None = element.tail
+        if tail is not None:
+            return tail
+        sibling = element.getnext()
+        if sibling is None or not isinstance(sibling.tag, str):
+            return ""
+        return LxmlParser._get_text(sibling)
@@ -0,0 +1,316 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable
+
+from smashdown.client import Client
+from smashdown.database import DatabaseBackend, Game, Song
+from smashdown.downloader import (
+    Downloader,
+    advance_download_cursor,
+    record_download,
+    record_failure,
+)
+from smashdown.http_cache import ValidatorCache
+from smashdown.retry import CircuitOpen, RequestFailed, RequestInterrupted
+from smashdown.updater import Updater
+
+# number of pending songs examined to find the next download
+SONG_SCAN_SIZE = 100
+
+
+class TaskKind(Enum):
+    GAME_LIST = "game list"
+    SONG_LIST = "song list"
+    DOWNLOAD = "download"
+
+
+@dataclass(frozen=True)
+class Task:
+    kind: TaskKind
+    # game id for a song list, song id for a download
+    id: int = 0
+
+
+@dataclass
+class CrawlStatistics:
+    game_lists: int = 0
+    song_lists: int = 0
+    songs_found: int = 0
+    songs_downloaded: int = 0
+    failures: int = 0
+
+
+@dataclass
+class Crawler:
+    """Update the game list, the song lists and download the songs in a
+    single long-running process.
+
+    The pages and files are fetched by a pool of `workers` threads sharing
+    the client (and so its rate limit), while the calling thread is the only
+    one to use the database: it chooses the next tasks and records their
+    results.  The home page is visited every `game_list_interval` seconds,
+    the games every `revisit_interval` seconds (the ones never visited
+    first), and the songs found on a game page are downloaded before the
+    other pending songs.  A failed page or download is retried after
+    `retry_interval` seconds.
+
+    The database (and the validators of the `cache`) are saved every
+    `checkpoint_interval` seconds, and when the crawl ends: when `stop` is
+    called, or when there is nothing left to do if `exit_when_idle`.  The
+    validators of a page are recorded by the client as soon as it is
+    received, so when a checkpoint is due while pages are being fetched, no
+    other page is fetched (only files) until they are merged.
+    """
+
+    client: Client
+    db: DatabaseBackend
+    output_dir: Path
+    workers: int = 2
+    cache: ValidatorCache | None = None
+    checkpoint_interval: float = 300.0
+    game_list_interval: float = 24 * 3600.0
+    revisit_interval: float = 7 * 24 * 3600.0
+    retry_interval: float = 3600.0
+    # pause after the circuit breaker of the client has opened
+    circuit_pause: float = 60.0
+    # maximum wait when there is nothing to do
+    idle_wait: float = 60.0
+    exit_when_idle: bool = False
+    clock: Callable[[], float] = time.time
+    statistics: CrawlStatistics = field(default_factory=CrawlStatistics, init=False)
+
+    def __post_init__(self) -> None:
+        self._updater = Updater(client=self.client, db=self.db, clock=self.clock)
+        self._downloader = Downloader(
+            client=self.client, db=self.db, output_dir=self.output_dir, clock=self.clock
+        )
+        self._stopping = threading.Event()
+        self._in_flight: set[Task] = set()
+        self._new_song_ids: deque[int] = deque()
+        self._failed_games: dict[int, float] = {}
+        self._next_game_list = 0.0
+        self._paused_until = 0.0
+        self._prefer_songs = False
+        self._checkpoint_pending = False
+        # a page may have been received but not merged
+        self._merge_failed = False
+
+    def stop(self) -> None:
+        """Stop the crawl once the tasks in progress are done.  It can be
+        called from any thread (or from a signal handler)."""
+        self._stopping.set()
+
+    def run(self) -> None:
+        error: Exception | None = None
+        next_checkpoint = time.monotonic() + self.checkpoint_interval
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures: dict[Future[Any], Task] = {}
+            try:
+                while True:
+                    while not self._stopping.is_set() and len(futures) < self.workers:
+                        task = self._get_next_task()
+                        if task is None:
+                            break
+                        futures[self._submit(executor, task)] = task
+                    timeout = self.idle_wait
+                    if not self._checkpoint_pending:
+                        timeout = min(
+                            timeout, max(0.0, next_checkpoint - time.monotonic())
+                        )
+                    if futures:
+                        done, _ = wait(
+                            futures, timeout=timeout, return_when=FIRST_COMPLETED
+                        )
+                        for future in done:
+                            task = futures.pop(future)
+                            self._in_flight.discard(task)
+                            try:
+                                self._record(task, future)
+                            except Exception as e:
+                                logging.error(f"{task.kind.value} failed, stopping.")
+                                if task.kind != TaskKind.DOWNLOAD:
+                                    self._merge_failed = True
+                                error = e
+                                self.stop()
+                    elif self._stopping.is_set() or (
+                        self.exit_when_idle and time.monotonic() >= self._paused_until
+                    ):
+                        break
+                    else:
+                        self._stopping.wait(timeout)
+                    if time.monotonic() >= next_checkpoint:
+                        self._checkpoint_pending = (
+                            self.cache is not None and self._is_fetching_pages()
+                        )
+                        if not self._checkpoint_pending:
+                            self.checkpoint()
+                            next_checkpoint = (
+                                time.monotonic() + self.checkpoint_interval
+                            )
+            finally:
+                for future in futures:
+                    future.cancel()
+                self.checkpoint()
+        if error is not None:
+            raise error
+
+    def checkpoint(self) -> None:
+        """Save the database, and the validators of the `cache` if no page is
+        being fetched and all the pages received have been merged: otherwise,
+        a page whose validators are saved but whose content is not merged
+        would be skipped as not modified by the next runs."""
+        self.db.save()
+        if self.cache is not None:
+            if self._is_fetching_pages():
+                logging.info("Pages being fetched: HTTP cache not saved.")
+            elif self._merge_failed:
+                logging.warning("A page couldn't be merged: HTTP cache not saved.")
+            else:
+                self.cache.save()
+        stats = self.statistics
+        logging.info(
+            f"Checkpoint: {stats.game_lists} game list(s), {stats.song_lists}"
+            f" song list(s), {stats.songs_found} new song(s),"
+            f" {stats.songs_downloaded} download(s), {stats.failures} failure(s)."
+        )
+
+    def _is_fetching_pages(self) -> bool:
+        return any(task.kind != TaskKind.DOWNLOAD for task in self._in_flight)
+
+    def _get_next_task(self) -> Task | None:
+        if time.monotonic() < self._paused_until:
+            return None
+        if self._checkpoint_pending:
+            # the pages being fetched are merged before the checkpoint
+            return self._get_new_song_task() or self._get_download_task()
+        task = self._get_game_list_task() or self._get_new_song_task()
+        if task is not None:
+            return task
+        if self._prefer_songs:
+            task = self._get_download_task() or self._get_song_list_task()
+        else:
+            task = self._get_song_list_task() or self._get_download_task()
+        if task is not None:
+            # alternate the discovery and the downloads
+            self._prefer_songs = task.kind != TaskKind.DOWNLOAD
+        return task
+
+    def _get_game_list_task(self) -> Task | None:
+        task = Task(TaskKind.GAME_LIST)
+        if task in self._in_flight or self.clock() < self._next_game_list:
+            return None
+        return task
+
+    def _get_new_song_task(self) -> Task | None:
+        while self._new_song_ids:
+            song = self.db.get_song_from_id(self._new_song_ids.popleft())
+            if self._is_download_due(song):
+                return Task(TaskKind.DOWNLOAD, song.id)
+        return None
+
+    def _get_song_list_task(self) -> Task | None:
+        count = len(self._in_flight) + len(self._failed_games) + 1
+        for game in self.db.get_games_by_last_checked(count):
+            if not self._is_visit_due(game):
+                # the next games have been visited more recently
+                return None
+            task = Task(TaskKind.SONG_LIST, game.id)
+            if task in self._in_flight:
+                continue
+            failed_at = self._failed_games.get(game.id)
+            if failed_at is not None and self.clock() < failed_at + self.retry_interval:
+                continue
+            return task
+        return None
+
+    def _get_download_task(self) -> Task | None:
+        count = len(self._in_flight) + SONG_SCAN_SIZE
+        for song in self.db.get_songs_with_no_brstm_downloaded(count):
+            if self._is_download_due(song):
+                advance_download_cursor(self.db, song)
+                return Task(TaskKind.DOWNLOAD, song.id)
+        return None
+
+    def _is_visit_due(self, game: Game) -> bool:
+        last_checked = game.last_checked
+        return (
+            last_checked is None or self.clock() >= last_checked + self.revisit_interval
+        )
+
+    def _is_download_due(self, song: Song) -> bool:
+        if (
+            song.is_deleted_from_site
+            or song.brstm_download_info is not None
+            or Task(TaskKind.DOWNLOAD, song.id) in self._in_flight
+        ):
+            return False
+        failure = song.brstm_download_failure
+        return (
+            failure is None or self.clock() >= failure.timestamp + self.retry_interval
+        )
+
+    def _submit(self, executor: ThreadPoolExecutor, task: Task) -> Future[Any]:
+        # the database is only used by this thread
+        self._in_flight.add(task)
+        if task.kind == TaskKind.GAME_LIST:
+            return executor.submit(self._updater.fetch_game_list)
+        if task.kind == TaskKind.SONG_LIST:
+            return executor.submit(self._updater.fetch_song_list, task.id)
+        song = self.db.get_song_from_id(task.id)
+        music_path = self._downloader.get_song_path(song)
+        return executor.submit(self._downloader.fetch_brstm_file, task.id, music_path)
+
+    def _record(self, task: Task, future: Future[Any]) -> None:
+        try:
+            result = future.result()
+        except RequestInterrupted:
+            # not done: will be done by the next crawl
+            return
+        except CircuitOpen as e:
+            logging.warning(
+                f"{e.message}: crawl paused for {self.circuit_pause:.0f} seconds."
+            )
+            self._paused_until = time.monotonic() + self.circuit_pause
+            return
+        except RequestFailed as e:
+            self.statistics.failures += 1
+            self._record_failure(task, e)
+            return
+        if task.kind == TaskKind.GAME_LIST:
+            game_list, timestamp = result
+            self._updater.record_game_list(game_list, timestamp)
+            self._next_game_list = timestamp + self.game_list_interval
+            self.statistics.game_lists += 1
+        elif task.kind == TaskKind.SONG_LIST:
+            song_list, timestamp = result
+            game = self.db.get_game_from_id(task.id)
+            known_song_ids = {song.id for song in game.songs}
+            self._updater.record_song_list(game, song_list, timestamp)
+            self._failed_games.pop(task.id, None)
+            self.statistics.song_lists += 1
+            for song_info in song_list or ():
+                if song_info.id not in known_song_ids:
+                    # downloaded before the other pending songs
+                    self._new_song_ids.append(song_info.id)
+                    self.statistics.songs_found += 1
+        else:
+            song = self.db.get_song_from_id(task.id)
+            record_download(self.db, song, result)
+            self.statistics.songs_downloaded += 1
+
+    def _record_failure(self, task: Task, error: RequestFailed) -> None:
+        if task.kind == TaskKind.GAME_LIST:
+            logging.warning(f"Update of the game list failed: {error.message}.")
+            self._next_game_list = self.clock() + self.retry_interval
+        elif task.kind == TaskKind.SONG_LIST:
+            logging.warning(f"Update of game {task.id} failed: {error.message}.")
+            self._failed_games[task.id] = self.clock()
+        else:
+            song = self.db.get_song_from_id(task.id)
+            record_failure(self.db, song, error, int(self.clock()))
@@ -1,16 +1,54 @@
 from __future__ import annotations
 
-import functools
+import gc
+import hashlib
 import json
 import logging
-from dataclasses import dataclass
+import os
+from abc import abstractmethod
+from collections.abc import Iterable, Iterator, MutableSequence, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
 from random import Random
-from typing import Any, Optional
+from typing import Annotated, Any, Literal, Optional, Protocol, TypeVar, Union
 
 import pydantic
 from pydantic import BaseModel, Field, PrivateAttr
 
+from smashdown.frontier import DownloadOrder, Frontier, FrontierData
+from smashdown.journal import Journal, get_journal_file
+
+try:
+    import orjson
+
+    def _loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+except ImportError:  # pragma:nocover
+
+    def _loads(data: bytes) -> Any:
+        return json.loads(data)
+
+
+# Version of the json files written by `Database.compact`.  Files with a
+# checksum file of another version are fully validated on read.
+FORMAT_VERSION = 8
+
+# Number of visits kept in the `download_timestamps` of the site and of each
+# game: the older ones are only counted in their `old_visits`.
+KEPT_VISITS = 10
+
+
+def get_checksum_file(db_file: Path) -> Path:
+    """Return the path of the checksum file associated with the `db_file`."""
+    return db_file.with_name(db_file.name + ".checksum")
+
+
+def get_statistics_file(db_file: Path) -> Path:
+    """Return the path of the statistics file associated with the `db_file`."""
+    return db_file.with_name(db_file.name + ".statistics")
+
 
 class GameNotFound(Exception):
     ...  # pragma:nocover
@@ -26,60 +64,513 @@ class FileDownloadInfo(BaseModel):
     file_md5: str
 
 
-class Base(BaseModel):
+class DownloadFailure(BaseModel):
+    """Last failure of the download of a file, and number of failures in a
+    row."""
+
+    timestamp: int
+    count: int
+    reason: str
+
+
+class VisitSummary(BaseModel):
+    """Number of visits, and times of the first and latest ones."""
+
+    count: int
+    first: int
+    last: int
+
     @staticmethod
-    def _get_last_checked(timestamps: list[int]) -> int | None:
-        if len(timestamps) == 0:
+    def of(
+        timestamps: Iterable[int], previous: VisitSummary | None = None
+    ) -> VisitSummary | None:
+        """Return the summary of the visits at `timestamps` and of the
+        `previous` ones (None if there are none)."""
+        summary = previous
+        for timestamp in timestamps:
+            if summary is None:
+                summary = VisitSummary(count=1, first=timestamp, last=timestamp)
+            else:
+                summary = VisitSummary(
+                    count=summary.count + 1,
+                    first=min(summary.first, timestamp),
+                    last=max(summary.last, timestamp),
+                )
+        return summary
+
+    @property
+    def mean_interval(self) -> float | None:
+        """Mean time between two visits."""
+        if self.count < 2:
             return None
-        return timestamps[-1]
+        return (self.last - self.first) / (self.count - 1)
+
+
+def is_visit_recorded(
+    timestamp: int, timestamps: Sequence[int], old_visits: VisitSummary | None
+) -> bool:
+    """Return whether the visit at `timestamp` is one of the `timestamps` or
+    of the `old_visits` (a change replayed after the compaction of the
+    journal must not record it twice)."""
+    if timestamp in timestamps:
+        return True
+    return old_visits is not None and old_visits.first <= timestamp <= old_visits.last
+
+
+def get_last_visit(
+    timestamps: Sequence[int], old_visits: VisitSummary | None
+) -> int | None:
+    """Return the time of the latest of the visits at `timestamps` and of
+    the `old_visits`: a visit recorded late, older than the last one, doesn't
+    make the game look checked longer ago."""
+    last = max(timestamps, default=None)
+    if old_visits is not None and (last is None or old_visits.last > last):
+        return old_visits.last
+    return last
 
 
-class Song(Base):
+def drop_old_visits(
+    timestamps: MutableSequence[int],
+    old_visits: VisitSummary | None,
+    kept_visits: int = KEPT_VISITS,
+) -> VisitSummary | None:
+    """Remove all but the last `kept_visits` of the `timestamps`, and return
+    the summary of the removed visits and of the `old_visits`."""
+    assert kept_visits >= 1
+    count = len(timestamps) - kept_visits
+    if count <= 0:
+        return old_visits
+    old_visits = VisitSummary.of(timestamps[:count], old_visits)
+    del timestamps[:count]
+    return old_visits
+
+
+class Song(BaseModel):
     id: int
     title: str
     is_deleted_from_site: bool = False
     brstm_download_info: FileDownloadInfo | None = None
+    brstm_download_failure: DownloadFailure | None = None
+    # time of the visit of the game page where the song was found (None for
+    # the songs found before it was recorded)
+    added_timestamp: int | None = None
 
     @property
     def is_brstm_downloaded(self) -> int | None:
         return self.brstm_download_info is not None
 
 
-class Game(Base):
+class Game(BaseModel):
     id: int
     title: str
     songs: list[Song] = Field(default_factory=list)
     is_deleted_from_site: bool = False
     download_timestamps: list[int] = Field(default_factory=list)
+    # visits dropped from `download_timestamps`
+    old_visits: Optional[VisitSummary] = None
 
     @property
     def last_checked(self) -> int | None:
-        return self._get_last_checked(self.download_timestamps)
+        return get_last_visit(self.download_timestamps, self.old_visits)
+
+    @property
+    def visits(self) -> VisitSummary | None:
+        """Summary of all the visits, including the dropped ones."""
+        return VisitSummary.of(self.download_timestamps, self.old_visits)
+
+    def add_visit(self, timestamp: int) -> None:
+        """Record the visit, keeping only the last `KEPT_VISITS`."""
+        self.download_timestamps.append(timestamp)
+        self.old_visits = drop_old_visits(self.download_timestamps, self.old_visits)
+
+    def drop_old_visits(self, kept_visits: int) -> int:
+        """Keep only the last `kept_visits`, and return the number of visits
+        dropped."""
+        count = max(0, len(self.download_timestamps) - kept_visits)
+        self.old_visits = drop_old_visits(
+            self.download_timestamps, self.old_visits, kept_visits
+        )
+        return count
 
 
-class Site(Base):
+class Site(BaseModel):
     base_url: str
     games: list[Game] = Field(default_factory=list)
     download_timestamps: list[int] = Field(default_factory=list)
+    # visits dropped from `download_timestamps`
+    old_visits: Optional[VisitSummary] = None
 
     @property
     def last_checked(self) -> int | None:
-        return self._get_last_checked(self.download_timestamps)
+        return get_last_visit(self.download_timestamps, self.old_visits)
+
+    @property
+    def visits(self) -> VisitSummary | None:
+        """Summary of all the visits, including the dropped ones."""
+        return VisitSummary.of(self.download_timestamps, self.old_visits)
+
+    def add_visit(self, timestamp: int) -> None:
+        """Record the visit, keeping only the last `KEPT_VISITS`."""
+        self.download_timestamps.append(timestamp)
+        self.old_visits = drop_old_visits(self.download_timestamps, self.old_visits)
+
+    def drop_old_visits(self, kept_visits: int) -> int:
+        """Keep only the last `kept_visits`, and return the number of visits
+        dropped."""
+        count = max(0, len(self.download_timestamps) - kept_visits)
+        self.old_visits = drop_old_visits(
+            self.download_timestamps, self.old_visits, kept_visits
+        )
+        return count
+
+
+class GameAdded(BaseModel):
+    kind: Literal["game_added"] = "game_added"
+    game: Game
+
+
+class SongAdded(BaseModel):
+    kind: Literal["song_added"] = "song_added"
+    game_id: int
+    song: Song
+
+
+class GameDeletedFromSiteSet(BaseModel):
+    kind: Literal["game_deleted_from_site_set"] = "game_deleted_from_site_set"
+    game_id: int
+    is_deleted_from_site: bool
+
+
+class SongDeletedFromSiteSet(BaseModel):
+    kind: Literal["song_deleted_from_site_set"] = "song_deleted_from_site_set"
+    song_id: int
+    is_deleted_from_site: bool
+
+
+class BrstmDownloadInfoSet(BaseModel):
+    kind: Literal["brstm_download_info_set"] = "brstm_download_info_set"
+    song_id: int
+    brstm_download_info: FileDownloadInfo | None
+
+
+class BrstmDownloadFailureSet(BaseModel):
+    kind: Literal["brstm_download_failure_set"] = "brstm_download_failure_set"
+    song_id: int
+    brstm_download_failure: DownloadFailure | None
+
+
+class GameVisited(BaseModel):
+    kind: Literal["game_visited"] = "game_visited"
+    game_id: int
+    timestamp: int
+
+
+class SiteVisited(BaseModel):
+    kind: Literal["site_visited"] = "site_visited"
+    timestamp: int
+
+
+class DownloadOrderSet(BaseModel):
+    kind: Literal["download_order_set"] = "download_order_set"
+    download_order: DownloadOrder | None
+
+
+class OldVisitsDropped(BaseModel):
+    kind: Literal["old_visits_dropped"] = "old_visits_dropped"
+    kept_visits: int
+
+
+Change = Annotated[
+    Union[
+        GameAdded,
+        SongAdded,
+        GameDeletedFromSiteSet,
+        SongDeletedFromSiteSet,
+        BrstmDownloadInfoSet,
+        BrstmDownloadFailureSet,
+        GameVisited,
+        SiteVisited,
+        DownloadOrderSet,
+        OldVisitsDropped,
+    ],
+    Field(discriminator="kind"),
+]
+
+
+class DatabaseBackend(Protocol):
+    """Storage of the site, games and songs.
+
+    Games and songs returned by a backend must only be modified through the
+    `add_*` and `set_*` methods, so that the changes are persisted on `save`.
+    """
+
+    @abstractmethod
+    def save(self) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_games(self) -> list[Game]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_game_from_id(self, game_id: int) -> Game:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_song_from_id(self, song_id: int) -> Song:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_game_from_song_id(self, song_id: int) -> Game:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_song_from_downloaded_path(self, path: Path) -> tuple[Game, Song]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_games_by_last_checked(self, count: int | None) -> list[Game]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_songs_with_no_brstm_downloaded(self, count: int | None) -> list[Song]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_statistics(self) -> DatabaseStatistics:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def get_download_order(self) -> DownloadOrder | None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def add_game(self, game: Game) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def add_song(self, game: Game, song: Song) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def set_brstm_download_info(
+        self, song: Song, download_info: FileDownloadInfo | None
+    ) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def set_brstm_download_failure(
+        self, song: Song, failure: DownloadFailure | None
+    ) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def set_game_deleted_from_site(self, game: Game, is_deleted: bool) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def set_song_deleted_from_site(self, song: Song, is_deleted: bool) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def add_game_visit(self, game: Game, timestamp: int) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def add_site_visit(self, timestamp: int) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def set_download_order(self, order: DownloadOrder | None) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def drop_old_visits(self, kept_visits: int) -> int:
+        ...  # pragma:nocover
+
+
+_Model = TypeVar("_Model", bound=BaseModel)
+
+
+def _construct_model(cls: type[_Model], fields: dict[str, Any]) -> _Model:
+    model = cls.__new__(cls)
+    object.__setattr__(model, "__dict__", fields)
+    object.__setattr__(model, "__pydantic_fields_set__", set(fields))
+    object.__setattr__(model, "__pydantic_extra__", None)
+    object.__setattr__(model, "__pydantic_private__", None)
+    return model
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Pause the garbage collector, which is triggered many times (and for
+    nothing) when millions of objects are created."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class FilesState(BaseModel):
+    """Size and modification time of a database file, and size of its
+    journal: the statistics saved with the database are up to date if the
+    files haven't changed since."""
+
+    size: int
+    mtime_ns: int
+    journal_size: int
+
+    @staticmethod
+    def of(db_file: Path) -> FilesState:
+        stat = db_file.stat()
+        try:
+            journal_size = get_journal_file(db_file).stat().st_size
+        except FileNotFoundError:
+            journal_size = 0
+        return FilesState(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, journal_size=journal_size
+        )
+
+
+class SavedStatistics(BaseModel):
+    state: FilesState
+    statistics: DatabaseStatistics
+
+
+def read_statistics(db_file: Path) -> DatabaseStatistics | None:
+    """Return the statistics saved with the database file, without reading
+    it, or None if they are missing or out of date."""
+    try:
+        saved = SavedStatistics.model_validate_json(
+            get_statistics_file(db_file).read_bytes()
+        )
+        if saved.state != FilesState.of(db_file):
+            return None
+    except (OSError, pydantic.ValidationError):
+        return None
+    return saved.statistics
+
+
+class Checksum(BaseModel):
+    format_version: int
+    md5: str
 
 
 class Database(BaseModel):
     site: Site
+    # pending work, saved to avoid sorting and shuffling the whole site on
+    # each run (None if it must be rebuilt from the site)
+    frontier: Optional[FrontierData] = None
+    # seeded order of the downloads (None for a random order)
+    download_order: Optional[DownloadOrder] = None
 
     _random: Random = PrivateAttr(default_factory=Random)
     _output_file: Optional[Path] = PrivateAttr(None)
 
+    # Indexes are built lazily on the first lookup, then kept up to date by
+    # `add_game`, `add_song` and `set_brstm_download_info`.  Games and songs
+    # must be added through these methods once a lookup has been made.
+    _games_by_id: Optional[dict[int, Game]] = PrivateAttr(None)
+    _songs_by_id: Optional[dict[int, tuple[Game, Song]]] = PrivateAttr(None)
+    _songs_by_location: Optional[dict[Path, tuple[Game, Song]]] = PrivateAttr(None)
+
+    # In journal mode, changes made through the `add_*` and `set_*` methods
+    # are appended to a sidecar journal on `save`, instead of rewriting the
+    # whole file.  The journal is compacted into the file from time to time.
+    _journal: Optional[Journal] = PrivateAttr(None)
+    _pending_changes: list[Change] = PrivateAttr(default_factory=list)
+
+    # Like the indexes, the frontier is built on the first lookup (from the
+    # `frontier` field if set), then kept up to date by the `add_*` and
+    # `set_*` methods.
+    _frontier: Optional[Frontier] = PrivateAttr(None)
+
+    # The statistics are counted on the first request (or read from the
+    # statistics file if it is up to date), then kept up to date by the
+    # `add_*` and `set_*` methods.  They are saved next to the output file,
+    # so that they can be read without reading the database.
+    _statistics: Optional[DatabaseStatistics] = PrivateAttr(None)
+
+    @staticmethod
+    def build_from_file(file: Path, fast_load: bool = True) -> Database:
+        """Read the database from a json file.
+
+        With `fast_load`, a file written by this tool (with a checksum file
+        that matches its content) is read without validation.
+        """
+        data = file.read_bytes()
+        with _gc_paused():
+            if fast_load and Database._is_trusted(file, data):
+                database = Database._construct(_loads(data))
+                logging.info(f"Databse read from '{file}' (without validation).")
+            else:
+                database = Database.model_validate_json(data)
+                # the file may have been modified by hand
+                database.frontier = None
+                logging.info(f"Databse read from '{file}'.")
+        database.with_output_file(file)
+        database._replay_journal(Journal(file=get_journal_file(file)))
+        # counted after the changes of the journal, if saved since
+        database._statistics = read_statistics(file)
+        return database
+
+    @staticmethod
+    def _is_trusted(file: Path, data: bytes) -> bool:
+        checksum_file = get_checksum_file(file)
+        if not checksum_file.exists():
+            return False
+        checksum = Checksum.model_validate_json(checksum_file.read_bytes())
+        return (
+            checksum.format_version == FORMAT_VERSION
+            and checksum.md5 == hashlib.md5(data).hexdigest()
+        )
+
+    @staticmethod
+    def _construct(data: dict[str, Any]) -> Database:
+        """Build the database from trusted data, without validation.
+
+        The dictionaries of the data are reused as the `__dict__` of the
+        models, which is what `model_construct` does, minus its overhead.
+        """
+        site = data["site"]
+        Database._construct_old_visits(site)
+        for game in site["games"]:
+            Database._construct_old_visits(game)
+            songs = game["songs"]
+            for i, song in enumerate(songs):
+                info = song["brstm_download_info"]
+                if info is not None:
+                    info["location"] = Path(info["location"])
+                    song["brstm_download_info"] = _construct_model(
+                        FileDownloadInfo, info
+                    )
+                failure = song["brstm_download_failure"]
+                if failure is not None:
+                    song["brstm_download_failure"] = _construct_model(
+                        DownloadFailure, failure
+                    )
+                songs[i] = _construct_model(Song, song)
+        site["games"] = [_construct_model(Game, game) for game in site["games"]]
+        frontier = data.get("frontier")
+        if frontier is not None:
+            frontier = _construct_model(FrontierData, frontier)
+        download_order = data.get("download_order")
+        if download_order is not None:
+            download_order = _construct_model(DownloadOrder, download_order)
+        return Database.model_construct(
+            site=_construct_model(Site, site),
+            frontier=frontier,
+            download_order=download_order,
+        )
+
     @staticmethod
-    def build_from_file(file: Path) -> Database:
-        with file.open() as fh:
-            database = pydantic.TypeAdapter(Database).validate_python(json.load(fh))
-            logging.info(f"Databse read from '{file}'.")
-            database.with_output_file(file)
-            return database
+    def _construct_old_visits(data: dict[str, Any]) -> None:
+        old_visits = data["old_visits"]
+        if old_visits is not None:
+            data["old_visits"] = _construct_model(VisitSummary, old_visits)
 
     def with_random(self, random: Random) -> Database:
         self._random = random
@@ -89,104 +580,468 @@ class Database(BaseModel):
         self._output_file = output_file
         return self
 
+    def with_journal(self, compaction_threshold: int = 10_000) -> Database:
+        """Enable the journal mode. Requires an output file."""
+        assert self._output_file is not None
+        self._journal = Journal(
+            file=get_journal_file(self._output_file),
+            compaction_threshold=compaction_threshold,
+        )
+        return self
+
     def save(self) -> None:
         if self._output_file is None:
             return
-        with self._output_file.open("w") as fh:
-            fh.write(self.model_dump_json(indent=2))
+        if self._journal is None or not self._output_file.exists():
+            self.compact()
+            return
+        changes = [change.model_dump_json() for change in self._pending_changes]
+        self._journal.append(changes)
+        self._pending_changes.clear()
+        logging.info(f"{len(changes)} change(s) saved into '{self._journal.file}'")
+        if self._journal.needs_compaction:
+            self.compact()
+        else:
+            self._write_statistics()
+
+    def compact(self) -> None:
+        """Write the whole database into the output file and clear the journal."""
+        if self._output_file is None:
+            return
+        if self._frontier is not None or self.frontier is None:
+            # saved, even if not used yet, to be ready for the next run
+            self.frontier = self._get_frontier().to_data()
+        data = self.model_dump_json(indent=2).encode()
+        tmp_file = self._output_file.with_name(self._output_file.name + ".tmp")
+        with tmp_file.open("wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_file, self._output_file)
+        checksum = Checksum(
+            format_version=FORMAT_VERSION, md5=hashlib.md5(data).hexdigest()
+        )
+        get_checksum_file(self._output_file).write_text(checksum.model_dump_json())
+        self._pending_changes.clear()
+        Journal(file=get_journal_file(self._output_file)).clear()
         logging.info(f"Database file saved into '{self._output_file}'")
+        self._write_statistics()
 
-    def get_game_from_id(self, game_id: int) -> Game:
-        for game in self.site.games:
-            if game.id == game_id:
-                return game
-        raise GameNotFound
+    def _write_statistics(self) -> None:
+        # after the database file and the journal, whose state is recorded
+        assert self._output_file is not None
+        saved = SavedStatistics(
+            state=FilesState.of(self._output_file), statistics=self.get_statistics()
+        )
+        file = get_statistics_file(self._output_file)
+        tmp_file = file.with_name(file.name + ".tmp")
+        tmp_file.write_text(saved.model_dump_json())
+        os.replace(tmp_file, file)
 
-    def get_song_from_id(self, song_id: int) -> Song:
+    def _record(self, change: Change) -> None:
+        if self._journal is not None:
+            self._pending_changes.append(change)
+
+    def _replay_journal(self, journal: Journal) -> None:
+        """Apply the changes of the journal.
+
+        Replaying is idempotent, so that a crash between the compaction and
+        the clearing of the journal doesn't duplicate anything.
+        """
+        adapter: pydantic.TypeAdapter[Change] = pydantic.TypeAdapter(Change)
+        lines = journal.read()
+        for i, line in enumerate(lines):
+            try:
+                change = adapter.validate_json(line)
+            except pydantic.ValidationError:
+                if i < len(lines) - 1:
+                    raise
+                # the last change may have been partially written on a crash
+                logging.warning(f"Ignoring truncated change in '{journal.file}'.")
+                break
+            if isinstance(change, GameAdded):
+                if change.game.id not in self._get_games_by_id():
+                    self.add_game(change.game)
+            elif isinstance(change, SongAdded):
+                game = self.get_game_from_id(change.game_id)
+                if all(song.id != change.song.id for song in game.songs):
+                    self.add_song(game, change.song)
+            elif isinstance(change, GameDeletedFromSiteSet):
+                self.set_game_deleted_from_site(
+                    self.get_game_from_id(change.game_id), change.is_deleted_from_site
+                )
+            elif isinstance(change, SongDeletedFromSiteSet):
+                self.set_song_deleted_from_site(
+                    self.get_song_from_id(change.song_id), change.is_deleted_from_site
+                )
+            elif isinstance(change, BrstmDownloadInfoSet):
+                self.set_brstm_download_info(
+                    self.get_song_from_id(change.song_id), change.brstm_download_info
+                )
+            elif isinstance(change, BrstmDownloadFailureSet):
+                self.set_brstm_download_failure(
+                    self.get_song_from_id(change.song_id),
+                    change.brstm_download_failure,
+                )
+            elif isinstance(change, GameVisited):
+                game = self.get_game_from_id(change.game_id)
+                if not is_visit_recorded(
+                    change.timestamp, game.download_timestamps, game.old_visits
+                ):
+                    self.add_game_visit(game, change.timestamp)
+            elif isinstance(change, SiteVisited):
+                site = self.site
+                if not is_visit_recorded(
+                    change.timestamp, site.download_timestamps, site.old_visits
+                ):
+                    self.add_site_visit(change.timestamp)
+            elif isinstance(change, DownloadOrderSet):
+                self.set_download_order(change.download_order)
+            elif isinstance(change, OldVisitsDropped):
+                self.drop_old_visits(change.kept_visits)
+        if lines:
+            logging.info(f"{len(lines)} change(s) replayed from '{journal.file}'.")
+
+    def _build_indexes(self) -> None:
+        games_by_id: dict[int, Game] = dict()
+        songs_by_id: dict[int, tuple[Game, Song]] = dict()
+        songs_by_location: dict[Path, tuple[Game, Song]] = dict()
         for game in self.site.games:
+            games_by_id.setdefault(game.id, game)
             for song in game.songs:
-                if song.id == song_id:
-                    return song
-        raise SongNotFound
+                songs_by_id.setdefault(song.id, (game, song))
+                if song.brstm_download_info is not None:
+                    songs_by_location.setdefault(
+                        song.brstm_download_info.location, (game, song)
+                    )
+        self._games_by_id = games_by_id
+        self._songs_by_id = songs_by_id
+        self._songs_by_location = songs_by_location
+        logging.debug(
+            f"Indexes built ({len(games_by_id)} game(s), {len(songs_by_id)} song(s))."
+        )
 
-    def get_game_from_song_id(self, song_id: int) -> Game:
+    def _get_games_by_id(self) -> dict[int, Game]:
+        if self._games_by_id is None:
+            self._build_indexes()
+        assert self._games_by_id is not None
+        return self._games_by_id
+
+    def _get_songs_by_id(self) -> dict[int, tuple[Game, Song]]:
+        if self._songs_by_id is None:
+            self._build_indexes()
+        assert self._songs_by_id is not None
+        return self._songs_by_id
+
+    def _get_songs_by_location(self) -> dict[Path, tuple[Game, Song]]:
+        if self._songs_by_location is None:
+            self._build_indexes()
+        assert self._songs_by_location is not None
+        return self._songs_by_location
+
+    def _get_frontier(self) -> Frontier:
+        if self._frontier is None:
+            order = self.download_order
+            seed = None if order is None else order.seed
+            if self.frontier is not None and self.frontier.seed == seed:
+                self._frontier = Frontier.from_data(self.frontier, self._random, order)
+            else:
+                self._frontier = self._build_frontier()
+        return self._frontier
+
+    def _build_frontier(self) -> Frontier:
+        unvisited_games: list[Game] = []
+        visited_games: list[Game] = []
+        song_ids: list[int] = []
+        failed_songs: list[tuple[int, int]] = []
         for game in self.site.games:
+            if not game.is_deleted_from_site:
+                if game.last_checked is None:
+                    unvisited_games.append(game)
+                else:
+                    visited_games.append(game)
             for song in game.songs:
-                if song.id == song_id:
-                    return game
-        raise SongNotFound
+                if self._is_pending(song):
+                    failure = song.brstm_download_failure
+                    if failure is None:
+                        song_ids.append(song.id)
+                    else:
+                        failed_songs.append((failure.timestamp, song.id))
+        self._random.shuffle(song_ids)
+        failed_songs.sort()
+        logging.debug("Frontier built.")
+        return Frontier(
+            self._random,
+            unvisited_games=[game.id for game in unvisited_games],
+            visited_games=[(game.id, game.last_checked or 0) for game in visited_games],
+            # the next song is the last one (in a random order)
+            songs=song_ids[::-1],
+            order=self.download_order,
+            # by oldest failure
+            deferred_songs=[song_id for _, song_id in failed_songs],
+        )
 
-    def get_song_from_downloaded_path(self, path: Path) -> tuple[Game, Song]:
-        for game in self.site.games:
+    def _get_built_frontier(self) -> Frontier | None:
+        """Return the frontier to update, or None if it will be built from
+        the site."""
+        if self._frontier is None and self.frontier is None:
+            return None
+        return self._get_frontier()
+
+    def _reset_frontier(self) -> None:
+        # the order can't be updated incrementally: rebuilt on the next lookup
+        self._frontier = None
+        self.frontier = None
+
+    @staticmethod
+    def _is_pending(song: Song) -> bool:
+        return not song.is_deleted_from_site and not song.is_brstm_downloaded
+
+    def add_game(self, game: Game) -> None:
+        self._record(GameAdded(game=game.model_copy(deep=True)))
+        self.site.games.append(game)
+        if (stats := self._statistics) is not None:
+            stats.add_game(game)
             for song in game.songs:
-                if (
-                    song.brstm_download_info is not None
-                    and song.brstm_download_info.location == path
-                ):
-                    return game, song
-        raise SongNotFound
+                stats.add_song(song)
+        if self._games_by_id is not None:
+            self._games_by_id.setdefault(game.id, game)
+        if self._songs_by_id is not None and self._songs_by_location is not None:
+            for song in game.songs:
+                self._index_song(game, song)
+        if (frontier := self._get_built_frontier()) is not None:
+            if not game.is_deleted_from_site:
+                if game.last_checked is None:
+                    frontier.add_game(game.id)
+                else:
+                    frontier.visit_game(game.id, game.last_checked)
+            for song in game.songs:
+                if self._is_pending(song):
+                    frontier.add_song(song.id)
+
+    def add_song(self, game: Game, song: Song) -> None:
+        self._record(SongAdded(game_id=game.id, song=song.model_copy(deep=True)))
+        game.songs.append(song)
+        if (stats := self._statistics) is not None:
+            stats.add_song(song)
+        if self._songs_by_id is not None and self._songs_by_location is not None:
+            self._index_song(game, song)
+        if (frontier := self._get_built_frontier()) is not None:
+            if self._is_pending(song):
+                frontier.add_song(song.id)
+
+    def _index_song(self, game: Game, song: Song) -> None:
+        assert self._songs_by_id is not None and self._songs_by_location is not None
+        self._songs_by_id.setdefault(song.id, (game, song))
+        if song.brstm_download_info is not None:
+            self._songs_by_location.setdefault(
+                song.brstm_download_info.location, (game, song)
+            )
+
+    def set_brstm_download_info(
+        self, song: Song, download_info: FileDownloadInfo | None
+    ) -> None:
+        if self._songs_by_location is not None:
+            if song.brstm_download_info is not None:
+                location = song.brstm_download_info.location
+                indexed = self._songs_by_location.get(location)
+                if indexed is not None and indexed[1] is song:
+                    del self._songs_by_location[location]
+            if download_info is not None:
+                game = self.get_game_from_song_id(song.id)
+                self._songs_by_location[download_info.location] = (game, song)
+        self._record(
+            BrstmDownloadInfoSet(song_id=song.id, brstm_download_info=download_info)
+        )
+        if (stats := self._statistics) is not None:
+            stats.add_song(song, -1)
+        song.brstm_download_info = download_info
+        if stats is not None:
+            stats.add_song(song)
+        self._update_frontier_song(song)
+
+    def set_brstm_download_failure(
+        self, song: Song, failure: DownloadFailure | None
+    ) -> None:
+        self._record(
+            BrstmDownloadFailureSet(song_id=song.id, brstm_download_failure=failure)
+        )
+        if (stats := self._statistics) is not None:
+            stats.add_song(song, -1)
+        song.brstm_download_failure = failure
+        if stats is not None:
+            stats.add_song(song)
+        if failure is not None and (frontier := self._get_built_frontier()):
+            # the other songs are downloaded first
+            frontier.defer_song(song.id)
+
+    def set_game_deleted_from_site(self, game: Game, is_deleted: bool) -> None:
+        if game.is_deleted_from_site != is_deleted:
+            self._record(
+                GameDeletedFromSiteSet(game_id=game.id, is_deleted_from_site=is_deleted)
+            )
+            if (stats := self._statistics) is not None:
+                stats.add_game(game, -1)
+            game.is_deleted_from_site = is_deleted
+            if stats is not None:
+                stats.add_game(game)
+            if (frontier := self._get_built_frontier()) is not None:
+                if is_deleted:
+                    frontier.remove_game(game.id)
+                elif game.last_checked is None:
+                    frontier.add_game(game.id)
+                else:
+                    frontier.visit_game(game.id, game.last_checked)
+
+    def set_song_deleted_from_site(self, song: Song, is_deleted: bool) -> None:
+        if song.is_deleted_from_site != is_deleted:
+            self._record(
+                SongDeletedFromSiteSet(song_id=song.id, is_deleted_from_site=is_deleted)
+            )
+            if (stats := self._statistics) is not None:
+                stats.add_song(song, -1)
+            song.is_deleted_from_site = is_deleted
+            if stats is not None:
+                stats.add_song(song)
+            self._update_frontier_song(song)
+
+    def _update_frontier_song(self, song: Song) -> None:
+        if (frontier := self._get_built_frontier()) is not None:
+            if self._is_pending(song):
+                frontier.add_song(song.id)
+            else:
+                frontier.remove_song(song.id)
+
+    def add_game_visit(self, game: Game, timestamp: int) -> None:
+        self._record(GameVisited(game_id=game.id, timestamp=timestamp))
+        if (stats := self._statistics) is not None:
+            stats.add_game(game, -1)
+        game.add_visit(timestamp)
+        if stats is not None:
+            stats.add_game(game)
+        frontier = self._get_built_frontier()
+        if frontier is not None and not game.is_deleted_from_site:
+            # the visit may be older than the last one
+            assert game.last_checked is not None
+            frontier.visit_game(game.id, game.last_checked)
+
+    def add_site_visit(self, timestamp: int) -> None:
+        self._record(SiteVisited(timestamp=timestamp))
+        self.site.add_visit(timestamp)
+
+    def set_download_order(self, order: DownloadOrder | None) -> None:
+        """Download the songs in the order of a seed, starting after its
+        cursor, or in a random order if None."""
+        self._record(
+            DownloadOrderSet(
+                download_order=None if order is None else order.model_copy()
+            )
+        )
+        previous = self.download_order
+        self.download_order = order
+        if (None if order is None else order.seed) != (
+            None if previous is None else previous.seed
+        ):
+            # the songs must be sorted again
+            self._reset_frontier()
+        elif order is not None and self._frontier is not None:
+            self._frontier.set_cursor(order.cursor)
+
+    def drop_old_visits(self, kept_visits: int) -> int:
+        """Keep only the last `kept_visits` of the site and of each game, and
+        return the number of visits dropped."""
+        self._record(OldVisitsDropped(kept_visits=kept_visits))
+        count = self.site.drop_old_visits(kept_visits)
+        for game in self.site.games:
+            count += game.drop_old_visits(kept_visits)
+        return count
+
+    def get_games(self) -> list[Game]:
+        return self.site.games
+
+    def get_game_from_id(self, game_id: int) -> Game:
+        game = self._get_games_by_id().get(game_id)
+        if game is None:
+            raise GameNotFound
+        return game
+
+    def get_song_from_id(self, song_id: int) -> Song:
+        found = self._get_songs_by_id().get(song_id)
+        if found is None:
+            raise SongNotFound
+        return found[1]
+
+    def get_game_from_song_id(self, song_id: int) -> Game:
+        found = self._get_songs_by_id().get(song_id)
+        if found is None:
+            raise SongNotFound
+        return found[0]
+
+    def get_song_from_downloaded_path(self, path: Path) -> tuple[Game, Song]:
+        found = self._get_songs_by_location().get(path)
+        if found is None:
+            raise SongNotFound
+        return found
 
     def get_games_by_last_checked(self, count: int | None) -> list[Game]:
-        """Return games starting with the not checked, then the oldest checked."""
-        filtered = filter(lambda g: not g.is_deleted_from_site, self.site.games)
-        games = sorted(filtered, key=functools.cmp_to_key(self._cmp))
-        if count is None:
-            return games
-        return games[:count]
+        """Return games starting with the not checked (the last added first),
+        then the oldest checked."""
+        games_by_id = self._get_games_by_id()
+        return [games_by_id[id] for id in self._get_frontier().get_games(count)]
 
     def get_songs_with_no_brstm_downloaded(self, count: int | None) -> list[Song]:
-        songs: list[Song] = []
-        for game in self.site.games:
-            for song in game.songs:
-                if not song.is_deleted_from_site and not song.is_brstm_downloaded:
-                    songs.append(song)
+        """Return songs to download, in a random order (the songs whose
+        download has failed come after the others), or in the seeded order
+        starting after its cursor."""
+        songs_by_id = self._get_songs_by_id()
+        return [songs_by_id[id][1] for id in self._get_frontier().get_songs(count)]
 
-        self._random.shuffle(songs)
-        if count is None:
-            return songs
-        return songs[:count]
+    def get_statistics(self) -> DatabaseStatistics:
+        """Return the statistics maintained incrementally (counted on the
+        first call)."""
+        if self._statistics is None:
+            self._statistics = self.compute_statistics()
+        return replace(self._statistics, game_oldest_visit=self._get_oldest_visit())
 
-    @staticmethod
-    def _cmp(a: Any, b: Any) -> int:
-        if a.last_checked is None:
-            return -1
-        if b.last_checked is None:
-            return 1
-        if a.last_checked < b.last_checked:
-            return -1
-        if a.last_checked == b.last_checked:
+    def _get_oldest_visit(self) -> int:
+        # read from the frontier, without building it (which sorts the songs)
+        # if it is not built yet
+        if self._frontier is not None:
+            game_id = self._frontier.get_oldest_visited_game()
+        elif self.frontier is not None:
+            visited_games = self.frontier.visited_games
+            game_id = visited_games[0] if visited_games else None
+        else:
+            return self._compute_oldest_visit()
+        if game_id is None:
             return 0
-        return 1
+        return self.get_game_from_id(game_id).last_checked or 0
 
-    def get_statistics(self) -> DatabaseStatistics:
+    def get_download_order(self) -> DownloadOrder | None:
+        return self.download_order
+
+    def compute_statistics(self) -> DatabaseStatistics:
+        """Return the statistics counted from all the games and songs."""
         stats = DatabaseStatistics()
         for game in self.site.games:
-            stats.games += 1
-            if len(game.download_timestamps) == 0:
-                stats.games_not_visited += 1
-            else:
-                stats.games_visited += 1
-                if stats.game_oldest_visit == 0:
-                    stats.game_oldest_visit = game.download_timestamps[-1]
-                else:
-                    stats.game_oldest_visit = min(
-                        stats.game_oldest_visit, game.download_timestamps[-1]
-                    )
-            if game.is_deleted_from_site:
-                stats.games_deleted_from_site += 1
-
+            stats.add_game(game)
             for song in game.songs:
-                stats.songs += 1
-
-                if song.is_brstm_downloaded:
-                    stats.songs_downloaded += 1
-                else:
-                    stats.songs_not_downloaded += 1
-                if song.is_deleted_from_site:
-                    stats.songs_deleted_from_site += 1
-
+                stats.add_song(song)
+        stats.game_oldest_visit = self._compute_oldest_visit()
         return stats
 
+    def _compute_oldest_visit(self) -> int:
+        # the deleted games are never visited again: the last visit of one of
+        # them would stay the oldest visit forever
+        return min(
+            (
+                game.last_checked
+                for game in self.site.games
+                if not game.is_deleted_from_site and game.last_checked is not None
+            ),
+            default=0,
+        )
+
 
 @dataclass
 class DatabaseStatistics:
@@ -198,4 +1053,29 @@ class DatabaseStatistics:
     songs_downloaded: int = 0
     songs_not_downloaded: int = 0
     songs_deleted_from_site: int = 0
+    songs_with_download_failure: int = 0
+    # last visit of the game on the site visited the longest time ago
     game_oldest_visit: int = 0
+
+    def add_game(self, game: Game, count: int = 1) -> None:
+        """Count the `game`, without its songs (uncount it if `count` is
+        -1)."""
+        self.games += count
+        if game.last_checked is None:
+            self.games_not_visited += count
+        else:
+            self.games_visited += count
+        if game.is_deleted_from_site:
+            self.games_deleted_from_site += count
+
+    def add_song(self, song: Song, count: int = 1) -> None:
+        """Count the `song` (uncount it if `count` is -1)."""
+        self.songs += count
+        if song.is_brstm_downloaded:
+            self.songs_downloaded += count
+        else:
+            self.songs_not_downloaded += count
+        if song.is_deleted_from_site:
+            self.songs_deleted_from_site += count
+        if song.brstm_download_failure is not None:
+            self.songs_with_download_failure += count
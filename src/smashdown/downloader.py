@@ -1,13 +1,29 @@
+from __future__ import annotations
+
 import hashlib
 import logging
+import os
 import re
 import time
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, BinaryIO, Callable
+
+import pydantic
+from pydantic import BaseModel
 
 from smashdown.client import Client
-from smashdown.database import Database, FileDownloadInfo, Game, Song
+from smashdown.database import (
+    DatabaseBackend,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    Song,
+)
+from smashdown.frontier import DownloadOrder, get_song_key
+from smashdown.retry import RequestFailed
 
 
 def remove_diacritics(text: str) -> str:
@@ -28,30 +44,277 @@ def slugify(text: str) -> str:
     return text
 
 
+def set_download_seed(db: DatabaseBackend, seed: int | None) -> None:
+    """Download the songs in the order of the `seed` (from its cursor if the
+    seed is already used), or in a random order if None."""
+    order = db.get_download_order()
+    if seed != (None if order is None else order.seed):
+        db.set_download_order(None if seed is None else DownloadOrder(seed=seed))
+
+
+def advance_download_cursor(db: DatabaseBackend, song: Song) -> None:
+    """Move the cursor of the seeded order of the downloads (if any) to the
+    `song`: the next songs are taken after it."""
+    order = db.get_download_order()
+    if order is not None:
+        cursor = get_song_key(order.seed, song.id)
+        db.set_download_order(order.model_copy(update={"cursor": cursor}))
+
+
+def take_songs_to_download(db: DatabaseBackend, max_count: int) -> list[Song]:
+    """Return up to `max_count` songs to download, and move the cursor of
+    the seeded order after them (a song not downloaded comes back once the
+    cursor has gone through all the others)."""
+    songs = db.get_songs_with_no_brstm_downloaded(max_count)
+    if songs:
+        advance_download_cursor(db, songs[-1])
+    return songs
+
+
+def record_download(
+    db: DatabaseBackend, song: Song, download_info: FileDownloadInfo
+) -> None:
+    """Record the downloaded file of the `song` (and forget its failures)."""
+    db.set_brstm_download_info(song, download_info)
+    if song.brstm_download_failure is not None:
+        db.set_brstm_download_failure(song, None)
+
+
+def record_failure(
+    db: DatabaseBackend, song: Song, error: RequestFailed, timestamp: int
+) -> None:
+    """Record the failed download of the `song` at `timestamp`: it is tried
+    again after the other songs."""
+    logging.warning(f"Download of song {song.id} failed: {error.message}.")
+    previous = song.brstm_download_failure
+    db.set_brstm_download_failure(
+        song,
+        DownloadFailure(
+            timestamp=timestamp,
+            count=1 if previous is None else previous.count + 1,
+            reason=error.message,
+        ),
+    )
+
+
+class PartInfo(BaseModel):
+    size: int
+    md5: str
+    # see `BrstmStream`
+    validator: str | None = None
+
+
+class PartFile:
+    """Partial download of a file, resumable after a failure.
+
+    The chunks are written into `<path>.part`, and a sidecar file
+    `<path>.part.json` records the number of bytes received (and known to be
+    on disk), the md5 of these bytes and the validator (ETag or Last-Modified
+    date) of the file on the server.
+    On commit, the part file is atomically renamed to `path`: a crash never
+    leaves a partially written file under the final name.
+
+    The md5 state can't be saved with hashlib, so when a download is
+    resumed, the md5 is computed again from the part file (this also checks
+    that the part file is consistent with the sidecar).
+    """
+
+    checkpoint_size = 1024 * 1024
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.part_path = path.with_name(path.name + ".part")
+        self.info_path = path.with_name(path.name + ".part.json")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.validator: str | None = None
+        self._md5 = hashlib.md5()
+        self._size = 0
+        self._checkpointed_size = 0
+        self._fh = self._open()
+
+    def _open(self) -> BinaryIO:
+        info = self._read_info()
+        if info is None or info.size == 0:
+            return self.part_path.open("wb")
+        fh = self.part_path.open("r+b")
+        fh.truncate(info.size)
+        while chunk := fh.read(self.checkpoint_size):
+            self._md5.update(chunk)
+        if self._md5.hexdigest() != info.md5:
+            logging.warning(f"Part file '{self.part_path}' is corrupted, restarting.")
+            fh.close()
+            self._md5 = hashlib.md5()
+            return self.part_path.open("wb")
+        logging.info(f"Resuming '{self.path}' from byte {info.size}.")
+        self._size = self._checkpointed_size = info.size
+        self.validator = info.validator
+        return fh
+
+    def _read_info(self) -> PartInfo | None:
+        if not self.info_path.exists() or not self.part_path.exists():
+            return None
+        try:
+            info = PartInfo.model_validate_json(self.info_path.read_bytes())
+        except pydantic.ValidationError:
+            return None
+        if self.part_path.stat().st_size < info.size:
+            return None
+        return info
+
+    def __enter__(self) -> PartFile:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if not self._fh.closed:
+            self._checkpoint()
+            self._fh.close()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def restart(self) -> None:
+        """Discard the bytes received so far."""
+        self._fh.seek(0)
+        self._fh.truncate()
+        self._md5 = hashlib.md5()
+        self._size = 0
+        self._checkpoint()
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self._md5.update(chunk)
+        self._size += len(chunk)
+        if self._size - self._checkpointed_size >= self.checkpoint_size:
+            self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        info = PartInfo(
+            size=self._size, md5=self._md5.hexdigest(), validator=self.validator
+        )
+        self.info_path.write_text(info.model_dump_json())
+        self._checkpointed_size = self._size
+
+    def commit(self) -> str:
+        """Move the file to its final path and return its md5."""
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self.part_path, self.path)
+        self.info_path.unlink(missing_ok=True)
+        return self._md5.hexdigest()
+
+
 @dataclass
 class Downloader:
     client: Client
-    db: Database
+    db: DatabaseBackend
     output_dir: Path
+    chunk_size: int = 64 * 1024
+    save_batch_size: int = 20
+    clock: Callable[[], float] = time.time
 
     def download_brstm_file(self, song: Song) -> None:
+        """Download the brstm file of the `song`.  If the request fails, the
+        failure is recorded in the database before `RequestFailed` is raised
+        (the song will be downloaded by a later run)."""
+        music_path = self.get_song_path(song)
+        try:
+            download_info = self.fetch_brstm_file(song.id, music_path)
+        except RequestFailed as e:
+            record_failure(self.db, song, e, int(self.clock()))
+            self.db.save()
+            raise
+        record_download(self.db, song, download_info)
+        self.db.save()
+
+    def download_brstm_files(self, max_count: int, workers: int = 1) -> None:
+        """Download up to `max_count` songs not downloaded yet.
+
+        A failed download is recorded and skipped, but the run stops if the
+        circuit breaker of the client opens (`CircuitOpen` is raised).
+
+        With several `workers`, the files are downloaded and written by a
+        pool of threads, while the calling thread is the only one to update
+        the database, which is saved every `save_batch_size` downloads.  The
+        client is shared by the workers, so its rate limit applies to the
+        whole pool.
+        """
+        songs = take_songs_to_download(self.db, max_count)
+        if workers <= 1:
+            for song in songs:
+                try:
+                    self.download_brstm_file(song=song)
+                except RequestFailed:
+                    # recorded: the song will be downloaded by a later run
+                    continue
+            return
+
+        # the database is only read and written in this thread
+        music_paths = {song.id: self.get_song_path(song) for song in songs}
+        failure: Exception | None = None
+        unsaved_count = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    self.fetch_brstm_file, song.id, music_paths[song.id]
+                ): song
+                for song in songs
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                song = futures[future]
+                try:
+                    download_info = future.result()
+                except RequestFailed as e:
+                    record_failure(self.db, song, e, int(self.clock()))
+                    download_info = None
+                except Exception as e:
+                    if failure is None:
+                        logging.error("Download failed, stopping the workers.")
+                        failure = e
+                        for other in futures:
+                            other.cancel()
+                    continue
+                if download_info is not None:
+                    record_download(self.db, song, download_info)
+                unsaved_count += 1
+                if unsaved_count >= self.save_batch_size:
+                    self.db.save()
+                    unsaved_count = 0
+        if unsaved_count:
+            self.db.save()
+        if failure is not None:
+            raise failure
+
+    def get_song_path(self, song: Song) -> Path:
         game = self.db.get_game_from_song_id(song_id=song.id)
-        game_path = self.get_game_path(game)
-        music_path = self.get_music_path(game_path, song)
-        music_data = self.client.get_brstm_file(song_id=song.id)
-        self.write_data(music_path, music_data)
-        md5 = hashlib.md5(music_data).hexdigest()
-        song.brstm_download_info = FileDownloadInfo(
+        return self.get_music_path(self.get_game_path(game), song)
+
+    def fetch_brstm_file(self, song_id: int, music_path: Path) -> FileDownloadInfo:
+        # doesn't use the database: called by the workers
+        with PartFile(self.output_dir / music_path) as file:
+            with self.client.stream_brstm_file(
+                song_id=song_id,
+                chunk_size=self.chunk_size,
+                offset=file.size,
+                validator=file.validator,
+            ) as stream:
+                if stream.offset != file.size:
+                    file.restart()
+                file.validator = stream.validator
+                for chunk in stream.chunks:
+                    file.write(chunk)
+            md5 = file.commit()
+        logging.info(f"Music saved into {music_path} (md5 {md5}).")
+        return FileDownloadInfo(
             location=music_path,
-            timestamp=int(time.time()),
+            timestamp=int(self.clock()),
             file_md5=md5,
         )
-        logging.info(f"Music saved into {music_path} (md5 {md5}).")
-        self.db.save()
-
-    def download_brstm_files(self, max_count: int) -> None:
-        for song in self.db.get_songs_with_no_brstm_downloaded(max_count):
-            self.download_brstm_file(song=song)
 
     @staticmethod
     def get_game_path(game: Game) -> Path:
@@ -66,11 +329,3 @@ class Downloader:
         if slug:
             slug = "_" + slug
         return game_path / f"{song.id}{slug}.brstm"
-
-    def write_data(self, path: Path, data: bytes) -> None:
-        path = self.output_dir / path
-        parent = path.parent
-        if not parent.is_dir():
-            parent.mkdir(parents=True, exist_ok=True)
-
-        path.write_bytes(data)
@@ -0,0 +1,432 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+from abc import abstractmethod
+from collections.abc import Iterable
+from itertools import chain, islice
+from random import Random
+from typing import Optional, Protocol
+
+from pydantic import BaseModel, Field
+
+_MASK_64 = (1 << 64) - 1
+
+
+def get_song_key(seed: int, song_id: int) -> int:
+    """Return the position of the song in the order of the `seed`: a 63-bit
+    hash (splitmix64) of the seed and the song id, so that it doesn't depend
+    on the other songs."""
+    x = (seed * 0x9E3779B97F4A7C15 + song_id) & _MASK_64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return (x ^ (x >> 31)) >> 1
+
+
+class DownloadOrder(BaseModel):
+    """Seeded order of the downloads: the songs by increasing
+    `get_song_key(seed, id)`, starting after the key `cursor` and wrapping
+    around."""
+
+    seed: int
+    cursor: int = -1
+
+
+class FrontierData(BaseModel):
+    """Persisted content of a `Frontier`."""
+
+    unvisited_games: list[int]
+    # by visit, with the time of their last visit
+    visited_games: list[int]
+    visit_timestamps: list[int]
+    songs: list[int]
+    # after the other songs, the next one first
+    deferred_songs: list[int] = Field(default_factory=list)
+    # seed of the order of the songs (None for a random order)
+    seed: Optional[int] = None
+    # in a seeded order, the keys of the `songs`, which are sorted by key
+    song_keys: list[int] = Field(default_factory=list)
+
+
+class VisitQueue:
+    """Visited games by oldest visit, then in the order of the visits.
+
+    A binary heap of (timestamp, visit number, game id) entries, with the
+    position of each game in the heap, so that a game is moved or removed
+    in O(log n), whatever the time of its visit.  The first `count` games
+    are found in O(count log count) by walking the heap from its root,
+    without changing it.
+    """
+
+    def __init__(self, games: Iterable[tuple[int, int]] = ()) -> None:
+        # a sorted list is a heap
+        self._heap = sorted(
+            (timestamp, i, game_id) for i, (game_id, timestamp) in enumerate(games)
+        )
+        self._positions = {entry[2]: i for i, entry in enumerate(self._heap)}
+        self._visit_count = len(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def first(self) -> int | None:
+        return self._heap[0][2] if self._heap else None
+
+    def get(self, count: int | None) -> list[int]:
+        heap = self._heap
+        if count is None:
+            return [game_id for _, _, game_id in sorted(heap)]
+        game_ids: list[int] = []
+        candidates = [(heap[0], 0)] if heap else []
+        while candidates and len(game_ids) < count:
+            entry, i = heapq.heappop(candidates)
+            game_ids.append(entry[2])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (heap[child], child))
+        return game_ids
+
+    def to_list(self) -> list[tuple[int, int]]:
+        """Return the games with the time of their visit, by visit."""
+        return [(game_id, timestamp) for timestamp, _, game_id in sorted(self._heap)]
+
+    def push(self, game_id: int, timestamp: int) -> None:
+        """Add the game, or move it, after the games visited at `timestamp`."""
+        entry = (timestamp, self._visit_count, game_id)
+        self._visit_count += 1
+        i = self._positions.get(game_id)
+        if i is None:
+            i = len(self._heap)
+            self._heap.append(entry)
+        else:
+            self._heap[i] = entry
+        self._sift_down(i)
+        self._sift_up(self._positions[game_id])
+
+    def remove(self, game_id: int) -> None:
+        i = self._positions.pop(game_id, None)
+        if i is None:
+            return
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._positions[last[2]] = i
+            self._sift_down(i)
+            self._sift_up(self._positions[last[2]])
+
+    def _sift_up(self, i: int) -> None:
+        heap = self._heap
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[parent] <= entry:
+                break
+            heap[i] = heap[parent]
+            self._positions[heap[i][2]] = i
+            i = parent
+        heap[i] = entry
+        self._positions[entry[2]] = i
+
+    def _sift_down(self, i: int) -> None:
+        heap = self._heap
+        entry = heap[i]
+        size = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if entry <= heap[child]:
+                break
+            heap[i] = heap[child]
+            self._positions[heap[i][2]] = i
+            i = child
+        heap[i] = entry
+        self._positions[entry[2]] = i
+
+
+class SongOrder(Protocol):
+    @abstractmethod
+    def get(self, count: int | None) -> list[int]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def add(self, song_id: int) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def defer(self, song_id: int) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def remove(self, song_id: int) -> None:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def to_list(self) -> list[int]:
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def to_deferred_list(self) -> list[int]:
+        ...  # pragma:nocover
+
+
+class RandomSongOrder(SongOrder):
+    """Songs in a random order: a new song is inserted at a random position
+    (which keeps the order uniformly random).  A song can be deferred after
+    the others: the deferred songs come last, in the order they were
+    deferred, and the new songs are never inserted among them.  All the
+    updates take a constant time."""
+
+    def __init__(
+        self, rand: Random, songs: Iterable[int], deferred_songs: Iterable[int] = ()
+    ) -> None:
+        self._rand = rand
+        # the next song is the last one
+        self._songs: list[int] = list(songs)
+        self._song_positions = {song_id: i for i, song_id in enumerate(self._songs)}
+        # by deferral: the next song is the first one
+        self._deferred_songs: dict[int, None] = dict.fromkeys(
+            song_id for song_id in deferred_songs if song_id not in self._song_positions
+        )
+
+    def get(self, count: int | None) -> list[int]:
+        return list(islice(chain(reversed(self._songs), self._deferred_songs), count))
+
+    def add(self, song_id: int) -> None:
+        if song_id in self._song_positions or song_id in self._deferred_songs:
+            return
+        self._song_positions[song_id] = len(self._songs)
+        self._songs.append(song_id)
+        # inside-out Fisher-Yates: swap with a random song
+        i = self._rand.randrange(len(self._songs))
+        self._swap(i, len(self._songs) - 1)
+
+    def defer(self, song_id: int) -> None:
+        if song_id in self._song_positions:
+            self._remove(song_id)
+        elif song_id in self._deferred_songs:
+            # deferred again: after the other deferred songs
+            del self._deferred_songs[song_id]
+        else:
+            return
+        self._deferred_songs[song_id] = None
+
+    def remove(self, song_id: int) -> None:
+        if song_id in self._song_positions:
+            self._remove(song_id)
+        else:
+            self._deferred_songs.pop(song_id, None)
+
+    def to_list(self) -> list[int]:
+        return self._songs
+
+    def to_deferred_list(self) -> list[int]:
+        return list(self._deferred_songs)
+
+    def _remove(self, song_id: int) -> None:
+        i = self._song_positions.pop(song_id)
+        last = self._songs.pop()
+        if i < len(self._songs):
+            self._songs[i] = last
+            self._song_positions[last] = i
+
+    def _swap(self, i: int, j: int) -> None:
+        songs = self._songs
+        songs[i], songs[j] = songs[j], songs[i]
+        self._song_positions[songs[i]] = i
+        self._song_positions[songs[j]] = j
+
+
+class SeededSongOrder(SongOrder):
+    """Songs by increasing key (see `get_song_key`), starting after the key
+    `cursor`.  The order doesn't depend on when the songs were added, so
+    that the runs with the same seed go through the songs in the same order.
+    An update is a binary search, plus a move of the following items of the
+    sorted lists.  The songs already sorted are given with their `keys`,
+    so that a saved order is restored without sorting it again."""
+
+    def __init__(
+        self,
+        seed: int,
+        songs: Iterable[int],
+        cursor: int = -1,
+        keys: Iterable[int] | None = None,
+    ) -> None:
+        self.seed = seed
+        self.cursor = cursor
+        if keys is None:
+            keyed = sorted((get_song_key(seed, song_id), song_id) for song_id in songs)
+            self._keys = [key for key, _ in keyed]
+            self._songs = [song_id for _, song_id in keyed]
+        else:
+            self._keys = list(keys)
+            self._songs = list(songs)
+        self._song_ids = set(self._songs)
+
+    def get(self, count: int | None) -> list[int]:
+        size = len(self._songs)
+        start = bisect.bisect_right(self._keys, self.cursor)
+        count = size if count is None else min(count, size)
+        return [self._songs[(start + i) % size] for i in range(count)]
+
+    def add(self, song_id: int) -> None:
+        if song_id in self._song_ids:
+            return
+        key = get_song_key(self.seed, song_id)
+        i = bisect.bisect_right(self._keys, key)
+        self._keys.insert(i, key)
+        self._songs.insert(i, song_id)
+        self._song_ids.add(song_id)
+
+    def defer(self, song_id: int) -> None:
+        # the cursor has moved past the song, which comes after all the others
+        pass
+
+    def remove(self, song_id: int) -> None:
+        if song_id not in self._song_ids:
+            return
+        i = bisect.bisect_left(self._keys, get_song_key(self.seed, song_id))
+        while self._songs[i] != song_id:
+            i += 1
+        del self._keys[i]
+        del self._songs[i]
+        self._song_ids.remove(song_id)
+
+    def to_list(self) -> list[int]:
+        return self._songs
+
+    def to_deferred_list(self) -> list[int]:
+        # the deferred songs are not told apart
+        return []
+
+    def to_key_list(self) -> list[int]:
+        """Return the keys of the songs of `to_list`."""
+        return self._keys
+
+
+class Frontier:
+    """Pending game visits and song downloads, in the order they are to be
+    done, maintained incrementally.
+
+    The games never visited come first, the last added first, then the
+    visited games by oldest visit (in the order of the visits for the same
+    timestamp, rather than in the order they were added), in a `VisitQueue`.
+    The songs come in a random order (`RandomSongOrder`, the deferred songs
+    last), or in the order of a seed if a `DownloadOrder` is given
+    (`SeededSongOrder`).
+    """
+
+    def __init__(
+        self,
+        rand: Random,
+        unvisited_games: Iterable[int] = (),
+        visited_games: Iterable[tuple[int, int]] = (),
+        songs: Iterable[int] = (),
+        order: DownloadOrder | None = None,
+        deferred_songs: Iterable[int] = (),
+        song_keys: Iterable[int] | None = None,
+    ) -> None:
+        # by insertion: iterated in reverse order
+        self._unvisited_games: dict[int, None] = dict.fromkeys(unvisited_games)
+        self._visited_games = VisitQueue(visited_games)
+        self._songs: RandomSongOrder | SeededSongOrder
+        if order is None:
+            self._songs = RandomSongOrder(rand, songs, deferred_songs)
+        else:
+            self._songs = SeededSongOrder(
+                order.seed, chain(songs, deferred_songs), order.cursor, song_keys
+            )
+
+    @staticmethod
+    def from_data(
+        data: FrontierData, rand: Random, order: DownloadOrder | None = None
+    ) -> Frontier:
+        # the songs of the same seed are already sorted (but not those of the
+        # files written before their keys were saved)
+        song_keys: list[int] | None = None
+        if (
+            order is not None
+            and order.seed == data.seed
+            and (len(data.song_keys) == len(data.songs) + len(data.deferred_songs))
+        ):
+            song_keys = data.song_keys
+        return Frontier(
+            rand,
+            data.unvisited_games,
+            zip(data.visited_games, data.visit_timestamps),
+            data.songs,
+            order,
+            data.deferred_songs,
+            song_keys,
+        )
+
+    def to_data(self) -> FrontierData:
+        visited_games = self._visited_games.to_list()
+        return FrontierData(
+            unvisited_games=list(self._unvisited_games),
+            visited_games=[game_id for game_id, _ in visited_games],
+            visit_timestamps=[timestamp for _, timestamp in visited_games],
+            songs=self._songs.to_list(),
+            deferred_songs=self._songs.to_deferred_list(),
+            seed=self.seed,
+            song_keys=(
+                self._songs.to_key_list()
+                if isinstance(self._songs, SeededSongOrder)
+                else []
+            ),
+        )
+
+    @property
+    def seed(self) -> int | None:
+        """Seed of the order of the songs (None for a random order)."""
+        if isinstance(self._songs, SeededSongOrder):
+            return self._songs.seed
+        return None
+
+    def set_cursor(self, cursor: int) -> None:
+        """Move the cursor of the seeded order of the songs."""
+        assert isinstance(self._songs, SeededSongOrder)
+        self._songs.cursor = cursor
+
+    def get_games(self, count: int | None) -> list[int]:
+        game_ids = list(islice(reversed(self._unvisited_games), count))
+        if count is not None:
+            if len(game_ids) >= count:
+                return game_ids
+            count -= len(game_ids)
+        return game_ids + self._visited_games.get(count)
+
+    def get_oldest_visited_game(self) -> int | None:
+        """Return the visited game whose last visit is the oldest."""
+        return self._visited_games.first()
+
+    def get_songs(self, count: int | None) -> list[int]:
+        return self._songs.get(count)
+
+    def add_game(self, game_id: int) -> None:
+        """Add a game never visited."""
+        self._unvisited_games[game_id] = None
+
+    def visit_game(self, game_id: int, timestamp: int) -> None:
+        """Move the game after the games visited at `timestamp` (the time of
+        its last visit)."""
+        self._unvisited_games.pop(game_id, None)
+        self._visited_games.push(game_id, timestamp)
+
+    def remove_game(self, game_id: int) -> None:
+        self._unvisited_games.pop(game_id, None)
+        self._visited_games.remove(game_id)
+
+    def add_song(self, song_id: int) -> None:
+        """Add the song (if not already there)."""
+        self._songs.add(song_id)
+
+    def defer_song(self, song_id: int) -> None:
+        """Move the song after all the others (including the songs deferred
+        before it)."""
+        self._songs.defer(song_id)
+
+    def remove_song(self, song_id: int) -> None:
+        self._songs.remove(song_id)
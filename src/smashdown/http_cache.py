@@ -0,0 +1,99 @@
+import hashlib
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pydantic
+from pydantic import BaseModel
+
+
+class PageNotModified(Exception):
+    """The page hasn't changed since the last conditional request."""
+
+
+def get_http_cache_file(db_file: Path) -> Path:
+    """Return the path of the HTTP cache file associated with the `db_file`."""
+    return db_file.with_name(db_file.name + ".http-cache")
+
+
+class CacheEntry(BaseModel):
+    etag: str | None = None
+    last_modified: str | None = None
+    content_md5: str
+
+
+class CacheContent(BaseModel):
+    entries: dict[str, CacheEntry] = {}
+
+
+@dataclass
+class ValidatorCache:
+    """Validators (ETag, Last-Modified and md5 of the content) of the pages
+    received, to send conditional requests.
+
+    The cache must only be saved once the pages received have been merged
+    into the database and the database saved: otherwise, a page could be
+    considered as not modified while its content is missing from the
+    database.  It is thread-safe.
+    """
+
+    file: Path
+    _entries: dict[str, CacheEntry] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        if not self.file.exists():
+            return
+        try:
+            content = CacheContent.model_validate_json(self.file.read_bytes())
+        except pydantic.ValidationError:
+            logging.warning(f"Invalid HTTP cache '{self.file}', ignored.")
+            return
+        self._entries = content.entries
+        logging.info(f"HTTP cache read from '{self.file}'.")
+
+    def get_request_headers(self, url: str) -> dict[str, str]:
+        """Return the headers of a conditional request to `url`."""
+        with self._lock:
+            entry = self._entries.get(url)
+        headers: dict[str, str] = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def record_response(
+        self, url: str, status_code: int, headers: Mapping[str, str], content: bytes
+    ) -> bool:
+        """Record the response to a conditional request to `url`, and return
+        whether the page has been modified since the last response."""
+        with self._lock:
+            if status_code == 304:
+                return False
+            entry = self._entries.get(url)
+            md5 = hashlib.md5(content).hexdigest()
+            self._entries[url] = CacheEntry(
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+                content_md5=md5,
+            )
+            return entry is None or entry.content_md5 != md5
+
+    def forget(self, url: str) -> None:
+        """Forget the validators of `url`, whose content couldn't be used:
+        the next request to it is not conditional."""
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def save(self) -> None:
+        with self._lock:
+            content = CacheContent(entries=self._entries)
+            tmp_file = self.file.with_name(self.file.name + ".tmp")
+            tmp_file.write_text(content.model_dump_json())
+            os.replace(tmp_file, self.file)
+        logging.info(f"HTTP cache saved into '{self.file}'.")
@@ -0,0 +1,58 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+def get_journal_file(db_file: Path) -> Path:
+    """Return the path of the journal file associated with the `db_file`."""
+    return db_file.with_name(db_file.name + ".journal")
+
+
+@dataclass
+class Journal:
+    """Append-only log of changes, one serialized change per line.
+
+    The journal doesn't know anything about the changes it stores: it's up to
+    the database to serialize and replay them.
+    """
+
+    file: Path
+    compaction_threshold: int = 10_000
+    _count: int | None = field(default=None, init=False, repr=False)
+
+    def read(self) -> list[str]:
+        if not self.file.exists():
+            self._count = 0
+            return []
+        with self.file.open(encoding="utf-8") as fh:
+            lines = [line for line in fh.read().splitlines() if line.strip()]
+        self._count = len(lines)
+        return lines
+
+    def append(self, lines: list[str]) -> None:
+        if not lines:
+            return
+        count = self.count
+        with self.file.open("a", encoding="utf-8") as fh:
+            for line in lines:
+                fh.write(line + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._count = count + len(lines)
+        logging.debug(f"{len(lines)} change(s) appended to '{self.file}'.")
+
+    def clear(self) -> None:
+        self.file.unlink(missing_ok=True)
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        if self._count is None:
+            self.read()
+        assert self._count is not None
+        return self._count
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.count >= self.compaction_threshold
@@ -0,0 +1,157 @@
+import datetime
+import email.utils
+import logging
+import threading
+import time
+from abc import abstractmethod
+from dataclasses import dataclass, field
+from typing import Protocol
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Return the number of seconds of a `Retry-After` header (a number of
+    seconds or an HTTP date), or None if it is missing or invalid."""
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class RateLimiter(Protocol):
+    """Spacing of the requests sent to each host.
+
+    The limiter doesn't sleep itself: `reserve` returns the delay to wait
+    before sending the request, so that it can be used both with
+    `time.sleep` and `asyncio.sleep`.  The implementations are thread-safe.
+    """
+
+    @abstractmethod
+    def reserve(self, host: str) -> float:
+        """Reserve the next slot for a request to `host`, and return the
+        number of seconds to wait before sending the request."""
+        ...  # pragma:nocover
+
+    @abstractmethod
+    def record(
+        self,
+        host: str,
+        status: int | None,
+        latency: float,
+        retry_after: float | None = None,
+    ) -> None:
+        """Record the response to a request to `host` (`status` is None if the
+        request failed without response)."""
+        ...  # pragma:nocover
+
+
+@dataclass
+class MinIntervalLimiter(RateLimiter):
+    """Space the requests sent to each host by at least `min_interval` seconds."""
+
+    min_interval: float
+    _next_times: dict[str, float] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def reserve(self, host: str) -> float:
+        with self._lock:
+            now = time.monotonic()
+            next_time = max(now, self._next_times.get(host, now))
+            self._next_times[host] = next_time + self.min_interval
+            return next_time - now
+
+    def record(
+        self,
+        host: str,
+        status: int | None,
+        latency: float,
+        retry_after: float | None = None,
+    ) -> None:
+        pass
+
+
+@dataclass
+class AdaptiveRateController(RateLimiter):
+    """Adapt the rate of the requests to each host to the responses (AIMD).
+
+    While the host answers quickly (within `target_latency` seconds) and
+    without error, the rate increases additively by `rate_increase`
+    requests per second at each response.  On a slow response, a 429 or 5xx
+    status or a failed request, it is multiplied by `rate_decrease` (at most
+    once per interval, as the requests in flight were sent at the previous
+    rate).  The interval between two requests stays between `min_interval`
+    and `max_interval` seconds, and a `Retry-After` delay is always
+    respected.
+
+    The defaults are conservative: the interval starts at 60 seconds (the
+    shortest of the random naps used before), and it takes about half an
+    hour of healthy responses to reach the 10 seconds of `min_interval`.
+    """
+
+    min_interval: float = 10.0
+    max_interval: float = 120.0
+    initial_interval: float = 60.0
+    target_latency: float = 5.0
+    rate_increase: float = 0.001
+    rate_decrease: float = 0.5
+    _rates: dict[str, float] = field(default_factory=dict, init=False)
+    _next_times: dict[str, float] = field(default_factory=dict, init=False)
+    _last_decreases: dict[str, float] = field(default_factory=dict, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        if not 0 < self.min_interval <= self.max_interval:
+            raise ValueError("0 < min_interval <= max_interval is required")
+
+    def get_interval(self, host: str) -> float:
+        with self._lock:
+            return 1 / self._get_rate(host)
+
+    def _get_rate(self, host: str) -> float:
+        rate = self._rates.get(host)
+        if rate is None:
+            interval = min(
+                self.max_interval, max(self.min_interval, self.initial_interval)
+            )
+            rate = self._rates[host] = 1 / interval
+        return rate
+
+    def reserve(self, host: str) -> float:
+        with self._lock:
+            now = time.monotonic()
+            next_time = max(now, self._next_times.get(host, now))
+            self._next_times[host] = next_time + 1 / self._get_rate(host)
+            return next_time - now
+
+    def record(
+        self,
+        host: str,
+        status: int | None,
+        latency: float,
+        retry_after: float | None = None,
+    ) -> None:
+        with self._lock:
+            now = time.monotonic()
+            rate = self._get_rate(host)
+            is_struggling = (
+                status is None
+                or status == 429
+                or status >= 500
+                or latency > self.target_latency
+            )
+            if not is_struggling:
+                rate = min(1 / self.min_interval, rate + self.rate_increase)
+            elif now - self._last_decreases.get(host, -float("inf")) >= 1 / rate:
+                rate = max(1 / self.max_interval, rate * self.rate_decrease)
+                self._last_decreases[host] = now
+                logging.info(f"Slowing down: {1 / rate:.1f} s between requests.")
+            self._rates[host] = rate
+            if retry_after is not None:
+                self._next_times[host] = max(
+                    self._next_times.get(host, now), now + retry_after
+                )
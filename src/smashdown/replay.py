@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import bisect
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import repeat
+from pathlib import Path
+from typing import Iterator
+
+from smashdown.archive import (
+    HOME_PAGE,
+    ArchiveEntry,
+    HtmlArchive,
+    PageNotArchived,
+    get_game_page,
+    parse_game_page,
+    read_entry,
+)
+from smashdown.client import BrstmStream, Client, GameInfo, PageParser, Parser, SongInfo
+from smashdown.database import DatabaseBackend, GameNotFound
+from smashdown.http_cache import PageNotModified
+from smashdown.updater import Updater
+
+
+def parse_home_page(
+    directory: Path, entry: ArchiveEntry, parser: PageParser
+) -> list[GameInfo]:
+    # in a worker process
+    return parser.get_game_list_from_home_page(read_entry(directory, entry))
+
+
+def parse_game_page_entry(
+    directory: Path, entry: ArchiveEntry, parser: PageParser
+) -> list[SongInfo]:
+    # in a worker process
+    return parser.get_song_list_from_game_page(read_entry(directory, entry))
+
+
+@dataclass
+class ReplayClient(Client):
+    """Client serving the pages of an `HtmlArchive`, as they were at
+    `timestamp` (the last version received at or before `timestamp`, or the
+    last version if `timestamp` is None).
+
+    A conditional request raises `PageNotModified` when the version of the
+    page is the same as the one of the previous conditional request.
+    """
+
+    archive: HtmlArchive
+    parser: PageParser = field(default_factory=Parser)
+    timestamp: int | None = None
+    # parsed pages, by sha256
+    _game_lists: dict[str, list[GameInfo]] = field(default_factory=dict, init=False)
+    _song_lists: dict[str, list[SongInfo]] = field(default_factory=dict, init=False)
+    # versions of each page, sorted by timestamp, and their timestamps
+    _histories: dict[str, tuple[list[int], list[ArchiveEntry]]] = field(
+        default_factory=dict, init=False
+    )
+    # sha256 of the last version served to a conditional request, by page
+    _served: dict[str, str] = field(default_factory=dict, init=False)
+
+    def parse_all(self, processes: int | None = None) -> None:
+        """Parse all the distinct pages of the archive in advance, with a pool
+        of `processes`."""
+        home_pages: dict[str, ArchiveEntry] = {}
+        game_pages: dict[str, ArchiveEntry] = {}
+        for entry in self.archive.get_entries():
+            if entry.page == HOME_PAGE:
+                home_pages.setdefault(entry.sha256, entry)
+            elif parse_game_page(entry.page) is not None:
+                game_pages.setdefault(entry.sha256, entry)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            game_lists = executor.map(
+                parse_home_page,
+                repeat(self.archive.directory),
+                home_pages.values(),
+                repeat(self.parser),
+                chunksize=64,
+            )
+            song_lists = executor.map(
+                parse_game_page_entry,
+                repeat(self.archive.directory),
+                game_pages.values(),
+                repeat(self.parser),
+                chunksize=64,
+            )
+            self._game_lists.update(zip(home_pages, game_lists))
+            self._song_lists.update(zip(game_pages, song_lists))
+        logging.info(f"{len(home_pages) + len(game_pages)} distinct page(s) parsed.")
+
+    def get_game_list(self, conditional: bool = False) -> list[GameInfo]:
+        entry = self._get_entry(HOME_PAGE, conditional)
+        games = self._game_lists.get(entry.sha256)
+        if games is None:
+            html = self.archive.read_entry(entry)
+            games = self.parser.get_game_list_from_home_page(html)
+        return games
+
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
+        entry = self._get_entry(get_game_page(game_id), conditional)
+        songs = self._song_lists.get(entry.sha256)
+        if songs is None:
+            html = self.archive.read_entry(entry)
+            songs = self.parser.get_song_list_from_game_page(html)
+        return songs
+
+    def _get_entry(self, page: str, conditional: bool) -> ArchiveEntry:
+        history = self._histories.get(page)
+        if history is None:
+            entries = sorted(
+                self.archive.get_history(page), key=lambda entry: entry.timestamp
+            )
+            history = [entry.timestamp for entry in entries], entries
+            self._histories[page] = history
+        timestamps, entries = history
+        if self.timestamp is None:
+            index = len(entries) - 1
+        else:
+            index = bisect.bisect_right(timestamps, self.timestamp) - 1
+        if index < 0:
+            raise PageNotArchived(f"no version of {page} at {self.timestamp}")
+        entry = entries[index]
+        if conditional:
+            if self._served.get(page) == entry.sha256:
+                raise PageNotModified
+            self._served[page] = entry.sha256
+        return entry
+
+    def get_brstm_file(self, song_id: int) -> bytes:
+        raise PageNotArchived("the brstm files are not archived")
+
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        raise PageNotArchived("the brstm files are not archived")
+        yield  # pragma:nocover
+
+
+def replay_archive(
+    archive: HtmlArchive,
+    db: DatabaseBackend,
+    parser: PageParser,
+    processes: int | None = None,
+) -> None:
+    """Replay all the pages of the `archive` through an `Updater`, in the
+    order they were received, to update the `db`.
+
+    The pages are parsed first, in parallel.  The home page is replayed
+    before the game pages received at the same time (the html files written
+    by `FileWriter` all have the time of the run), so that the games are
+    known when their pages are replayed.
+    """
+    client = ReplayClient(archive=archive, parser=parser)
+    client.parse_all(processes)
+    updater = Updater(client=client, db=db, clock=lambda: client.timestamp or 0)
+    entries = sorted(
+        archive.get_entries(),
+        key=lambda entry: (entry.timestamp, entry.page != HOME_PAGE),
+    )
+    for entry in entries:
+        client.timestamp = entry.timestamp
+        if entry.page == HOME_PAGE:
+            updater.update_game_list()
+        elif (game_id := parse_game_page(entry.page)) is not None:
+            try:
+                updater.update_game_song_list(game_id)
+            except GameNotFound:
+                logging.warning(f"Game {game_id} not in the database, page ignored.")
+    logging.info(f"{len(entries)} page(s) replayed.")
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from random import Random
+
+
+@dataclass
+class RequestFailed(Exception):
+    """The site didn't give the expected response: no response, an error
+    status or an unexpected content type.  A `transient` failure may succeed
+    if the request is sent again later."""
+
+    message: str
+    status: int | None = None
+    transient: bool = True
+
+
+@dataclass
+class CircuitOpen(Exception):
+    """The site has failed too many times in a row: no request is sent until
+    the circuit breaker is closed again."""
+
+    message: str
+
+
+@dataclass
+class RequestInterrupted(Exception):
+    """The client has been interrupted: the request hasn't been sent (or its
+    retries have been abandoned)."""
+
+    message: str
+
+
+# statuses of the responses that may be different if the request is retried
+TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+@dataclass
+class RetryPolicy:
+    """Retry the transient failures up to `max_attempts` requests in all,
+    with a jittered exponential backoff: before the nth retry, the delay is
+    chosen at random between 0 and `base_delay * 2 ** (n - 1)` seconds (at
+    most `max_delay`), so that clients failing together don't retry
+    together."""
+
+    max_attempts: int = 4
+    base_delay: float = 2.0
+    max_delay: float = 60.0
+    rand: Random = field(default_factory=Random)
+
+    def get_delay(self, retry: int) -> float:
+        """Return the delay before the `retry`th retry (starting at 1)."""
+        return self.rand.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        )
+
+
+@dataclass
+class CircuitBreaker:
+    """Stop sending requests to a failing site.
+
+    After `failure_threshold` transient failures in a row, the circuit is
+    open: requests fail immediately with `CircuitOpen` for `reset_timeout`
+    seconds.  Then a single trial request is let through: the circuit is
+    closed again if it succeeds, and open again if it fails.  It is
+    thread-safe.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 300.0
+    _failure_count: int = field(default=0, init=False)
+    _opened_at: float | None = field(default=None, init=False)
+    _trial_in_flight: bool = field(default=False, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def before_request(self) -> None:
+        """Raise `CircuitOpen` if the request must not be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpen(
+                    f"{self._failure_count} failures in a row, requests suspended"
+                )
+            self._trial_in_flight = True
+            logging.info("Sending a trial request.")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logging.info("The site is back, requests resumed.")
+            self._failure_count = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failure_count += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or (
+                self._failure_count >= self.failure_threshold
+            ):
+                self._opened_at = time.monotonic()
+                logging.error(
+                    f"{self._failure_count} failures in a row, requests suspended"
+                    f" for {self.reset_timeout:.0f} seconds."
+                )
@@ -0,0 +1,87 @@
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from smashdown.database import Game
+
+
+def get_change_history(game: Game) -> tuple[int, int]:
+    """Return the number of songs found on the game page after its first
+    visit, and the time (in seconds) between its first and last visits."""
+    visits = game.visits
+    if visits is None:
+        return 0, 0
+    new_songs = sum(
+        1
+        for song in game.songs
+        if song.added_timestamp is not None and song.added_timestamp > visits.first
+    )
+    return new_songs, visits.last - visits.first
+
+
+@dataclass
+class RevisitScheduler:
+    """Choose the games to revisit by expected number of new songs.
+
+    The songs of a game are assumed to be added at a constant rate, which is
+    estimated from the songs found after its first visit, over the time
+    between its first and last visits.  The estimate is smoothed toward the
+    rate of the whole site with a weight of `prior_time` seconds, so that a
+    game observed for a short time doesn't get an extreme rate.  The expected
+    number of new songs on a game page is its rate multiplied by the time
+    since the last visit: as each visit costs one request, the games with the
+    most expected new songs are visited first (the oldest visit first for the
+    same expectation, so that without any song history, the order is the
+    one of `get_games_by_last_checked`).  The games never visited come first.
+    """
+
+    prior_time: float = 90 * 24 * 3600.0
+    clock: Callable[[], float] = time.time
+
+    def get_games_to_visit(
+        self, games: Iterable[Game], count: int | None
+    ) -> list[Game]:
+        """Return the next `count` `games` to visit (all of them if None).
+        The games never visited are kept in the given order."""
+        games = [game for game in games if not game.is_deleted_from_site]
+        unvisited = [game for game in games if game.last_checked is None]
+        visited = [game for game in games if game.last_checked is not None]
+        if count is not None and len(unvisited) >= count:
+            return unvisited[:count]
+        site_rate = self.get_site_rate(visited)
+        now = self.clock()
+
+        def key(game: Game) -> tuple[float, float]:
+            assert game.last_checked is not None
+            return self.get_expected_new_songs(game, site_rate, now), -game.last_checked
+
+        if count is None:
+            ranked = sorted(visited, key=key, reverse=True)
+        else:
+            ranked = heapq.nlargest(count - len(unvisited), visited, key=key)
+        return unvisited + ranked
+
+    @staticmethod
+    def get_site_rate(games: Iterable[Game]) -> float:
+        """Return the number of new songs per second over all the `games`."""
+        new_songs, observed_time = 0, 0
+        for game in games:
+            game_new_songs, game_observed_time = get_change_history(game)
+            new_songs += game_new_songs
+            observed_time += game_observed_time
+        if observed_time == 0:
+            return 0.0
+        return new_songs / observed_time
+
+    def get_rate(self, game: Game, site_rate: float) -> float:
+        """Return the estimated number of new songs per second of the game."""
+        new_songs, observed_time = get_change_history(game)
+        return (new_songs + site_rate * self.prior_time) / (
+            observed_time + self.prior_time
+        )
+
+    def get_expected_new_songs(self, game: Game, site_rate: float, now: float) -> float:
+        if game.last_checked is None:
+            return float("inf")
+        return self.get_rate(game, site_rate) * max(0.0, now - game.last_checked)
@@ -0,0 +1,534 @@
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import fields, replace
+from pathlib import Path
+from random import Random
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from smashdown.database import (
+    Database,
+    DatabaseBackend,
+    DatabaseStatistics,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameNotFound,
+    Site,
+    Song,
+    SongNotFound,
+    VisitSummary,
+    drop_old_visits,
+)
+from smashdown.frontier import DownloadOrder, Frontier
+
+# Version of the manifest, shards and shard indexes.  Directories of another
+# version are refused.
+SHARDED_FORMAT_VERSION = 2
+
+# games whose ids are in [bucket * bucket_size, (bucket + 1) * bucket_size)
+# are stored in the same shard
+DEFAULT_BUCKET_SIZE = 100
+
+MANIFEST_FILE = "site.json"
+GAMES_DIR = "games"
+INDEX_DIR = "index"
+
+
+class SiteManifest(BaseModel):
+    """Content of the site file of a sharded database: everything but the
+    games."""
+
+    format_version: int = SHARDED_FORMAT_VERSION
+    base_url: str
+    bucket_size: int
+    # ids of the buckets with a shard
+    buckets: list[int] = Field(default_factory=list)
+    download_timestamps: list[int] = Field(default_factory=list)
+    old_visits: Optional[VisitSummary] = None
+    download_order: Optional[DownloadOrder] = None
+    # sequence number of the next game added
+    next_sequence: int = 0
+
+
+class GameSummary(BaseModel):
+    """What is needed of a game to plan the work without reading its shard."""
+
+    id: int
+    # order in which the games were added
+    sequence: int
+    is_deleted_from_site: bool
+    last_checked: Optional[int]
+    song_ids: list[int]
+    # songs to download, without and with a failed download (with the time
+    # of the failure)
+    pending_song_ids: list[int]
+    deferred_song_ids: list[int]
+    deferred_timestamps: list[int]
+
+    @staticmethod
+    def of(game: Game, sequence: int) -> GameSummary:
+        pending: list[int] = []
+        deferred: list[tuple[int, int]] = []
+        for song in game.songs:
+            if not song.is_deleted_from_site and not song.is_brstm_downloaded:
+                failure = song.brstm_download_failure
+                if failure is None:
+                    pending.append(song.id)
+                else:
+                    deferred.append((song.id, failure.timestamp))
+        return GameSummary(
+            id=game.id,
+            sequence=sequence,
+            is_deleted_from_site=game.is_deleted_from_site,
+            last_checked=game.last_checked,
+            song_ids=[song.id for song in game.songs],
+            pending_song_ids=pending,
+            deferred_song_ids=[song_id for song_id, _ in deferred],
+            deferred_timestamps=[timestamp for _, timestamp in deferred],
+        )
+
+
+class GameShard(BaseModel):
+    format_version: int = SHARDED_FORMAT_VERSION
+    games: list[Game]
+
+
+class ShardIndex(BaseModel):
+    format_version: int = SHARDED_FORMAT_VERSION
+    games: list[GameSummary]
+    statistics: DatabaseStatistics
+
+
+def _write_file(file: Path, data: bytes) -> None:
+    tmp_file = file.with_name(file.name + ".tmp")
+    with tmp_file.open("wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_file, file)
+
+
+def _check_version(version: int, file: Path) -> None:
+    if version != SHARDED_FORMAT_VERSION:
+        raise ValueError(f"'{file}' has an unsupported format version ({version})")
+
+
+class ShardedDatabase(DatabaseBackend):
+    """Database backend storing the site in a directory: a small manifest
+    (`site.json`), and the games in shards by bucket of game ids
+    (`games/<bucket>.json`), each with an index (`index/<bucket>.json`) of
+    the summaries of its games and its statistics.
+
+    Only the manifest and the indexes are read on open, to plan the work
+    (the frontier is built from the summaries) and to count the statistics.
+    A shard is read when one of its games or songs is requested, and `save`
+    rewrites only the shards changed since the last save, with their
+    indexes, so that its cost depends on the number of changed shards, not
+    on the size of the site.  Each file is replaced atomically.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        base_url: str | None = None,
+        bucket_size: int = DEFAULT_BUCKET_SIZE,
+    ) -> None:
+        self._directory = directory
+        self._random = Random()
+        self._shards: dict[int, dict[int, Game]] = {}
+        # songs of the shards read
+        self._loaded_songs: dict[int, tuple[Game, Song]] = {}
+        # built on the first lookup by path, once all the shards are read
+        self._songs_by_location: Optional[dict[Path, tuple[Game, Song]]] = None
+        self._dirty_buckets: set[int] = set()
+        self._summaries: dict[int, GameSummary] = {}
+        self._song_games: dict[int, int] = {}
+        self._statistics = DatabaseStatistics()
+
+        manifest_file = directory / MANIFEST_FILE
+        if not manifest_file.exists():
+            if base_url is None:
+                raise ValueError(f"no site in '{directory}' and no base url given")
+            self._manifest = SiteManifest(base_url=base_url, bucket_size=bucket_size)
+            self._is_manifest_dirty = True
+            logging.info(f"New sharded database created in '{directory}'.")
+        else:
+            self._manifest = SiteManifest.model_validate_json(
+                manifest_file.read_bytes()
+            )
+            _check_version(self._manifest.format_version, manifest_file)
+            self._is_manifest_dirty = False
+            for bucket in self._manifest.buckets:
+                self._read_index(bucket)
+            logging.info(
+                f"Sharded database read from '{directory}'"
+                f" ({len(self._manifest.buckets)} shard(s))."
+            )
+        self._buckets = set(self._manifest.buckets)
+        self._frontier = self._build_frontier()
+
+    @staticmethod
+    def build_from_database(
+        directory: Path, database: Database, bucket_size: int = DEFAULT_BUCKET_SIZE
+    ) -> ShardedDatabase:
+        """Write the content of a json `database` into a new sharded
+        database."""
+        sharded_db = ShardedDatabase(
+            directory, base_url=database.site.base_url, bucket_size=bucket_size
+        )
+        sharded_db.set_download_order(database.download_order)
+        manifest = sharded_db._manifest
+        manifest.download_timestamps = list(database.site.download_timestamps)
+        manifest.old_visits = database.site.old_visits
+        for game in database.site.games:
+            sharded_db.add_game(game.model_copy(deep=True))
+        sharded_db.save()
+        return sharded_db
+
+    def to_database(self) -> Database:
+        """Return the whole content as a json database."""
+        site = Site(
+            base_url=self._manifest.base_url,
+            games=self.get_games(),
+            download_timestamps=list(self._manifest.download_timestamps),
+            old_visits=self._manifest.old_visits,
+        )
+        return Database(site=site, download_order=self.get_download_order())
+
+    def _get_bucket(self, game_id: int) -> int:
+        return game_id // self._manifest.bucket_size
+
+    def _get_shard_file(self, bucket: int) -> Path:
+        return self._directory / GAMES_DIR / f"{bucket}.json"
+
+    def _get_index_file(self, bucket: int) -> Path:
+        return self._directory / INDEX_DIR / f"{bucket}.json"
+
+    def _read_index(self, bucket: int) -> None:
+        file = self._get_index_file(bucket)
+        index = ShardIndex.model_validate_json(file.read_bytes())
+        _check_version(index.format_version, file)
+        for summary in index.games:
+            self._summaries[summary.id] = summary
+            for song_id in summary.song_ids:
+                self._song_games.setdefault(song_id, summary.id)
+        for field in fields(DatabaseStatistics):
+            value = getattr(self._statistics, field.name)
+            setattr(
+                self._statistics,
+                field.name,
+                value + getattr(index.statistics, field.name),
+            )
+
+    def _get_shard(self, bucket: int) -> dict[int, Game]:
+        """Return the games of the bucket by id, in the order they were
+        added, reading its shard if needed."""
+        shard = self._shards.get(bucket)
+        if shard is not None:
+            return shard
+        if bucket in self._buckets:
+            file = self._get_shard_file(bucket)
+            games = GameShard.model_validate_json(file.read_bytes())
+            _check_version(games.format_version, file)
+            shard = {game.id: game for game in games.games}
+            logging.debug(f"Shard {bucket} read ({len(shard)} game(s)).")
+        else:
+            shard = {}
+        self._shards[bucket] = shard
+        for game in shard.values():
+            for song in game.songs:
+                self._loaded_songs.setdefault(song.id, (game, song))
+        return shard
+
+    def _read_all_shards(self) -> None:
+        for bucket in self._buckets:
+            self._get_shard(bucket)
+
+    def _build_frontier(self) -> Frontier:
+        unvisited_games: list[int] = []
+        visited_games: list[tuple[int, int]] = []
+        song_ids: list[int] = []
+        failed_songs: list[tuple[int, int]] = []
+        for summary in sorted(self._summaries.values(), key=lambda s: s.sequence):
+            if not summary.is_deleted_from_site:
+                if summary.last_checked is None:
+                    unvisited_games.append(summary.id)
+                else:
+                    visited_games.append((summary.id, summary.last_checked))
+            song_ids.extend(summary.pending_song_ids)
+            failed_songs.extend(
+                zip(summary.deferred_timestamps, summary.deferred_song_ids)
+            )
+        self._random.shuffle(song_ids)
+        failed_songs.sort()
+        return Frontier(
+            self._random,
+            unvisited_games=unvisited_games,
+            visited_games=visited_games,
+            # the next song is the last one (in a random order)
+            songs=song_ids[::-1],
+            order=self._manifest.download_order,
+            # by oldest failure, like the json database
+            deferred_songs=[song_id for _, song_id in failed_songs],
+        )
+
+    def _touch(self, game: Game) -> None:
+        """Update the summary of the changed `game`, whose shard is to be
+        saved."""
+        sequence = self._summaries[game.id].sequence
+        self._summaries[game.id] = GameSummary.of(game, sequence)
+        self._dirty_buckets.add(self._get_bucket(game.id))
+
+    def _get_loaded_song(self, song: Song) -> Game:
+        found = self._loaded_songs.get(song.id)
+        if found is None:
+            raise SongNotFound
+        return found[0]
+
+    def save(self) -> None:
+        if not self._dirty_buckets and not self._is_manifest_dirty:
+            return
+        (self._directory / GAMES_DIR).mkdir(parents=True, exist_ok=True)
+        (self._directory / INDEX_DIR).mkdir(exist_ok=True)
+        for bucket in sorted(self._dirty_buckets):
+            games = list(self._shards[bucket].values())
+            statistics = DatabaseStatistics()
+            for game in games:
+                statistics.add_game(game)
+                for song in game.songs:
+                    statistics.add_song(song)
+            # the index is written after its shard, and the manifest last
+            _write_file(
+                self._get_shard_file(bucket),
+                GameShard(games=games).model_dump_json().encode(),
+            )
+            index = ShardIndex(
+                games=[self._summaries[game.id] for game in games],
+                statistics=statistics,
+            )
+            _write_file(self._get_index_file(bucket), index.model_dump_json().encode())
+        if self._is_manifest_dirty:
+            _write_file(
+                self._directory / MANIFEST_FILE,
+                self._manifest.model_dump_json(indent=2).encode(),
+            )
+        logging.info(
+            f"{len(self._dirty_buckets)} shard(s) saved into '{self._directory}'."
+        )
+        self._dirty_buckets.clear()
+        self._is_manifest_dirty = False
+
+    def get_games(self) -> list[Game]:
+        """Return all the games, in the order they were added (all the shards
+        are read)."""
+        self._read_all_shards()
+        games = [game for shard in self._shards.values() for game in shard.values()]
+        games.sort(key=lambda game: self._summaries[game.id].sequence)
+        return games
+
+    def get_game_from_id(self, game_id: int) -> Game:
+        if game_id not in self._summaries:
+            raise GameNotFound
+        return self._get_shard(self._get_bucket(game_id))[game_id]
+
+    def get_song_from_id(self, song_id: int) -> Song:
+        game_id = self._song_games.get(song_id)
+        if game_id is None:
+            raise SongNotFound
+        self._get_shard(self._get_bucket(game_id))
+        return self._loaded_songs[song_id][1]
+
+    def get_game_from_song_id(self, song_id: int) -> Game:
+        game_id = self._song_games.get(song_id)
+        if game_id is None:
+            raise SongNotFound
+        return self.get_game_from_id(game_id)
+
+    def get_song_from_downloaded_path(self, path: Path) -> tuple[Game, Song]:
+        """Return the song downloaded into `path` (all the shards are read on
+        the first call)."""
+        if self._songs_by_location is None:
+            self._read_all_shards()
+            self._songs_by_location = {}
+            for game, song in self._loaded_songs.values():
+                if song.brstm_download_info is not None:
+                    self._songs_by_location.setdefault(
+                        song.brstm_download_info.location, (game, song)
+                    )
+        found = self._songs_by_location.get(path)
+        if found is None:
+            raise SongNotFound
+        return found
+
+    def get_games_by_last_checked(self, count: int | None) -> list[Game]:
+        """Return games starting with the not checked (the last added first),
+        then the oldest checked.  Only their shards are read."""
+        return [self.get_game_from_id(id) for id in self._frontier.get_games(count)]
+
+    def get_songs_with_no_brstm_downloaded(self, count: int | None) -> list[Song]:
+        """Return songs to download, in the order of the json database.  Only
+        their shards are read."""
+        return [self.get_song_from_id(id) for id in self._frontier.get_songs(count)]
+
+    def get_statistics(self) -> DatabaseStatistics:
+        """Return the statistics of the indexes, maintained incrementally
+        (no shard is read)."""
+        stats = replace(self._statistics, game_oldest_visit=0)
+        game_id = self._frontier.get_oldest_visited_game()
+        if game_id is not None:
+            stats.game_oldest_visit = self._summaries[game_id].last_checked or 0
+        return stats
+
+    def get_download_order(self) -> DownloadOrder | None:
+        return self._manifest.download_order
+
+    def add_game(self, game: Game) -> None:
+        if game.id in self._summaries:
+            raise ValueError(f"game {game.id} already in the database")
+        bucket = self._get_bucket(game.id)
+        self._get_shard(bucket)[game.id] = game
+        if bucket not in self._buckets:
+            self._buckets.add(bucket)
+            self._manifest.buckets = sorted(self._buckets)
+        self._summaries[game.id] = GameSummary.of(game, self._manifest.next_sequence)
+        self._manifest.next_sequence += 1
+        self._is_manifest_dirty = True
+        self._dirty_buckets.add(bucket)
+        self._statistics.add_game(game)
+        for song in game.songs:
+            self._index_song(game, song)
+        if not game.is_deleted_from_site:
+            if game.last_checked is None:
+                self._frontier.add_game(game.id)
+            else:
+                self._frontier.visit_game(game.id, game.last_checked)
+
+    def add_song(self, game: Game, song: Song) -> None:
+        game.songs.append(song)
+        self._index_song(game, song)
+        self._touch(game)
+
+    def _index_song(self, game: Game, song: Song) -> None:
+        self._song_games.setdefault(song.id, game.id)
+        self._loaded_songs.setdefault(song.id, (game, song))
+        if self._songs_by_location is not None and song.brstm_download_info:
+            self._songs_by_location.setdefault(
+                song.brstm_download_info.location, (game, song)
+            )
+        self._statistics.add_song(song)
+        if not song.is_deleted_from_site and not song.is_brstm_downloaded:
+            self._frontier.add_song(song.id)
+            if song.brstm_download_failure is not None:
+                self._frontier.defer_song(song.id)
+
+    def set_brstm_download_info(
+        self, song: Song, download_info: FileDownloadInfo | None
+    ) -> None:
+        game = self._get_loaded_song(song)
+        if self._songs_by_location is not None:
+            if song.brstm_download_info is not None:
+                location = song.brstm_download_info.location
+                indexed = self._songs_by_location.get(location)
+                if indexed is not None and indexed[1] is song:
+                    del self._songs_by_location[location]
+            if download_info is not None:
+                self._songs_by_location[download_info.location] = (game, song)
+        self._statistics.add_song(song, -1)
+        song.brstm_download_info = download_info
+        self._statistics.add_song(song)
+        self._update_frontier_song(song)
+        self._touch(game)
+
+    def set_brstm_download_failure(
+        self, song: Song, failure: DownloadFailure | None
+    ) -> None:
+        game = self._get_loaded_song(song)
+        self._statistics.add_song(song, -1)
+        song.brstm_download_failure = failure
+        self._statistics.add_song(song)
+        if failure is not None:
+            # the other songs are downloaded first
+            self._frontier.defer_song(song.id)
+        self._touch(game)
+
+    def set_game_deleted_from_site(self, game: Game, is_deleted: bool) -> None:
+        if game.is_deleted_from_site != is_deleted:
+            self._statistics.add_game(game, -1)
+            game.is_deleted_from_site = is_deleted
+            self._statistics.add_game(game)
+            if is_deleted:
+                self._frontier.remove_game(game.id)
+            elif game.last_checked is None:
+                self._frontier.add_game(game.id)
+            else:
+                self._frontier.visit_game(game.id, game.last_checked)
+            self._touch(game)
+
+    def set_song_deleted_from_site(self, song: Song, is_deleted: bool) -> None:
+        if song.is_deleted_from_site != is_deleted:
+            game = self._get_loaded_song(song)
+            self._statistics.add_song(song, -1)
+            song.is_deleted_from_site = is_deleted
+            self._statistics.add_song(song)
+            self._update_frontier_song(song)
+            self._touch(game)
+
+    def _update_frontier_song(self, song: Song) -> None:
+        if not song.is_deleted_from_site and not song.is_brstm_downloaded:
+            self._frontier.add_song(song.id)
+        else:
+            self._frontier.remove_song(song.id)
+
+    def add_game_visit(self, game: Game, timestamp: int) -> None:
+        self._statistics.add_game(game, -1)
+        game.add_visit(timestamp)
+        self._statistics.add_game(game)
+        if not game.is_deleted_from_site:
+            assert game.last_checked is not None
+            self._frontier.visit_game(game.id, game.last_checked)
+        self._touch(game)
+
+    def add_site_visit(self, timestamp: int) -> None:
+        manifest = self._manifest
+        manifest.download_timestamps.append(timestamp)
+        manifest.old_visits = drop_old_visits(
+            manifest.download_timestamps, manifest.old_visits
+        )
+        self._is_manifest_dirty = True
+
+    def drop_old_visits(self, kept_visits: int) -> int:
+        """Keep only the last `kept_visits` of the site and of each game, and
+        return the number of visits dropped (all the shards are read, and the
+        ones with dropped visits rewritten on `save`)."""
+        manifest = self._manifest
+        count = max(0, len(manifest.download_timestamps) - kept_visits)
+        manifest.old_visits = drop_old_visits(
+            manifest.download_timestamps, manifest.old_visits, kept_visits
+        )
+        self._is_manifest_dirty = True
+        self._read_all_shards()
+        for shard in self._shards.values():
+            for game in shard.values():
+                game_count = game.drop_old_visits(kept_visits)
+                if game_count:
+                    self._dirty_buckets.add(self._get_bucket(game.id))
+                    count += game_count
+        return count
+
+    def set_download_order(self, order: DownloadOrder | None) -> None:
+        """Download the songs in the order of a seed, starting after its
+        cursor, or in a random order if None."""
+        previous = self._manifest.download_order
+        self._manifest.download_order = None if order is None else order.model_copy()
+        self._is_manifest_dirty = True
+        if (None if order is None else order.seed) != (
+            None if previous is None else previous.seed
+        ):
+            # the songs must be sorted again
+            self._frontier = self._build_frontier()
+        elif order is not None:
+            self._frontier.set_cursor(order.cursor)
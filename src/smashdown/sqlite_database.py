@@ -0,0 +1,652 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+from smashdown.database import (
+    KEPT_VISITS,
+    Database,
+    DatabaseBackend,
+    DatabaseStatistics,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameNotFound,
+    Site,
+    Song,
+    SongNotFound,
+    VisitSummary,
+)
+from smashdown.frontier import DownloadOrder, get_song_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS site (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    base_url TEXT NOT NULL,
+    old_visit_count INTEGER,
+    old_visit_first INTEGER,
+    old_visit_last INTEGER
+);
+CREATE TABLE IF NOT EXISTS site_visits (
+    timestamp INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    is_deleted_from_site INTEGER NOT NULL DEFAULT 0,
+    last_checked INTEGER,
+    old_visit_count INTEGER,
+    old_visit_first INTEGER,
+    old_visit_last INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_by_last_checked
+    ON games (last_checked) WHERE is_deleted_from_site = 0;
+CREATE TABLE IF NOT EXISTS game_visits (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS game_visits_by_game ON game_visits (game_id);
+CREATE TABLE IF NOT EXISTS songs (
+    id INTEGER NOT NULL UNIQUE,
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    title TEXT NOT NULL,
+    is_deleted_from_site INTEGER NOT NULL DEFAULT 0,
+    brstm_location TEXT,
+    brstm_timestamp INTEGER,
+    brstm_md5 TEXT,
+    brstm_failure_timestamp INTEGER,
+    brstm_failure_count INTEGER,
+    brstm_failure_reason TEXT,
+    download_rank REAL,
+    added_timestamp INTEGER,
+    download_key INTEGER
+);
+CREATE INDEX IF NOT EXISTS songs_by_game ON songs (game_id);
+CREATE INDEX IF NOT EXISTS songs_by_brstm_location ON songs (brstm_location);
+CREATE INDEX IF NOT EXISTS songs_with_no_brstm_downloaded
+    ON songs (id) WHERE is_deleted_from_site = 0 AND brstm_location IS NULL;
+CREATE TABLE IF NOT EXISTS download_order (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seed INTEGER NOT NULL,
+    cursor INTEGER NOT NULL
+);
+"""
+
+# indexes on the columns added after the first version of the schema
+ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS songs_by_download_rank
+    ON songs (download_rank)
+    WHERE is_deleted_from_site = 0 AND brstm_location IS NULL;
+CREATE INDEX IF NOT EXISTS songs_by_download_key
+    ON songs (download_key)
+    WHERE is_deleted_from_site = 0 AND brstm_location IS NULL;
+"""
+
+# The songs to download are picked by increasing `download_rank`: a random
+# number in [0, 1) given when the song is added, and 1 + the time of the
+# failure after a failed download, so that the other songs are downloaded
+# first, then the songs that failed, by oldest failure.
+RANDOM_RANK = "(random() / 18446744073709551616.0 + 0.5)"
+DEFERRED_RANK = "(1 + ?)"
+
+# With a seeded order, the songs are picked by increasing `download_key`:
+# the `get_song_key` of the seed of the `download_order` table (NULL without
+# a seeded order).
+DOWNLOAD_KEY = "(SELECT download_key(seed, ?) FROM download_order)"
+
+# summary of the visits dropped from the site_visits and game_visits tables
+OLD_VISIT_COLUMNS = [
+    ("old_visit_count", "INTEGER", "NULL"),
+    ("old_visit_first", "INTEGER", "NULL"),
+    ("old_visit_last", "INTEGER", "NULL"),
+]
+
+# columns added after the first version of the schema, with their type and
+# the value of the existing rows
+ADDED_COLUMNS = {
+    "site": OLD_VISIT_COLUMNS,
+    "games": OLD_VISIT_COLUMNS,
+    "songs": [
+        ("brstm_failure_timestamp", "INTEGER", "NULL"),
+        ("brstm_failure_count", "INTEGER", "NULL"),
+        ("brstm_failure_reason", "TEXT", "NULL"),
+        ("download_rank", "REAL", RANDOM_RANK),
+        ("added_timestamp", "INTEGER", "NULL"),
+        (
+            "download_key",
+            "INTEGER",
+            "(SELECT download_key(seed, songs.id) FROM download_order)",
+        ),
+    ],
+}
+
+# above this number of games, songs and visits are read for all the games
+# rather than with a `game_id IN (...)` filter
+MAX_FILTERED_GAMES = 500
+
+GAME_COLUMNS = (
+    "id, title, is_deleted_from_site, old_visit_count, old_visit_first, old_visit_last"
+)
+SONG_COLUMNS = (
+    "id, game_id, title, is_deleted_from_site,"
+    " brstm_location, brstm_timestamp, brstm_md5,"
+    " brstm_failure_timestamp, brstm_failure_count, brstm_failure_reason,"
+    " added_timestamp"
+)
+
+# visits of the `{table}` but the last `?` of each `{owner}`
+OLD_VISITS = (
+    "SELECT visit_rowid, owner_id, timestamp FROM ("
+    " SELECT rowid AS visit_rowid, {owner} AS owner_id, timestamp,"
+    " row_number() OVER (PARTITION BY {owner} ORDER BY rowid DESC) AS n"
+    " FROM {table} {filter}"
+    ") WHERE n > ?"
+)
+
+
+class SQLiteDatabase(DatabaseBackend):
+    """Database backend storing the site in a SQLite file.
+
+    Changes are made in a transaction that is committed on `save`.  Games and
+    songs are built from the tables on each request: two calls return
+    different objects for the same game or song.
+    """
+
+    def __init__(self, file: Path | str, base_url: str | None = None) -> None:
+        self._connection = sqlite3.connect(file)
+        self._connection.create_function(
+            "download_key", 2, get_song_key, deterministic=True
+        )
+        self._connection.executescript(SCHEMA)
+        self._add_missing_columns()
+        self._connection.executescript(ADDED_INDEXES)
+        row = self._connection.execute("SELECT base_url FROM site").fetchone()
+        if row is None:
+            if base_url is None:
+                raise ValueError(f"no site in '{file}' and no base url given")
+            self._connection.execute(
+                "INSERT INTO site (id, base_url) VALUES (1, ?)", (base_url,)
+            )
+            self._connection.commit()
+            logging.info(f"New SQLite database created in '{file}'.")
+        else:
+            logging.info(f"SQLite database read from '{file}'.")
+
+    def _add_missing_columns(self) -> None:
+        # the tables of a file created by a previous version lack some columns
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {
+                row[1]
+                for row in self._connection.execute(f"PRAGMA table_info({table})")
+            }
+            for name, type, value in columns:
+                if name not in existing:
+                    self._connection.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {name} {type}"
+                    )
+                    self._connection.execute(f"UPDATE {table} SET {name} = {value}")
+                    logging.info(f"Column {name} added to the table {table}.")
+        self._connection.commit()
+
+    @staticmethod
+    def build_from_database(file: Path, database: Database) -> SQLiteDatabase:
+        """Write the content of a json `database` into a new SQLite file."""
+        sqlite_db = SQLiteDatabase(file, base_url=database.site.base_url)
+        # before the songs, whose keys are computed when inserted
+        sqlite_db.set_download_order(database.download_order)
+        sqlite_db._connection.executemany(
+            "INSERT INTO site_visits (timestamp) VALUES (?)",
+            [(timestamp,) for timestamp in database.site.download_timestamps],
+        )
+        sqlite_db._connection.execute(
+            "UPDATE site SET old_visit_count = ?, old_visit_first = ?,"
+            " old_visit_last = ?",
+            sqlite_db._get_old_visit_values(database.site.old_visits),
+        )
+        for game in database.site.games:
+            sqlite_db.add_game(game)
+        sqlite_db.save()
+        return sqlite_db
+
+    def to_database(self) -> Database:
+        """Return the whole content as a json database."""
+        (base_url, *old_visits) = self._connection.execute(
+            "SELECT base_url, old_visit_count, old_visit_first, old_visit_last"
+            " FROM site"
+        ).fetchone()
+        timestamps = [
+            timestamp
+            for (timestamp,) in self._connection.execute(
+                "SELECT timestamp FROM site_visits ORDER BY rowid"
+            )
+        ]
+        site = Site(
+            base_url=base_url,
+            games=self.get_games(),
+            download_timestamps=timestamps,
+            old_visits=self._build_old_visits(*old_visits),
+        )
+        return Database(site=site, download_order=self.get_download_order())
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def save(self) -> None:
+        self._connection.commit()
+        logging.info("SQLite database committed.")
+
+    def compact(self) -> None:
+        """Commit, and rebuild the file to give the space of the deleted rows
+        back."""
+        self.save()
+        self._connection.execute("VACUUM")
+
+    def get_games(self) -> list[Game]:
+        return self._build_games(
+            f"SELECT {GAME_COLUMNS} FROM games ORDER BY rowid", (), all_games=True
+        )
+
+    def get_game_from_id(self, game_id: int) -> Game:
+        games = self._build_games(
+            f"SELECT {GAME_COLUMNS} FROM games WHERE id = ?", (game_id,)
+        )
+        if not games:
+            raise GameNotFound
+        return games[0]
+
+    def get_song_from_id(self, song_id: int) -> Song:
+        row = self._connection.execute(
+            f"SELECT {SONG_COLUMNS} FROM songs WHERE id = ?", (song_id,)
+        ).fetchone()
+        if row is None:
+            raise SongNotFound
+        return self._build_song(row)
+
+    def get_game_from_song_id(self, song_id: int) -> Game:
+        row = self._connection.execute(
+            "SELECT game_id FROM songs WHERE id = ?", (song_id,)
+        ).fetchone()
+        if row is None:
+            raise SongNotFound
+        return self.get_game_from_id(row[0])
+
+    def get_song_from_downloaded_path(self, path: Path) -> tuple[Game, Song]:
+        row = self._connection.execute(
+            f"SELECT {SONG_COLUMNS} FROM songs WHERE brstm_location = ?",
+            (str(path),),
+        ).fetchone()
+        if row is None:
+            raise SongNotFound
+        song = self._build_song(row)
+        return self.get_game_from_id(row[1]), song
+
+    def get_games_by_last_checked(self, count: int | None) -> list[Game]:
+        """Return games starting with the not checked, then the oldest checked.
+
+        Not checked games are returned in reverse order, like the json
+        database.  Both queries read the next games from the
+        `games_by_last_checked` index, without sorting the table.
+        """
+        games = self._build_games(
+            f"SELECT {GAME_COLUMNS} FROM games"
+            " WHERE is_deleted_from_site = 0 AND last_checked IS NULL"
+            " ORDER BY rowid DESC LIMIT ?",
+            (-1 if count is None else count,),
+        )
+        if count is not None and len(games) >= count:
+            return games
+        return games + self._build_games(
+            f"SELECT {GAME_COLUMNS} FROM games"
+            " WHERE is_deleted_from_site = 0 AND last_checked IS NOT NULL"
+            " ORDER BY last_checked, rowid LIMIT ?",
+            (-1 if count is None else count - len(games),),
+        )
+
+    def get_songs_with_no_brstm_downloaded(self, count: int | None) -> list[Song]:
+        """Return songs to download, by increasing `download_rank`, or by
+        increasing `download_key` from the cursor of the seeded order (then
+        from the start).  Both read the next songs from an index."""
+        order = self.get_download_order()
+        if order is None:
+            rows = self._connection.execute(
+                f"SELECT {SONG_COLUMNS} FROM songs"
+                " WHERE is_deleted_from_site = 0 AND brstm_location IS NULL"
+                " ORDER BY download_rank LIMIT ?",
+                (-1 if count is None else count,),
+            )
+            return [self._build_song(row) for row in rows]
+        songs = self._get_songs_by_download_key(">", order.cursor, count)
+        if count is not None and len(songs) >= count:
+            return songs
+        return songs + self._get_songs_by_download_key(
+            "<=", order.cursor, None if count is None else count - len(songs)
+        )
+
+    def _get_songs_by_download_key(
+        self, operator: str, cursor: int, count: int | None
+    ) -> list[Song]:
+        rows = self._connection.execute(
+            f"SELECT {SONG_COLUMNS} FROM songs"
+            " WHERE is_deleted_from_site = 0 AND brstm_location IS NULL"
+            f" AND download_key {operator} ? ORDER BY download_key, id LIMIT ?",
+            (cursor, -1 if count is None else count),
+        )
+        return [self._build_song(row) for row in rows]
+
+    def get_statistics(self) -> DatabaseStatistics:
+        stats = DatabaseStatistics()
+        (
+            stats.games,
+            stats.games_visited,
+            stats.games_deleted_from_site,
+            game_oldest_visit,
+        ) = self._connection.execute(
+            "SELECT count(*), count(last_checked),"
+            " coalesce(sum(is_deleted_from_site), 0),"
+            " min(CASE WHEN is_deleted_from_site = 0 THEN last_checked END)"
+            " FROM games"
+        ).fetchone()
+        stats.games_not_visited = stats.games - stats.games_visited
+        stats.game_oldest_visit = game_oldest_visit or 0
+        (
+            stats.songs,
+            stats.songs_downloaded,
+            stats.songs_deleted_from_site,
+            stats.songs_with_download_failure,
+        ) = self._connection.execute(
+            "SELECT count(*), count(brstm_location),"
+            " coalesce(sum(is_deleted_from_site), 0), count(brstm_failure_count)"
+            " FROM songs"
+        ).fetchone()
+        stats.songs_not_downloaded = stats.songs - stats.songs_downloaded
+        return stats
+
+    def get_download_order(self) -> DownloadOrder | None:
+        row = self._connection.execute(
+            "SELECT seed, cursor FROM download_order"
+        ).fetchone()
+        if row is None:
+            return None
+        return DownloadOrder(seed=row[0], cursor=row[1])
+
+    def add_game(self, game: Game) -> None:
+        self._connection.execute(
+            "INSERT INTO games (id, title, is_deleted_from_site, last_checked,"
+            " old_visit_count, old_visit_first, old_visit_last)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                game.id,
+                game.title,
+                game.is_deleted_from_site,
+                game.last_checked,
+                *self._get_old_visit_values(game.old_visits),
+            ),
+        )
+        self._connection.executemany(
+            "INSERT INTO game_visits (game_id, timestamp) VALUES (?, ?)",
+            [(game.id, timestamp) for timestamp in game.download_timestamps],
+        )
+        for song in game.songs:
+            self._insert_song(game, song)
+
+    def add_song(self, game: Game, song: Song) -> None:
+        self._insert_song(game, song)
+        game.songs.append(song)
+
+    def _insert_song(self, game: Game, song: Song) -> None:
+        info = song.brstm_download_info
+        failure = song.brstm_download_failure
+        rank = RANDOM_RANK if failure is None else DEFERRED_RANK
+        self._connection.execute(
+            f"INSERT INTO songs ({SONG_COLUMNS}, download_rank, download_key)"
+            f" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {rank}, {DOWNLOAD_KEY})",
+            (
+                song.id,
+                game.id,
+                song.title,
+                song.is_deleted_from_site,
+                None if info is None else str(info.location),
+                None if info is None else info.timestamp,
+                None if info is None else info.file_md5,
+                None if failure is None else failure.timestamp,
+                None if failure is None else failure.count,
+                None if failure is None else failure.reason,
+                song.added_timestamp,
+                *(() if failure is None else (failure.timestamp,)),
+                song.id,
+            ),
+        )
+
+    def set_brstm_download_info(
+        self, song: Song, download_info: FileDownloadInfo | None
+    ) -> None:
+        self._connection.execute(
+            "UPDATE songs SET brstm_location = ?, brstm_timestamp = ?, brstm_md5 = ?"
+            " WHERE id = ?",
+            (
+                None if download_info is None else str(download_info.location),
+                None if download_info is None else download_info.timestamp,
+                None if download_info is None else download_info.file_md5,
+                song.id,
+            ),
+        )
+        song.brstm_download_info = download_info
+
+    def set_brstm_download_failure(
+        self, song: Song, failure: DownloadFailure | None
+    ) -> None:
+        # the songs whose download has failed are downloaded last
+        rank = "download_rank" if failure is None else DEFERRED_RANK
+        self._connection.execute(
+            "UPDATE songs SET brstm_failure_timestamp = ?, brstm_failure_count = ?,"
+            f" brstm_failure_reason = ?, download_rank = {rank} WHERE id = ?",
+            (
+                None if failure is None else failure.timestamp,
+                None if failure is None else failure.count,
+                None if failure is None else failure.reason,
+                *(() if failure is None else (failure.timestamp,)),
+                song.id,
+            ),
+        )
+        song.brstm_download_failure = failure
+
+    def set_game_deleted_from_site(self, game: Game, is_deleted: bool) -> None:
+        if game.is_deleted_from_site != is_deleted:
+            self._connection.execute(
+                "UPDATE games SET is_deleted_from_site = ? WHERE id = ?",
+                (is_deleted, game.id),
+            )
+            game.is_deleted_from_site = is_deleted
+
+    def set_song_deleted_from_site(self, song: Song, is_deleted: bool) -> None:
+        if song.is_deleted_from_site != is_deleted:
+            self._connection.execute(
+                "UPDATE songs SET is_deleted_from_site = ? WHERE id = ?",
+                (is_deleted, song.id),
+            )
+            song.is_deleted_from_site = is_deleted
+
+    def add_game_visit(self, game: Game, timestamp: int) -> None:
+        self._connection.execute(
+            "INSERT INTO game_visits (game_id, timestamp) VALUES (?, ?)",
+            (game.id, timestamp),
+        )
+        # unchanged by a visit older than the last one
+        self._connection.execute(
+            "UPDATE games SET last_checked = max(coalesce(last_checked, ?), ?)"
+            " WHERE id = ?",
+            (timestamp, timestamp, game.id),
+        )
+        self._drop_old_game_visits(KEPT_VISITS, game.id)
+        game.add_visit(timestamp)
+
+    def add_site_visit(self, timestamp: int) -> None:
+        self._connection.execute(
+            "INSERT INTO site_visits (timestamp) VALUES (?)", (timestamp,)
+        )
+        self._drop_old_site_visits(KEPT_VISITS)
+
+    def drop_old_visits(self, kept_visits: int) -> int:
+        """Keep only the last `kept_visits` of the site and of each game, and
+        return the number of visits dropped."""
+        assert kept_visits >= 1
+        return self._drop_old_site_visits(kept_visits) + self._drop_old_game_visits(
+            kept_visits
+        )
+
+    def _drop_old_game_visits(
+        self, kept_visits: int, game_id: int | None = None
+    ) -> int:
+        if game_id is None:
+            return self._drop_old_visits("game_visits", "game_id", "games", kept_visits)
+        return self._drop_old_visits(
+            "game_visits",
+            "game_id",
+            "games",
+            kept_visits,
+            "WHERE game_id = ?",
+            (game_id,),
+        )
+
+    def _drop_old_site_visits(self, kept_visits: int) -> int:
+        return self._drop_old_visits("site_visits", "1", "site", kept_visits)
+
+    def _drop_old_visits(
+        self,
+        table: str,
+        owner: str,
+        owner_table: str,
+        kept_visits: int,
+        filter: str = "",
+        parameters: tuple[Any, ...] = (),
+    ) -> int:
+        """Delete the visits of the `table` but the last `kept_visits` of each
+        `owner`, and add them to the summary of the old visits of the
+        `owner_table`."""
+        old_visits = OLD_VISITS.format(table=table, owner=owner, filter=filter)
+        self._connection.execute(
+            f"UPDATE {owner_table} SET"
+            " old_visit_count = coalesce(old_visit_count, 0) + dropped.visit_count,"
+            " old_visit_first"
+            " = min(coalesce(old_visit_first, dropped.first_visit), dropped.first_visit),"
+            " old_visit_last"
+            " = max(coalesce(old_visit_last, dropped.last_visit), dropped.last_visit)"
+            " FROM (SELECT owner_id, count(*) AS visit_count,"
+            " min(timestamp) AS first_visit, max(timestamp) AS last_visit"
+            f" FROM ({old_visits}) GROUP BY owner_id) AS dropped"
+            f" WHERE {owner_table}.id = dropped.owner_id",
+            (*parameters, kept_visits),
+        )
+        return self._connection.execute(
+            f"DELETE FROM {table} WHERE rowid IN (SELECT visit_rowid FROM ({old_visits}))",
+            (*parameters, kept_visits),
+        ).rowcount
+
+    def set_download_order(self, order: DownloadOrder | None) -> None:
+        previous = self.get_download_order()
+        if order is None:
+            self._connection.execute("DELETE FROM download_order")
+            return
+        self._connection.execute(
+            "INSERT OR REPLACE INTO download_order (id, seed, cursor) VALUES (1, ?, ?)",
+            (order.seed, order.cursor),
+        )
+        if previous is None or previous.seed != order.seed:
+            self._connection.execute(
+                "UPDATE songs SET download_key = download_key(?, id)", (order.seed,)
+            )
+
+    def _build_games(
+        self, query: str, parameters: tuple[Any, ...], all_games: bool = False
+    ) -> list[Game]:
+        games = [
+            Game(
+                id=id,
+                title=title,
+                is_deleted_from_site=bool(is_deleted),
+                old_visits=self._build_old_visits(*old_visits),
+            )
+            for id, title, is_deleted, *old_visits in self._connection.execute(
+                query, parameters
+            )
+        ]
+        if not games:
+            return games
+
+        if all_games or len(games) > MAX_FILTERED_GAMES:
+            game_filter, game_ids = "", []
+        else:
+            game_ids = [game.id for game in games]
+            placeholders = ", ".join("?" * len(game_ids))
+            game_filter = f"WHERE game_id IN ({placeholders})"
+
+        songs: dict[int, list[Song]] = defaultdict(list)
+        for row in self._connection.execute(
+            f"SELECT {SONG_COLUMNS} FROM songs {game_filter} ORDER BY rowid",
+            game_ids,
+        ):
+            songs[row[1]].append(self._build_song(row))
+        timestamps: dict[int, list[int]] = defaultdict(list)
+        for game_id, timestamp in self._connection.execute(
+            f"SELECT game_id, timestamp FROM game_visits {game_filter} ORDER BY rowid",
+            game_ids,
+        ):
+            timestamps[game_id].append(timestamp)
+
+        for game in games:
+            game.songs = songs[game.id]
+            game.download_timestamps = timestamps[game.id]
+        return games
+
+    @staticmethod
+    def _get_old_visit_values(
+        old_visits: VisitSummary | None,
+    ) -> tuple[int | None, int | None, int | None]:
+        if old_visits is None:
+            return None, None, None
+        return old_visits.count, old_visits.first, old_visits.last
+
+    @staticmethod
+    def _build_old_visits(
+        count: int | None, first: int | None, last: int | None
+    ) -> VisitSummary | None:
+        if count is None or first is None or last is None:
+            return None
+        return VisitSummary(count=count, first=first, last=last)
+
+    @staticmethod
+    def _build_song(row: tuple[Any, ...]) -> Song:
+        (
+            id,
+            _,
+            title,
+            is_deleted,
+            location,
+            timestamp,
+            md5,
+            failure_timestamp,
+            failure_count,
+            failure_reason,
+            added_timestamp,
+        ) = row
+        download_info = None
+        if location is not None:
+            download_info = FileDownloadInfo(
+                location=Path(location), timestamp=timestamp, file_md5=md5
+            )
+        failure = None
+        if failure_count is not None:
+            failure = DownloadFailure(
+                timestamp=failure_timestamp, count=failure_count, reason=failure_reason
+            )
+        return Song(
+            id=id,
+            title=title,
+            is_deleted_from_site=bool(is_deleted),
+            brstm_download_info=download_info,
+            brstm_download_failure=failure,
+            added_timestamp=added_timestamp,
+        )
@@ -1,14 +1,17 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from random import Random
 from tempfile import TemporaryDirectory
-from typing import Generator
+from typing import Generator, Iterator
 
 import pytest
 
-from smashdown.client import Client, GameInfo, Parser, SongInfo
+from smashdown.client import BrstmStream, Client, GameInfo, Parser, SongInfo
 from smashdown.database import Database, Game, Site, Song
 
+from .server import StandInServer
+
 
 @pytest.fixture
 def testdata_directory() -> Path:
@@ -19,17 +22,31 @@ def testdata_directory() -> Path:
 class FakeClient(Client):
     testdata_dir: Path
 
-    def get_game_list(self) -> list[GameInfo]:
+    def get_game_list(self, conditional: bool = False) -> list[GameInfo]:
         home_page_html = (self.testdata_dir / "home.html").read_text()
         return Parser.get_game_list_from_home_page(home_page_html)
 
-    def get_song_list(self, game_id: int) -> list[SongInfo]:
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
         html = (self.testdata_dir / f"game_{game_id}.html").read_text()
         return Parser.get_song_list_from_game_page(html)
 
     def get_brstm_file(self, song_id: int) -> bytes:
         return (self.testdata_dir / f"brstm_{song_id}.brstm").read_bytes()
 
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        data = (self.testdata_dir / f"brstm_{song_id}.brstm").read_bytes()
+        chunks = [
+            data[i : i + chunk_size] for i in range(offset, len(data), chunk_size)
+        ]
+        yield BrstmStream(offset=offset, validator=None, chunks=iter(chunks))
+
 
 @pytest.fixture
 def fake_client(testdata_directory: Path) -> FakeClient:
@@ -92,3 +109,11 @@ def build_site_with_games_and_songs(
 
     site = Site(base_url="http://idontexist.net/", games=games)
     return site
+
+
+@pytest.fixture
+def stand_in_server(testdata_directory: Path) -> Generator[StandInServer, None, None]:
+    server = StandInServer(testdata_dir=testdata_directory)
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,126 @@
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+
+@dataclass
+class Request:
+    path: str
+    headers: dict[str, str]
+    start: float
+    end: float = 0.0
+
+
+@dataclass
+class StandInServer:
+    """Local stand-in for the site, serving the files of the testdata dir.
+
+    The requests received are recorded (with their start and end times) in
+    `requests`.
+    """
+
+    testdata_dir: Path
+    delay: float = 0.0
+    # if set, the connection is closed after this number of bytes of the body
+    truncate_after: int | None = None
+    support_range: bool = True
+    # moves the start of the partial responses, like a misbehaving server
+    range_shift: int = 0
+    send_etag: bool = True
+    # if set, every request is answered with this error status
+    error_status: int | None = None
+    retry_after: str | None = None
+    requests: list[Request] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                request = Request(
+                    path=self.path, headers=dict(self.headers), start=time.monotonic()
+                )
+                server.requests.append(request)
+                file, content_type = server.get_file(self.path)
+                time.sleep(server.delay)
+                if server.error_status is not None:
+                    self.send_response(server.error_status)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", server.retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif file is None or not file.exists():
+                    self.send_error(404)
+                else:
+                    data = file.read_bytes()
+                    etag = f'"{hashlib.md5(data).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag and server.send_etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        request.end = time.monotonic()
+                        return
+                    offset = server.get_range_offset(request.headers, etag)
+                    if offset is None:
+                        self.send_response(200)
+                    else:
+                        offset += server.range_shift
+                        self.send_response(206)
+                        self.send_header(
+                            "Content-Range",
+                            f"bytes {offset}-{len(data) - 1}/{len(data)}",
+                        )
+                        data = data[offset:]
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    if server.send_etag:
+                        self.send_header("ETag", etag)
+                    self.end_headers()
+                    if server.truncate_after is not None:
+                        data = data[: server.truncate_after]
+                        self.close_connection = True
+                    self.wfile.write(data)
+                request.end = time.monotonic()
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.01,), daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def get_file(self, path: str) -> tuple[Path | None, str]:
+        if path == "/":
+            return self.testdata_dir / "home.html", "text/html; charset=utf-8"
+        if m := re.fullmatch(r"/game/(\d+)", path):
+            file = self.testdata_dir / f"game_{m.group(1)}.html"
+            return file, "text/html; charset=utf-8"
+        if m := re.fullmatch(r"/brstm/(\d+)", path):
+            file = self.testdata_dir / f"brstm_{m.group(1)}.brstm"
+            return file, "application/octet-stream"
+        return None, ""
+
+    def get_range_offset(self, headers: dict[str, str], etag: str) -> int | None:
+        if not self.support_range or "Range" not in headers:
+            return None
+        if headers.get("If-Range", etag) != etag:
+            return None
+        m = re.fullmatch(r"bytes=(\d+)-", headers["Range"])
+        return None if m is None else int(m.group(1))
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import pytest
+
+from smashdown.archive import (
+    HOME_PAGE,
+    INDEX_FILE,
+    ArchiveWriter,
+    HtmlArchive,
+    PageNotArchived,
+    get_game_page,
+)
+
+
+def test_archive(tmp_dir: Path) -> None:
+    archive = HtmlArchive(tmp_dir)
+    archive.add_page(HOME_PAGE, 10, "<html>home v1</html>")
+    archive.add_page(get_game_page(1), 11, "<html>game 1</html>")
+    segment_size = archive.get_segment_file(0).stat().st_size
+    # the same content is only stored once
+    entry = archive.add_page(HOME_PAGE, 20, "<html>home v1</html>")
+    assert archive.get_segment_file(0).stat().st_size == segment_size
+    assert entry.offset == archive.get_history(HOME_PAGE)[0].offset
+    archive.add_page(HOME_PAGE, 30, "<html>home v2 é</html>")
+
+    for loaded in [archive, HtmlArchive(tmp_dir)]:
+        assert loaded.get_pages() == [HOME_PAGE, "game_1"]
+        assert [e.timestamp for e in loaded.get_history(HOME_PAGE)] == [10, 20, 30]
+        assert [e.timestamp for e in loaded.get_entries()] == [10, 11, 20, 30]
+        assert loaded.read_page(HOME_PAGE, 20) == "<html>home v1</html>"
+        assert loaded.read_page(HOME_PAGE, 30) == "<html>home v2 é</html>"
+        assert loaded.read_page("game_1", 11) == "<html>game 1</html>"
+        with pytest.raises(PageNotArchived):
+            loaded.read_page(HOME_PAGE, 11)
+        assert loaded.get_history("game_2") == []
+
+
+def test_archive_segments(tmp_dir: Path) -> None:
+    archive = HtmlArchive(tmp_dir, segment_size=100)
+    pages = [f"<html>{i}{'x' * i * 10}</html>" for i in range(20)]
+    for timestamp, html in enumerate(pages):
+        archive.add_page(HOME_PAGE, timestamp, html)
+    segments = sorted(tmp_dir.glob("segment_*.bin"))
+    assert len(segments) > 1
+    assert sum(f.stat().st_size for f in segments) < sum(len(p) for p in pages)
+
+    loaded = HtmlArchive(tmp_dir, segment_size=100)
+    loaded.add_page(HOME_PAGE, 20, "<html>new</html>")
+    assert not loaded.get_segment_file(len(segments) + 1).exists()
+    for timestamp, html in enumerate(pages):
+        assert loaded.read_page(HOME_PAGE, timestamp) == html
+
+
+def test_archive_truncated_index(tmp_dir: Path) -> None:
+    archive = HtmlArchive(tmp_dir)
+    archive.add_page(HOME_PAGE, 10, "<html>v1</html>")
+    archive.add_page(HOME_PAGE, 20, "<html>v2</html>")
+    index_file = tmp_dir / INDEX_FILE
+    index_file.write_bytes(index_file.read_bytes()[:-10])
+
+    loaded = HtmlArchive(tmp_dir)
+    assert [e.timestamp for e in loaded.get_history(HOME_PAGE)] == [10]
+    loaded.add_page(HOME_PAGE, 30, "<html>v3</html>")
+    loaded = HtmlArchive(tmp_dir)
+    assert [e.timestamp for e in loaded.get_history(HOME_PAGE)] == [10, 30]
+    assert loaded.read_page(HOME_PAGE, 30) == "<html>v3</html>"
+
+
+def test_archive_writer(tmp_dir: Path) -> None:
+    timestamps = iter([100, 200])
+    writer = ArchiveWriter(HtmlArchive(tmp_dir), clock=lambda: next(timestamps))
+    writer.write_home_page_html("home")
+    writer.write_game_page_html(1726, "game")
+    archive = HtmlArchive(tmp_dir)
+    assert archive.read_page(HOME_PAGE, 100) == "home"
+    assert archive.read_page("game_1726", 200) == "game"
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+from pathlib import Path
+
+import aiohttp
+import pytest
+
+from smashdown.async_client import AsyncSmashClient
+from smashdown.async_downloader import AsyncDownloader
+from smashdown.async_updater import AsyncUpdater
+from smashdown.client import FileWriter
+from smashdown.database import Database, Site
+from smashdown.rate import MinIntervalLimiter
+from smashdown.retry import CircuitBreaker, CircuitOpen, RequestFailed, RetryPolicy
+
+from .server import StandInServer
+
+
+def test_get_game_and_song_lists(stand_in_server: StandInServer, tmp_dir: Path) -> None:
+    async def run() -> None:
+        async with AsyncSmashClient(
+            base_url=stand_in_server.base_url,
+            writer=FileWriter(output_dir=tmp_dir, timestamp=123),
+            limiter=MinIntervalLimiter(min_interval=0),
+        ) as client:
+            games = await client.get_game_list()
+            assert {g.id for g in games} == {1726, 4126, 5063}
+            songs = await client.get_song_list(1726)
+            assert {s.id for s in songs} == {96613, 32272, 93397}
+            data = await client.get_brstm_file(32272)
+            assert (
+                data
+                == (stand_in_server.testdata_dir / "brstm_32272.brstm").read_bytes()
+            )
+
+    asyncio.run(run())
+    assert (tmp_dir / "home_123.html").exists()
+    assert (tmp_dir / "game_1726_123.html").exists()
+
+
+def test_requests_are_spaced_per_host(stand_in_server: StandInServer) -> None:
+    async def run() -> None:
+        async with AsyncSmashClient(
+            base_url=stand_in_server.base_url,
+            max_in_flight=3,
+            limiter=MinIntervalLimiter(min_interval=0.1),
+        ) as client:
+            await asyncio.gather(*[client.get_brstm_file(32272) for _ in range(4)])
+
+    asyncio.run(run())
+    starts = sorted(r.start for r in stand_in_server.requests)
+    assert len(starts) == 4
+    for previous, current in zip(starts, starts[1:]):
+        assert current - previous >= 0.09
+
+
+def test_in_flight_requests_are_bounded(stand_in_server: StandInServer) -> None:
+    stand_in_server.delay = 0.1
+
+    async def run() -> None:
+        async with AsyncSmashClient(
+            base_url=stand_in_server.base_url,
+            max_in_flight=2,
+            limiter=MinIntervalLimiter(min_interval=0),
+        ) as client:
+            await asyncio.gather(*[client.get_brstm_file(32272) for _ in range(6)])
+
+    asyncio.run(run())
+    requests = stand_in_server.requests
+    assert len(requests) == 6
+    for request in requests:
+        in_flight = [r for r in requests if r.start <= request.start < r.end]
+        assert len(in_flight) <= 2
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 3])
+def test_updater_and_downloader(
+    stand_in_server: StandInServer, tmp_dir: Path, max_in_flight: int
+) -> None:
+    db = Database(site=Site(base_url=stand_in_server.base_url))
+
+    async def run() -> None:
+        async with AsyncSmashClient(
+            base_url=stand_in_server.base_url,
+            max_in_flight=max_in_flight,
+            limiter=MinIntervalLimiter(min_interval=0),
+        ) as client:
+            updater = AsyncUpdater(client=client, db=db)
+            await updater.update_game_list()
+            await updater.update_game_song_lists(max_count=10)
+            downloader = AsyncDownloader(client=client, db=db, output_dir=tmp_dir)
+            await downloader.download_brstm_files(max_count=10)
+
+    asyncio.run(run())
+    stats = db.get_statistics()
+    assert (stats.games, stats.games_visited) == (3, 3)
+    assert (stats.songs, stats.songs_downloaded) == (5, 5)
+    song = db.get_song_from_id(96613)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+    assert (tmp_dir / "1726_3d_dot_game_heroes/96613_block_destruction.brstm").exists()
+
+
+def test_saves_are_batched(
+    stand_in_server: StandInServer, tmp_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db = Database(site=Site(base_url=stand_in_server.base_url))
+    saves: list[int] = []
+    monkeypatch.setattr(Database, "save", lambda self: saves.append(len(saves)))
+
+    async def run() -> None:
+        async with _build_client(stand_in_server.base_url) as client:
+            updater = AsyncUpdater(
+                client=client, db=db, clock=lambda: 1000, save_batch_size=2
+            )
+            await updater.update_game_list()
+            await updater.update_game_song_lists(max_count=10)
+            # after the game list, after 2 games, and after the last one
+            assert len(saves) == 3
+            downloader = AsyncDownloader(
+                client=client,
+                db=db,
+                output_dir=tmp_dir,
+                clock=lambda: 2000,
+                save_batch_size=2,
+            )
+            await downloader.download_brstm_files(max_count=10)
+            # after 2 and 4 downloads, and after the last one
+            assert len(saves) == 6
+
+    asyncio.run(run())
+    assert {game.last_checked for game in db.get_games()} == {1000}
+    song = db.get_song_from_id(96613)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.timestamp == 2000
+
+
+def test_downloader_truncated_download_is_resumed(
+    stand_in_server: StandInServer, fake_database: Database, tmp_dir: Path
+) -> None:
+    async def run() -> None:
+        async with AsyncSmashClient(
+            base_url=stand_in_server.base_url,
+            limiter=MinIntervalLimiter(min_interval=0),
+        ) as client:
+            downloader = AsyncDownloader(
+                client=client, db=fake_database, output_dir=tmp_dir, chunk_size=1
+            )
+            song = fake_database.get_song_from_id(96613)
+            stand_in_server.truncate_after = 2
+            with pytest.raises(RequestFailed):
+                await downloader.download_brstm_file(song)
+            assert song.brstm_download_failure is not None
+            stand_in_server.truncate_after = None
+            await downloader.download_brstm_file(song)
+
+    asyncio.run(run())
+    assert stand_in_server.requests[-1].headers["Range"] == "bytes=2-"
+    song = fake_database.get_song_from_id(96613)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+
+
+def _build_client(
+    base_url: str, breaker: CircuitBreaker | None = None
+) -> AsyncSmashClient:
+    return AsyncSmashClient(
+        base_url=base_url,
+        limiter=MinIntervalLimiter(min_interval=0),
+        retry=RetryPolicy(max_attempts=3, base_delay=0.01),
+        breaker=breaker,
+    )
+
+
+def test_transient_failures_are_retried_up_to_max_attempts(
+    stand_in_server: StandInServer,
+) -> None:
+    stand_in_server.error_status = 503
+
+    async def run() -> None:
+        async with _build_client(stand_in_server.base_url) as client:
+            with pytest.raises(RequestFailed) as exc_info:
+                await client.get_song_list(1726)
+            assert exc_info.value.status == 503
+
+    asyncio.run(run())
+    assert len(stand_in_server.requests) == 3
+
+
+def test_hanging_requests_are_retried(stand_in_server: StandInServer) -> None:
+    stand_in_server.delay = 0.3
+
+    async def run() -> None:
+        async with _build_client(stand_in_server.base_url) as client:
+            client.timeout = aiohttp.ClientTimeout(sock_read=0.05)
+            with pytest.raises(RequestFailed) as exc_info:
+                await client.get_song_list(1726)
+            assert exc_info.value.transient
+
+    asyncio.run(run())
+    assert len(stand_in_server.requests) == 3
+
+
+def test_unexpected_responses(stand_in_server: StandInServer) -> None:
+    async def run() -> None:
+        async with _build_client(stand_in_server.base_url) as client:
+            with pytest.raises(RequestFailed) as exc_info:
+                await client.get_song_list(1)
+            assert exc_info.value.status == 404
+            assert not exc_info.value.transient
+            # an html page instead of a brstm file
+            client.brstm_url_path_template = "/game/{id}"
+            with pytest.raises(RequestFailed, match="content type"):
+                await client.get_brstm_file(1726)
+            with pytest.raises(RequestFailed, match="content type"):
+                async with client.stream_brstm_file(1726, chunk_size=1024):
+                    pass
+            # a partial response that doesn't start at the requested offset
+            client.brstm_url_path_template = "/brstm/{id}"
+            stand_in_server.range_shift = 1
+            content = (stand_in_server.testdata_dir / "brstm_32272.brstm").read_bytes()
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            with pytest.raises(RequestFailed, match="unexpected range bytes 3-"):
+                async with client.stream_brstm_file(
+                    32272, chunk_size=1024, offset=2, validator=etag
+                ):
+                    pass
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_stops_the_requests(stand_in_server: StandInServer) -> None:
+    stand_in_server.error_status = 500
+
+    async def run() -> None:
+        async with _build_client(
+            stand_in_server.base_url, CircuitBreaker(failure_threshold=5)
+        ) as client:
+            with pytest.raises(RequestFailed):
+                await client.get_song_list(1726)
+            with pytest.raises(CircuitOpen):
+                await client.get_song_list(1726)
+
+    asyncio.run(run())
+    assert len(stand_in_server.requests) == 5
+
+
+def test_downloader_records_failures(
+    stand_in_server: StandInServer, fake_database: Database, tmp_dir: Path
+) -> None:
+    stand_in_server.error_status = 500
+
+    async def run() -> None:
+        async with _build_client(stand_in_server.base_url) as client:
+            downloader = AsyncDownloader(
+                client=client, db=fake_database, output_dir=tmp_dir
+            )
+            await downloader.download_brstm_files(max_count=10)
+
+    asyncio.run(run())
+    song = fake_database.get_song_from_id(96613)
+    assert song.brstm_download_info is None
+    assert song.brstm_download_failure is not None
+    assert song.brstm_download_failure.reason.startswith("status 500")
+    assert fake_database.get_statistics().songs_downloaded == 0
+    assert not list(tmp_dir.rglob("*.brstm"))
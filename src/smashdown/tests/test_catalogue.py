@@ -0,0 +1,93 @@
+import io
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from smashdown.catalogue import Catalogue, DownloadedSong, JsonStream
+from smashdown.database import (
+    Database,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    Song,
+)
+
+
+def _change(db: Database) -> None:
+    game = Game(id=1, title="1", songs=[Song(id=1, title="1", added_timestamp=0)])
+    db.add_game(game)
+    db.add_song(game, Song(id=2, title="2"))
+    db.add_game_visit(game, 50)
+    db.add_game_visit(db.get_game_from_id(1726), 10)
+    for timestamp in range(20, 40):
+        db.add_game_visit(db.get_game_from_id(5063), timestamp)
+    db.drop_old_visits(3)
+    db.set_game_deleted_from_site(db.get_game_from_id(5063), True)
+    db.set_song_deleted_from_site(db.get_song_from_id(2), True)
+    db.set_brstm_download_info(
+        db.get_song_from_id(1),
+        FileDownloadInfo(location=Path("1/1.brstm"), timestamp=1, file_md5="md5"),
+    )
+    db.set_brstm_download_failure(
+        db.get_song_from_id(96613),
+        DownloadFailure(timestamp=1, count=2, reason="status 404"),
+    )
+
+
+def _assert_same(catalogue: Catalogue, db: Database) -> None:
+    for game in db.get_games():
+        assert catalogue.get_game(game.id) == game
+        for song in game.songs:
+            assert catalogue.get_song(song.id) == song
+    assert catalogue.compute_statistics() == db.compute_statistics()
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_catalogue_is_read_from_the_database_file(
+    fake_database: Database, tmp_dir: Path, journal: bool
+) -> None:
+    db_file = tmp_dir / "db.json"
+    fake_database.with_output_file(db_file).save()
+    if journal:
+        fake_database.with_journal()
+    _change(fake_database)
+    fake_database.save()
+
+    catalogue = Catalogue.build_from_file(db_file)
+    _assert_same(catalogue, fake_database)
+    assert list(catalogue.get_downloaded_songs()) == [
+        DownloadedSong(
+            song_id=1,
+            title="1",
+            game_title="1",
+            location=Path("1/1.brstm"),
+            file_md5="md5",
+        )
+    ]
+
+
+def test_catalogue_is_built_from_games(fake_database: Database) -> None:
+    _change(fake_database)
+    catalogue = Catalogue.build_from_games(fake_database.get_games())
+    _assert_same(catalogue, fake_database)
+
+
+def test_json_stream() -> None:
+    text = '{"a": [1, {"b": 2}], "items" : [ 12345, "x,]", {"c": [3]} , [] ], "z": {}}'
+    stream = JsonStream(io.StringIO(text))
+    stream.chunk_size = 3
+    values: list[Any] = []
+    for key in stream.read_object_keys():
+        if key == "items":
+            values.extend(stream.read_array_values())
+        elif key == "z":
+            assert list(stream.read_object_keys()) == []
+        else:
+            assert stream.read_value() == [1, {"b": 2}]
+    assert values == [12345, "x,]", {"c": [3]}, []]
+
+    stream = JsonStream(io.StringIO('{"a": [1, 2'))
+    with pytest.raises(ValueError):
+        for _ in stream.read_object_keys():
+            stream.read_value()
@@ -1,8 +1,13 @@
+import hashlib
 from pathlib import Path
 
+import pytest
 import requests_mock
 
-from smashdown.client import FileWriter, SmashClient
+from smashdown.client import FileWriter, SmashClient, get_range_headers, get_validator
+from smashdown.retry import RequestFailed
+
+from .server import StandInServer
 
 
 def test_get_game_list(testdata_directory: Path, tmp_dir: Path) -> None:
@@ -45,3 +50,76 @@ def test_get_brstm_file(testdata_directory: Path) -> None:
         m.get("http://idontexist.net/brstm/32272", content=content)
         res = client.get_brstm_file(song_id=32272)
         assert res == content
+
+
+def test_stream_brstm_file(testdata_directory: Path) -> None:
+    client = SmashClient(base_url="http://idontexist.net")
+
+    with requests_mock.Mocker() as m:
+        content = (testdata_directory / "brstm_32272.brstm").read_bytes()
+        m.get("http://idontexist.net/brstm/32272", content=content)
+        with client.stream_brstm_file(song_id=32272, chunk_size=2) as stream:
+            chunks = list(stream.chunks)
+        assert stream.offset == 0
+        assert b"".join(chunks) == content
+        assert max(len(chunk) for chunk in chunks) == 2
+
+
+@pytest.mark.parametrize("support_range", [True, False])
+def test_stream_brstm_file_from_offset(
+    stand_in_server: StandInServer, support_range: bool
+) -> None:
+    stand_in_server.support_range = support_range
+    client = SmashClient(base_url=stand_in_server.base_url, limiter=None)
+    content = (stand_in_server.testdata_dir / "brstm_32272.brstm").read_bytes()
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+
+    with client.stream_brstm_file(
+        song_id=32272, chunk_size=2, offset=2, validator=etag
+    ) as stream:
+        data = b"".join(stream.chunks)
+    assert stand_in_server.requests[0].headers["Range"] == "bytes=2-"
+    assert stream.validator == etag
+    if support_range:
+        assert stream.offset == 2
+        assert data == content[2:]
+    else:
+        assert stream.offset == 0
+        assert data == content
+
+
+def test_stream_brstm_file_without_validator(stand_in_server: StandInServer) -> None:
+    client = SmashClient(base_url=stand_in_server.base_url, limiter=None)
+    content = (stand_in_server.testdata_dir / "brstm_32272.brstm").read_bytes()
+
+    # the file may have changed since the first bytes were received
+    with client.stream_brstm_file(song_id=32272, chunk_size=2, offset=2) as stream:
+        data = b"".join(stream.chunks)
+    assert "Range" not in stand_in_server.requests[0].headers
+    assert stream.offset == 0
+    assert data == content
+
+
+def test_stream_brstm_file_from_the_wrong_offset(
+    stand_in_server: StandInServer,
+) -> None:
+    stand_in_server.range_shift = 1
+    client = SmashClient(base_url=stand_in_server.base_url, limiter=None)
+    content = (stand_in_server.testdata_dir / "brstm_32272.brstm").read_bytes()
+    etag = f'"{hashlib.md5(content).hexdigest()}"'
+
+    with pytest.raises(RequestFailed, match="unexpected range bytes 3-"):
+        with client.stream_brstm_file(
+            song_id=32272, chunk_size=2, offset=2, validator=etag
+        ):
+            pass
+
+
+def test_range_validators() -> None:
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert get_validator({"ETag": '"a"', "Last-Modified": date}) == '"a"'
+    assert get_validator({"Last-Modified": date}) == date
+    assert get_validator({}) is None
+    assert get_range_headers(2, date) == {"Range": "bytes=2-", "If-Range": date}
+    assert get_range_headers(2, None) == {}
+    assert get_range_headers(0, '"a"') == {}
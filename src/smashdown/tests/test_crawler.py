@@ -0,0 +1,233 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from smashdown.client import BrstmStream, Parser, ParsingError, SmashClient, SongInfo
+from smashdown.crawler import Crawler
+from smashdown.database import Database, Site
+from smashdown.http_cache import ValidatorCache
+from smashdown.rate import MinIntervalLimiter
+from smashdown.retry import RequestFailed
+
+from .conftest import FakeClient
+from .server import StandInServer
+
+
+@dataclass
+class RecordingClient(FakeClient):
+    downloaded: list[int] = field(default_factory=list)
+    failing_song_ids: frozenset[int] = frozenset()
+
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        if song_id in self.failing_song_ids:
+            raise RequestFailed("status 404", status=404, transient=False)
+        self.downloaded.append(song_id)
+        with super().stream_brstm_file(
+            song_id, chunk_size, offset, validator
+        ) as stream:
+            yield stream
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_crawl_from_an_empty_database(
+    testdata_directory: Path, tmp_dir: Path, workers: int
+) -> None:
+    db_file = tmp_dir / "db.json"
+    db = Database(site=Site(base_url="http://idontexist.net")).with_output_file(db_file)
+    client = RecordingClient(
+        testdata_dir=testdata_directory, failing_song_ids=frozenset({77724})
+    )
+    crawler = Crawler(
+        client=client,
+        db=db,
+        output_dir=tmp_dir / "musics",
+        workers=workers,
+        exit_when_idle=True,
+    )
+    crawler.run()
+
+    assert crawler.statistics.game_lists == 1
+    assert crawler.statistics.song_lists == 3
+    assert crawler.statistics.songs_found == 5
+    assert crawler.statistics.songs_downloaded == 4
+    assert crawler.statistics.failures == 1
+    # the failed download isn't retried before the retry interval
+    assert sorted(client.downloaded) == [32272, 93397, 96008, 96613]
+    loaded = Database.build_from_file(db_file)
+    stats = loaded.get_statistics()
+    assert stats.games_visited == 3
+    assert stats.songs_downloaded == 4
+    assert stats.songs_with_download_failure == 1
+    assert len(loaded.site.download_timestamps) == 1
+
+
+def test_new_songs_are_downloaded_first(
+    fake_database: Database, testdata_directory: Path, tmp_dir: Path
+) -> None:
+    now = int(time.time())
+    for game in fake_database.get_games():
+        if game.id == 1726:
+            game.songs.clear()
+        else:
+            fake_database.add_game_visit(game, now)
+    fake_database._build_indexes()
+    fake_database._reset_frontier()
+    client = RecordingClient(testdata_dir=testdata_directory)
+    crawler = Crawler(
+        client=client,
+        db=fake_database,
+        output_dir=tmp_dir,
+        workers=1,
+        exit_when_idle=True,
+    )
+    crawler.run()
+
+    # only game 1726 is due, and its songs are downloaded before the others
+    assert crawler.statistics.song_lists == 1
+    assert set(client.downloaded[:3]) == {32272, 93397, 96613}
+    assert sorted(client.downloaded[3:]) == [77724, 96008]
+    assert not fake_database.get_songs_with_no_brstm_downloaded(None)
+
+
+def test_crawl_is_stopped(testdata_directory: Path, tmp_dir: Path) -> None:
+    server = StandInServer(testdata_dir=testdata_directory)
+    server.start()
+    try:
+        db_file = tmp_dir / "db.json"
+        db = Database(site=Site(base_url=server.base_url)).with_output_file(db_file)
+        # a single request, then a long wait for the next one
+        client = SmashClient(
+            base_url=server.base_url, limiter=MinIntervalLimiter(min_interval=600)
+        )
+        crawler = Crawler(client=client, db=db, output_dir=tmp_dir, workers=2)
+        thread = threading.Thread(target=crawler.run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while crawler.statistics.game_lists == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        start = time.monotonic()
+        crawler.stop()
+        client.interrupt()
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert time.monotonic() - start < 1
+        assert len(server.requests) == 1
+    finally:
+        server.stop()
+
+    # the interrupted requests aren't recorded as failures
+    stats = Database.build_from_file(db_file).get_statistics()
+    assert stats.games == 3
+    assert stats.games_visited == 0
+    assert crawler.statistics.failures == 0
+
+
+@dataclass
+class CheckedCache(ValidatorCache):
+    db: Database | None = None
+    save_count: int = 0
+
+    def save(self) -> None:
+        # the validators are only saved with the content of their page
+        assert self.db is not None
+        for url in self._entries:
+            game = self.db.get_game_from_id(int(url.removeprefix("/game/")))
+            assert game.last_checked is not None
+        self.save_count += 1
+        super().save()
+
+
+@dataclass
+class CachingClient(FakeClient):
+    cache: ValidatorCache | None = None
+
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
+        assert self.cache is not None
+        self.cache.record_response(f"/game/{game_id}", 200, {}, b"")
+        # still in flight at the next checkpoints
+        time.sleep(0.05)
+        return super().get_song_list(game_id, conditional)
+
+
+def test_cache_is_saved_with_the_merged_pages(
+    testdata_directory: Path, tmp_dir: Path
+) -> None:
+    db = Database(site=Site(base_url="http://idontexist.net")).with_output_file(
+        tmp_dir / "db.json"
+    )
+    cache = CheckedCache(tmp_dir / "cache", db=db)
+    crawler = Crawler(
+        client=CachingClient(testdata_dir=testdata_directory, cache=cache),
+        db=db,
+        output_dir=tmp_dir / "musics",
+        workers=2,
+        cache=cache,
+        checkpoint_interval=0,
+        exit_when_idle=True,
+    )
+    crawler.run()
+
+    assert crawler.statistics.song_lists == 3
+    assert cache.save_count >= 2
+    assert len(ValidatorCache(tmp_dir / "cache")._entries) == 3
+
+
+@dataclass
+class FailingOnceParser(Parser):
+    failed: bool = False
+
+    def get_song_list_from_game_page(self, html: str) -> list[SongInfo]:
+        if not self.failed:
+            self.failed = True
+            raise ParsingError("unexpected page")
+        return super().get_song_list_from_game_page(html)
+
+
+def test_page_not_merged_is_fetched_again(
+    stand_in_server: StandInServer, tmp_dir: Path
+) -> None:
+    db_file = tmp_dir / "db.json"
+    cache_file = tmp_dir / "cache"
+    parser = FailingOnceParser()
+
+    def crawl(db: Database) -> None:
+        client = SmashClient(
+            base_url=stand_in_server.base_url,
+            limiter=None,
+            parser=parser,
+            cache=ValidatorCache(cache_file),
+        )
+        Crawler(
+            client=client,
+            db=db,
+            output_dir=tmp_dir / "musics",
+            workers=1,
+            cache=client.cache,
+            exit_when_idle=True,
+        ).run()
+
+    db = Database(site=Site(base_url=stand_in_server.base_url))
+    with pytest.raises(ParsingError):
+        crawl(db.with_output_file(db_file))
+    crawl(Database.build_from_file(db_file))
+
+    stats = Database.build_from_file(db_file).get_statistics()
+    assert (stats.games, stats.games_visited, stats.songs) == (3, 3, 5)
+    game_requests = [r for r in stand_in_server.requests if "/game/" in r.path]
+    assert len(game_requests) == 4
+    # the page that failed is fetched again in full, not skipped as not modified
+    assert game_requests[0].path == game_requests[1].path
+    assert "If-None-Match" not in game_requests[1].headers
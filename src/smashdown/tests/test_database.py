@@ -1,7 +1,21 @@
 import random
 from pathlib import Path
 
-from smashdown.database import Database, FileDownloadInfo, Game, Site, Song
+import pytest
+
+from smashdown.catalogue import Catalogue
+from smashdown.database import (
+    KEPT_VISITS,
+    Database,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameNotFound,
+    Site,
+    Song,
+    SongNotFound,
+    VisitSummary,
+)
 
 
 def test_get_game_by_id() -> None:
@@ -133,3 +147,211 @@ def test_get_songs_with_no_brstm_downloaded() -> None:
     musics = db.get_songs_with_no_brstm_downloaded(None)
     assert len(musics) == 3
     assert list(map(lambda m: m.id, musics)) == [2, 3, 5]
+
+
+def test_indexes_are_updated_when_games_and_songs_are_added() -> None:
+    db = Database(site=Site(base_url="http://idontexist.net"))
+    db.site.games = [Game(id=1, title="1", songs=[Song(id=1, title="1")])]
+    assert db.get_game_from_id(1).id == 1
+
+    game = Game(id=2, title="2", songs=[Song(id=2, title="2")])
+    db.add_game(game)
+    song = Song(id=3, title="3")
+    db.add_song(game, song)
+
+    assert db.get_game_from_id(2) is game
+    assert db.get_game_from_song_id(2) is game
+    assert db.get_song_from_id(3) is song
+    assert db.get_game_from_song_id(3) is game
+    with pytest.raises(GameNotFound):
+        db.get_game_from_id(4)
+    with pytest.raises(SongNotFound):
+        db.get_song_from_id(4)
+
+
+def test_indexes_are_updated_when_download_info_is_set() -> None:
+    db = Database(site=Site(base_url="http://idontexist.net"))
+    song = Song(id=1, title="1")
+    db.site.games = [Game(id=1, title="1", songs=[song])]
+    with pytest.raises(SongNotFound):
+        db.get_song_from_downloaded_path(Path("foo"))
+
+    db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("foo"), timestamp=1, file_md5="md5")
+    )
+    game, found = db.get_song_from_downloaded_path(Path("foo"))
+    assert game.id == 1
+    assert found is song
+
+    db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("bar"), timestamp=2, file_md5="md5")
+    )
+    with pytest.raises(SongNotFound):
+        db.get_song_from_downloaded_path(Path("foo"))
+    assert db.get_song_from_downloaded_path(Path("bar"))[1] is song
+
+
+def _build_journaled_database(db_file: Path) -> Database:
+    db = Database(
+        site=Site(
+            base_url="http://idontexist.net",
+            games=[Game(id=1, title="1", songs=[Song(id=1, title="1")])],
+        )
+    ).with_output_file(db_file)
+    db.save()
+    return db.with_journal(compaction_threshold=100)
+
+
+def test_journal_changes_are_replayed(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_journaled_database(db_file)
+    content = db_file.read_text()
+
+    game = Game(id=2, title="2")
+    db.add_game(game)
+    song = Song(id=2, title="2")
+    db.add_song(game, song)
+    db.set_song_deleted_from_site(db.get_song_from_id(1), True)
+    db.set_game_deleted_from_site(game, True)
+    db.add_game_visit(game, 123)
+    db.add_site_visit(456)
+    db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("foo"), timestamp=1, file_md5="md5")
+    )
+    db.set_brstm_download_failure(
+        db.get_song_from_id(1), DownloadFailure(timestamp=1, count=2, reason="404")
+    )
+    db.save()
+
+    assert db_file.read_text() == content
+    assert len((tmp_dir / "db.json.journal").read_text().splitlines()) == 8
+
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site == db.site
+    assert loaded.get_song_from_downloaded_path(Path("foo"))[1].id == 2
+
+
+def test_journal_replay_is_idempotent(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_journaled_database(db_file)
+    game = db.get_game_from_id(1)
+    db.add_song(game, Song(id=2, title="2"))
+    for timestamp in (100, 200):
+        db.add_game_visit(game, timestamp)
+        db.add_site_visit(timestamp)
+    db.save()
+    journal = (tmp_dir / "db.json.journal").read_text()
+
+    # simulate a crash between the compaction and the clearing of the journal
+    db.compact()
+    (tmp_dir / "db.json.journal").write_text(journal)
+
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site == db.site
+    assert loaded.site.games[0].download_timestamps == [100, 200]
+    assert loaded.site.download_timestamps == [100, 200]
+    catalogue = Catalogue.build_from_file(db_file)
+    assert catalogue.get_game(1).download_timestamps == [100, 200]
+
+    # the visits dropped by the compaction are not recorded again either
+    db.drop_old_visits(1)
+    db.compact()
+    (tmp_dir / "db.json.journal").write_text(journal)
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site == db.site
+    assert loaded.site.games[0].download_timestamps == [200]
+    assert Catalogue.build_from_file(db_file).get_game(1) == db.get_game_from_id(1)
+
+
+def test_journal_is_compacted(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_journaled_database(db_file).with_journal(compaction_threshold=3)
+    game = db.get_game_from_id(1)
+    db.add_game_visit(game, 1)
+    db.add_game_visit(game, 2)
+    db.save()
+    assert (tmp_dir / "db.json.journal").exists()
+
+    db.add_game_visit(game, 3)
+    db.save()
+    assert not (tmp_dir / "db.json.journal").exists()
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site.games[0].download_timestamps == [1, 2, 3]
+
+
+def test_journal_truncated_last_change_is_ignored(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_journaled_database(db_file)
+    db.add_game_visit(db.get_game_from_id(1), 123)
+    db.save()
+    with (tmp_dir / "db.json.journal").open("a") as fh:
+        fh.write('{"kind": "game_vis')
+
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site.games[0].download_timestamps == [123]
+
+
+def test_old_visits_are_summarized(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_journaled_database(db_file)
+    game = db.get_game_from_id(1)
+    for i in range(1, KEPT_VISITS + 4):
+        db.add_game_visit(game, i * 10)
+        db.add_site_visit(i)
+    assert game.download_timestamps == [i * 10 for i in range(4, KEPT_VISITS + 4)]
+    assert game.old_visits == VisitSummary(count=3, first=10, last=30)
+    assert game.last_checked == (KEPT_VISITS + 3) * 10
+    visits = game.visits
+    assert visits == VisitSummary(
+        count=KEPT_VISITS + 3, first=10, last=(KEPT_VISITS + 3) * 10
+    )
+    assert visits is not None and visits.mean_interval == 10
+    assert db.site.old_visits == VisitSummary(count=3, first=1, last=3)
+
+    # a visit older than the last one is kept, but the game is still last
+    # checked at its latest visit
+    db.add_game_visit(game, 5)
+    assert game.old_visits == VisitSummary(count=4, first=10, last=40)
+    assert game.last_checked == (KEPT_VISITS + 3) * 10
+    visits = VisitSummary(count=KEPT_VISITS + 4, first=5, last=(KEPT_VISITS + 3) * 10)
+    assert game.visits == visits
+
+    assert db.drop_old_visits(2) == 2 * (KEPT_VISITS - 2)
+    assert game.download_timestamps == [(KEPT_VISITS + 3) * 10, 5]
+    assert game.visits == visits
+    db.save()
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site == db.site
+    loaded.compact()
+    assert Database.build_from_file(db_file).site == db.site
+
+
+def test_fast_load(tmp_dir: Path, fake_database: Database) -> None:
+    db_file = tmp_dir / "db.json"
+    fake_database.set_brstm_download_info(
+        fake_database.get_song_from_id(96613),
+        FileDownloadInfo(location=Path("foo"), timestamp=1, file_md5="md5"),
+    )
+    fake_database.set_brstm_download_failure(
+        fake_database.get_song_from_id(32272),
+        DownloadFailure(timestamp=1, count=1, reason="503"),
+    )
+    fake_database.add_game_visit(fake_database.get_game_from_id(1726), 123)
+    fake_database.with_output_file(db_file).save()
+    assert (tmp_dir / "db.json.checksum").exists()
+
+    loaded = Database.build_from_file(db_file)
+    validated = Database.build_from_file(db_file, fast_load=False)
+    assert loaded.site == validated.site == fake_database.site
+    assert loaded.get_song_from_downloaded_path(Path("foo"))[1].id == 96613
+
+
+def test_fast_load_is_not_used_for_modified_files(
+    tmp_dir: Path, fake_database: Database
+) -> None:
+    db_file = tmp_dir / "db.json"
+    fake_database.with_output_file(db_file).save()
+    db_file.write_text(db_file.read_text().replace('"id": 1726', '"id": "1111"'))
+
+    loaded = Database.build_from_file(db_file)
+    assert loaded.site.games[0].id == 1111
@@ -1,11 +1,18 @@
 import time
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import ContextManager, Iterator
 
 import pytest
 
-from smashdown.client import Client
+from smashdown.client import BrstmStream, Client, SmashClient
 from smashdown.database import Database, Game, Song
 from smashdown.downloader import Downloader
+from smashdown.retry import RequestFailed
+
+from .conftest import FakeClient
+from .server import StandInServer
 
 
 def test_downloader(
@@ -77,3 +84,145 @@ def test_get_game_and_music_path(game_title: str, song_title: str, exp: str) ->
     game_path = Downloader.get_game_path(Game(id=123, title=game_title))
     song_path = Downloader.get_music_path(game_path, Song(id=456, title=song_title))
     assert song_path == Path(exp)
+
+
+def test_downloader_streams_chunks(
+    fake_database: Database,
+    fake_client: Client,
+    tmp_dir: Path,
+) -> None:
+    downloader = Downloader(
+        client=fake_client, db=fake_database, output_dir=tmp_dir, chunk_size=2
+    )
+    song = fake_database.get_song_from_id(96613)
+    downloader.download_brstm_file(song)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+    assert [p.name for p in (tmp_dir / "1726_3d_dot_game_heroes").iterdir()] == [
+        "96613_block_destruction.brstm"
+    ]
+
+
+@dataclass
+class FailingClient(FakeClient):
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        data = (self.testdata_dir / f"brstm_{song_id}.brstm").read_bytes()
+
+        def chunks() -> Iterator[bytes]:
+            yield data[:3]
+            raise ConnectionError
+
+        yield BrstmStream(offset=offset, validator=None, chunks=chunks())
+
+
+def test_downloader_interrupted_download_is_resumed(
+    fake_database: Database,
+    fake_client: Client,
+    testdata_directory: Path,
+    tmp_dir: Path,
+) -> None:
+    client = FailingClient(testdata_dir=testdata_directory)
+    downloader = Downloader(client=client, db=fake_database, output_dir=tmp_dir)
+    song = fake_database.get_song_from_id(96613)
+    with pytest.raises(ConnectionError):
+        downloader.download_brstm_file(song)
+    assert song.brstm_download_info is None
+    game_dir = tmp_dir / "1726_3d_dot_game_heroes"
+    assert sorted(p.name for p in game_dir.iterdir()) == [
+        "96613_block_destruction.brstm.part",
+        "96613_block_destruction.brstm.part.json",
+    ]
+    assert (game_dir / "96613_block_destruction.brstm.part").stat().st_size == 3
+
+    downloader = Downloader(client=fake_client, db=fake_database, output_dir=tmp_dir)
+    downloader.download_brstm_file(song)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+    assert [p.name for p in game_dir.iterdir()] == ["96613_block_destruction.brstm"]
+
+
+@pytest.mark.parametrize("support_range", [True, False])
+def test_downloader_truncated_download_is_resumed(
+    fake_database: Database,
+    stand_in_server: StandInServer,
+    tmp_dir: Path,
+    support_range: bool,
+) -> None:
+    client = SmashClient(base_url=stand_in_server.base_url, limiter=None)
+    downloader = Downloader(
+        client=client, db=fake_database, output_dir=tmp_dir, chunk_size=1
+    )
+    song = fake_database.get_song_from_id(96613)
+    stand_in_server.truncate_after = 2
+    with pytest.raises(RequestFailed):
+        downloader.download_brstm_file(song)
+    assert song.brstm_download_info is None
+
+    stand_in_server.truncate_after = None
+    stand_in_server.support_range = support_range
+    downloader.download_brstm_file(song)
+    assert stand_in_server.requests[-1].headers["Range"] == "bytes=2-"
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+    game_dir = tmp_dir / "1726_3d_dot_game_heroes"
+    assert [p.name for p in game_dir.iterdir()] == ["96613_block_destruction.brstm"]
+
+
+def test_downloader_workers(
+    fake_database: Database, stand_in_server: StandInServer, tmp_dir: Path
+) -> None:
+    stand_in_server.delay = 0.1
+    client = SmashClient(base_url=stand_in_server.base_url, limiter=None)
+    downloader = Downloader(
+        client=client, db=fake_database, output_dir=tmp_dir, save_batch_size=2
+    )
+    downloader.download_brstm_files(max_count=10, workers=3)
+
+    stats = fake_database.get_statistics()
+    assert stats.songs_not_downloaded == 0
+    requests = stand_in_server.requests
+    assert len(requests) == 5
+    # the downloads overlap
+    assert min(r.end for r in requests) > sorted(r.start for r in requests)[1]
+    song = fake_database.get_song_from_id(96613)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_info.file_md5 == "f8e1eb9b3294c2c0f0f0eda10f6cadb5"
+
+
+def test_downloader_workers_failure(
+    fake_database: Database, testdata_directory: Path, tmp_dir: Path
+) -> None:
+    @dataclass
+    class PartlyFailingClient(FakeClient):
+        def stream_brstm_file(
+            self,
+            song_id: int,
+            chunk_size: int,
+            offset: int = 0,
+            validator: str | None = None,
+        ) -> ContextManager[BrstmStream]:
+            if song_id == 96613:
+                raise ConnectionError
+            return super().stream_brstm_file(song_id, chunk_size, offset, validator)
+
+    client = PartlyFailingClient(testdata_dir=testdata_directory)
+    downloader = Downloader(client=client, db=fake_database, output_dir=tmp_dir)
+    with pytest.raises(ConnectionError):
+        downloader.download_brstm_files(max_count=10, workers=5)
+
+    # the downloads that succeeded are recorded, the other ones are cancelled
+    downloaded = {
+        song.brstm_download_info.location
+        for game in fake_database.get_games()
+        for song in game.songs
+        if song.brstm_download_info is not None
+    }
+    assert downloaded == {p.relative_to(tmp_dir) for p in tmp_dir.glob("*/*.brstm")}
+    assert fake_database.get_song_from_id(96613).brstm_download_info is None
@@ -0,0 +1,323 @@
+from pathlib import Path
+from random import Random
+
+import pytest
+
+from smashdown import frontier as frontier_module
+from smashdown.database import (
+    Database,
+    DatabaseBackend,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    Site,
+    Song,
+)
+from smashdown.downloader import take_songs_to_download
+from smashdown.frontier import DownloadOrder, Frontier, VisitQueue, get_song_key
+from smashdown.sharded_database import ShardedDatabase
+from smashdown.sqlite_database import SQLiteDatabase
+from smashdown.updater import Updater
+
+from .conftest import FakeClient
+
+
+def test_frontier_games() -> None:
+    frontier = Frontier(Random(123), unvisited_games=[1, 2], visited_games=[(3, 5)])
+    frontier.add_game(4)
+    assert frontier.get_games(None) == [4, 2, 1, 3]
+    frontier.visit_game(2, 10)
+    assert frontier.get_games(2) == [4, 1]
+    assert frontier.get_games(None) == [4, 1, 3, 2]
+    frontier.visit_game(3, 10)
+    frontier.remove_game(1)
+    assert frontier.get_games(None) == [4, 2, 3]
+    # an older visit comes before the others
+    frontier.visit_game(4, 9)
+    assert frontier.get_games(None) == [4, 2, 3]
+    assert frontier.get_oldest_visited_game() == 4
+    assert frontier.to_data().visit_timestamps == [9, 10, 10]
+
+
+def test_visit_queue() -> None:
+    rand = Random(123)
+    queue = VisitQueue()
+    timestamps: dict[int, float] = {}
+    for i in range(2000):
+        game_id = rand.randrange(300)
+        if rand.random() < 0.2:
+            queue.remove(game_id)
+            timestamps.pop(game_id, None)
+        else:
+            timestamps[game_id] = rand.randrange(100)
+            # the last visit comes after the others at the same time
+            timestamps[game_id] += i / 10_000
+            queue.push(game_id, int(timestamps[game_id]))
+        if i % 100 == 0:
+            expected = sorted(timestamps, key=timestamps.__getitem__)
+            assert queue.get(None) == expected
+            assert queue.get(10) == expected[:10]
+            assert len(queue) == len(expected)
+    assert VisitQueue(queue.to_list()).get(None) == queue.get(None)
+
+
+def test_frontier_songs() -> None:
+    frontier = Frontier(Random(123))
+    for song_id in range(100):
+        frontier.add_song(song_id)
+    frontier.add_song(0)
+    songs = frontier.get_songs(None)
+    assert sorted(songs) == list(range(100))
+    assert songs != list(range(100)) and songs != list(range(100))[::-1]
+    assert frontier.get_songs(3) == songs[:3]
+
+    frontier.defer_song(songs[0])
+    assert frontier.get_songs(None)[-1] == songs[0]
+    for song_id in songs[:50]:
+        frontier.remove_song(song_id)
+    frontier.remove_song(1000)
+    assert sorted(frontier.get_songs(None)) == sorted(songs[50:])
+    assert frontier.to_data().songs == frontier.get_songs(None)[::-1]
+
+
+def test_frontier_deferred_songs() -> None:
+    # the next song is the last one
+    frontier = Frontier(Random(123), songs=[6, 5, 4, 3, 2, 1])
+    frontier.defer_song(3)
+    frontier.defer_song(4)
+    assert frontier.get_songs(None) == [1, 2, 5, 6, 3, 4]
+    for song_id in range(7, 20):
+        frontier.add_song(song_id)
+    songs = frontier.get_songs(None)
+    assert songs[-2:] == [3, 4]
+    assert sorted(songs[:-2]) == [1, 2, 5, 6, *range(7, 20)]
+    assert frontier.get_songs(len(songs) - 1) == songs[:-1]
+
+    # deferred again: after the other deferred songs
+    frontier.defer_song(3)
+    frontier.add_song(4)
+    assert frontier.get_songs(None)[-2:] == [4, 3]
+    frontier.defer_song(5)
+    frontier.remove_song(4)
+    assert frontier.get_songs(None)[-2:] == [3, 5]
+    data = frontier.to_data()
+    assert data.deferred_songs == [3, 5]
+    loaded = Frontier.from_data(data, Random(1))
+    assert loaded.get_songs(None) == frontier.get_songs(None)
+
+
+def _build_database() -> Database:
+    return Database(
+        site=Site(
+            base_url="http://idontexist.net",
+            games=[
+                Game(id=1, title="1", download_timestamps=[1, 5]),
+                Game(
+                    id=2,
+                    title="2",
+                    songs=[
+                        Song(id=1, title="1"),
+                        Song(id=2, title="2"),
+                        Song(id=3, title="3", is_deleted_from_site=True),
+                    ],
+                ),
+                Game(id=3, title="3", download_timestamps=[3, 2]),
+                Game(id=4, title="4", songs=[Song(id=4, title="4")]),
+                Game(id=5, title="5", is_deleted_from_site=True),
+            ],
+        )
+    ).with_random(Random(123))
+
+
+def _get_rebuilt_order(db: Database) -> tuple[list[int], set[int]]:
+    rebuilt = Database(site=db.site.model_copy(deep=True))
+    games = rebuilt.get_games_by_last_checked(None)
+    songs = rebuilt.get_songs_with_no_brstm_downloaded(None)
+    return [game.id for game in games], {song.id for song in songs}
+
+
+def _get_order(db: Database) -> tuple[list[int], set[int]]:
+    games = db.get_games_by_last_checked(None)
+    songs = db.get_songs_with_no_brstm_downloaded(None)
+    return [game.id for game in games], {song.id for song in songs}
+
+
+def test_frontier_is_maintained_by_the_database() -> None:
+    db = _build_database()
+    assert _get_order(db) == ([4, 2, 3, 1], {1, 2, 4})
+
+    game = Game(id=6, title="6", songs=[Song(id=5, title="5")])
+    db.add_game(game)
+    db.add_song(game, Song(id=6, title="6"))
+    db.add_game_visit(db.get_game_from_id(4), 10)
+    db.add_game_visit(db.get_game_from_id(3), 11)
+    db.set_game_deleted_from_site(db.get_game_from_id(1), True)
+    db.set_song_deleted_from_site(db.get_song_from_id(1), True)
+    db.set_song_deleted_from_site(db.get_song_from_id(3), False)
+    db.set_brstm_download_info(
+        db.get_song_from_id(2),
+        FileDownloadInfo(location=Path("foo"), timestamp=1, file_md5="md5"),
+    )
+    assert _get_order(db) == ([6, 2, 4, 3], {3, 4, 5, 6})
+    assert _get_order(db) == _get_rebuilt_order(db)
+
+    # a game back on the site, and a visit older than the last one
+    db.set_game_deleted_from_site(db.get_game_from_id(1), False)
+    db.add_game_visit(db.get_game_from_id(6), 7)
+    assert _get_order(db) == ([2, 1, 6, 4, 3], {3, 4, 5, 6})
+    assert _get_order(db) == _get_rebuilt_order(db)
+
+
+def test_songs_with_a_failed_download_come_last(tmp_dir: Path) -> None:
+    db = _build_database()
+    failed = db.get_songs_with_no_brstm_downloaded(2)
+    for i, song in enumerate(failed):
+        failure = DownloadFailure(timestamp=1 + i, count=1, reason="status 404")
+        db.set_brstm_download_failure(song, failure)
+    (other,) = {1, 2, 4} - {song.id for song in failed}
+    # then by oldest failure
+    expected = [other] + [song.id for song in failed]
+    sqlite_db = SQLiteDatabase.build_from_database(Path(":memory:"), db)
+    ShardedDatabase.build_from_database(tmp_dir / "db", db)
+    backends: list[DatabaseBackend] = [
+        db,
+        Database(site=db.site.model_copy(deep=True)),
+        sqlite_db,
+        ShardedDatabase(tmp_dir / "db"),
+    ]
+    for backend in backends:
+        songs = backend.get_songs_with_no_brstm_downloaded(None)
+        assert [s.id for s in songs] == expected
+
+    for backend in backends:
+        song = backend.get_song_from_id(other)
+        failure = DownloadFailure(timestamp=3, count=1, reason="status 404")
+        backend.set_brstm_download_failure(song, failure)
+        songs = backend.get_songs_with_no_brstm_downloaded(None)
+        assert [s.id for s in songs] == expected[1:] + [other]
+
+
+def test_songs_found_by_the_updater_are_pending(
+    fake_database: Database, fake_client: FakeClient
+) -> None:
+    game = fake_database.get_game_from_id(1726)
+    game.songs.clear()
+    fake_database._build_indexes()
+    fake_database._reset_frontier()
+    assert fake_database.get_songs_with_no_brstm_downloaded(None)
+    Updater(client=fake_client, db=fake_database).update_game_song_list(1726)
+    songs = fake_database.get_songs_with_no_brstm_downloaded(None)
+    assert {32272, 93397, 96613} <= {song.id for song in songs}
+    assert fake_database.get_games_by_last_checked(None)[-1].id == 1726
+
+
+def test_frontier_is_saved(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_database().with_output_file(db_file)
+    db.save()
+    db.with_journal()
+    db.add_game_visit(db.get_game_from_id(2), 10)
+    db.add_game(Game(id=6, title="6", songs=[Song(id=5, title="5")]))
+    expected = (
+        [g.id for g in db.get_games_by_last_checked(None)],
+        [s.id for s in db.get_songs_with_no_brstm_downloaded(None)],
+    )
+    db.save()
+
+    loaded = Database.build_from_file(db_file)
+    assert loaded.frontier is not None
+    assert [g.id for g in loaded.get_games_by_last_checked(None)] == expected[0]
+    songs = [s.id for s in loaded.get_songs_with_no_brstm_downloaded(None)]
+    assert sorted(songs) == sorted(expected[1])
+
+    loaded.compact()
+    loaded = Database.build_from_file(db_file)
+    assert [g.id for g in loaded.get_games_by_last_checked(None)] == expected[0]
+    assert [s.id for s in loaded.get_songs_with_no_brstm_downloaded(None)] == songs
+
+
+def test_seeded_frontier_songs() -> None:
+    order = DownloadOrder(seed=7)
+    frontier = Frontier(Random(123), songs=range(50), order=order)
+    for song_id in range(50, 100):
+        frontier.add_song(song_id)
+    songs = frontier.get_songs(None)
+    assert songs == sorted(range(100), key=lambda song_id: get_song_key(7, song_id))
+    # the same order, whatever the order of the additions
+    other = Frontier(Random(456), songs=reversed(range(100)), order=order)
+    assert other.get_songs(None) == songs
+
+    frontier.set_cursor(get_song_key(7, songs[97]))
+    assert frontier.get_songs(4) == [songs[98], songs[99], songs[0], songs[1]]
+    frontier.remove_song(songs[98])
+    frontier.defer_song(songs[99])
+    assert frontier.get_songs(2) == [songs[99], songs[0]]
+    assert frontier.to_data().seed == 7
+
+
+def test_seeded_frontier_is_restored_without_sorting(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    order = DownloadOrder(seed=7, cursor=get_song_key(7, 12))
+    frontier = Frontier(Random(123), songs=range(100), order=order)
+    frontier.remove_song(30)
+    data = frontier.to_data()
+
+    def fail(seed: int, song_id: int) -> int:
+        raise AssertionError("the keys are computed again")
+
+    monkeypatch.setattr(frontier_module, "get_song_key", fail)
+    restored = Frontier.from_data(data, Random(456), order)
+    assert restored.get_songs(None) == frontier.get_songs(None)
+    assert restored.to_data() == data
+
+
+def _take(db: DatabaseBackend, count: int) -> list[int]:
+    return [song.id for song in take_songs_to_download(db, count)]
+
+
+def test_seeded_order_is_the_same_for_both_backends(fake_database: Database) -> None:
+    sqlite_db = SQLiteDatabase.build_from_database(Path(":memory:"), fake_database)
+    for db in (fake_database, sqlite_db):
+        db.set_download_order(DownloadOrder(seed=42))
+    songs = [s.id for s in fake_database.get_songs_with_no_brstm_downloaded(None)]
+    assert len(songs) == 5
+    assert [s.id for s in sqlite_db.get_songs_with_no_brstm_downloaded(None)] == songs
+
+    # each run starts after the songs taken by the previous one
+    for db in (fake_database, sqlite_db):
+        assert _take(db, 3) == songs[:3]
+        assert _take(db, 3) == [songs[3], songs[4], songs[0]]
+        cursor = get_song_key(42, songs[0])
+        assert db.get_download_order() == DownloadOrder(seed=42, cursor=cursor)
+
+    # the songs added later take their place in the order
+    game = fake_database.get_game_from_id(1726)
+    for db in (fake_database, sqlite_db):
+        db.add_song(game, Song(id=1, title="1"))
+    keys = {song_id: get_song_key(42, song_id) for song_id in songs + [1]}
+    expected = sorted(
+        keys, key=lambda song_id: (keys[song_id] <= cursor, keys[song_id])
+    )
+    for db in (fake_database, sqlite_db):
+        assert [s.id for s in db.get_songs_with_no_brstm_downloaded(None)] == expected
+
+
+def test_download_cursor_is_saved(tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    db = _build_database().with_output_file(db_file)
+    db.set_download_order(DownloadOrder(seed=3))
+    db.save()
+    db.with_journal()
+    first = _take(db, 1)
+    db.save()
+    loaded = Database.build_from_file(db_file)
+    assert loaded.get_download_order() == db.get_download_order()
+    second = _take(loaded, 2)
+    assert first + second == sorted({1, 2, 4}, key=lambda id: get_song_key(3, id))
+
+    loaded.compact()
+    loaded = Database.build_from_file(db_file)
+    assert loaded.frontier is not None and loaded.frontier.seed == 3
+    # back to the start
+    assert _take(loaded, 1) == first
@@ -0,0 +1,151 @@
+from pathlib import Path
+
+import pytest
+import requests_mock
+
+from smashdown.client import GameInfo, Parser, ParsingError, SmashClient, SongInfo
+from smashdown.database import Database, Site
+from smashdown.http_cache import PageNotModified, ValidatorCache
+from smashdown.updater import Updater
+
+from .server import StandInServer
+
+
+def test_validator_cache(tmp_dir: Path) -> None:
+    cache = ValidatorCache(tmp_dir / "cache")
+    url = "http://idontexist.net/game/1"
+    assert cache.get_request_headers(url) == {}
+    assert cache.record_response(url, 200, {"ETag": '"a"'}, b"foo") is True
+    assert cache.get_request_headers(url) == {"If-None-Match": '"a"'}
+    assert cache.record_response(url, 304, {}, b"") is False
+    # without validators, the content is compared
+    assert cache.record_response(url, 200, {}, b"foo") is False
+    assert cache.record_response(url, 200, {}, b"bar") is True
+    assert cache.get_request_headers(url) == {}
+    headers = {"ETag": '"b"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    cache.record_response(url, 200, headers, b"bar")
+    cache.save()
+
+    loaded = ValidatorCache(tmp_dir / "cache")
+    assert loaded.get_request_headers(url) == {
+        "If-None-Match": '"b"',
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+    assert loaded.record_response(url, 200, {}, b"bar") is False
+
+
+def test_invalid_validator_cache_is_ignored(tmp_dir: Path) -> None:
+    (tmp_dir / "cache").write_text("{")
+    cache = ValidatorCache(tmp_dir / "cache")
+    assert cache.get_request_headers("http://idontexist.net/") == {}
+
+
+@pytest.mark.parametrize("send_etag", [True, False])
+def test_conditional_requests(
+    stand_in_server: StandInServer, tmp_dir: Path, send_etag: bool
+) -> None:
+    stand_in_server.send_etag = send_etag
+    client = SmashClient(
+        base_url=stand_in_server.base_url,
+        limiter=None,
+        cache=ValidatorCache(tmp_dir / "cache"),
+    )
+    assert len(client.get_song_list(1726, conditional=True)) == 3
+    with pytest.raises(PageNotModified):
+        client.get_song_list(1726, conditional=True)
+    # the requests that are not conditional don't use the cache
+    assert len(client.get_song_list(1726)) == 3
+    assert len(client.get_game_list()) == 3
+    assert len(client.get_game_list(conditional=True)) == 3
+
+    headers = [request.headers for request in stand_in_server.requests]
+    assert ("If-None-Match" in headers[1]) == send_etag
+    assert "If-None-Match" not in headers[2]
+    assert "If-None-Match" not in headers[4]
+
+
+def test_conditional_requests_with_last_modified(tmp_dir: Path) -> None:
+    client = SmashClient(
+        base_url="http://idontexist.net",
+        limiter=None,
+        cache=ValidatorCache(tmp_dir / "cache"),
+    )
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://idontexist.net/game/1",
+            [
+                {"text": "<html></html>", "headers": {"Last-Modified": last_modified}},
+                {"status_code": 304},
+            ],
+        )
+        assert client.get_song_list(1, conditional=True) == []
+        with pytest.raises(PageNotModified):
+            client.get_song_list(1, conditional=True)
+        assert m.request_history[1].headers["If-Modified-Since"] == last_modified
+
+
+class FailingParser(Parser):
+    def get_song_list_from_game_page(self, html: str) -> list[SongInfo]:
+        raise ParsingError("unexpected page")
+
+
+def test_page_not_parsed_is_fetched_again(
+    stand_in_server: StandInServer, tmp_dir: Path
+) -> None:
+    client = SmashClient(
+        base_url=stand_in_server.base_url,
+        limiter=None,
+        parser=FailingParser(),
+        cache=ValidatorCache(tmp_dir / "cache"),
+    )
+    with pytest.raises(ParsingError):
+        client.get_song_list(1726, conditional=True)
+    assert client.cache is not None
+    client.cache.save()
+
+    client.cache = ValidatorCache(tmp_dir / "cache")
+    client.parser = Parser()
+    assert len(client.get_song_list(1726, conditional=True)) == 3
+    assert "If-None-Match" not in stand_in_server.requests[-1].headers
+
+
+class CountingParser(Parser):
+    count = 0
+
+    def get_game_list_from_home_page(self, html: str) -> list[GameInfo]:
+        self.count += 1
+        return super().get_game_list_from_home_page(html)
+
+    def get_song_list_from_game_page(self, html: str) -> list[SongInfo]:
+        self.count += 1
+        return super().get_song_list_from_game_page(html)
+
+
+def test_updater_skips_the_pages_not_modified(
+    stand_in_server: StandInServer, tmp_dir: Path
+) -> None:
+    parser = CountingParser()
+    client = SmashClient(
+        base_url=stand_in_server.base_url,
+        limiter=None,
+        parser=parser,
+        cache=ValidatorCache(tmp_dir / "cache"),
+    )
+    db = Database(site=Site(base_url=stand_in_server.base_url))
+    timestamps = iter(range(100, 200))
+    updater = Updater(client=client, db=db, clock=lambda: next(timestamps))
+    for _ in range(2):
+        updater.update_game_list()
+        updater.update_game_song_lists(max_count=10)
+    assert parser.count == 4
+
+    # the visits are still recorded
+    assert db.site.download_timestamps == [100, 104]
+    assert [g.download_timestamps for g in db.site.games] == [
+        [103, 107],
+        [102, 106],
+        [101, 105],
+    ]
+    stats = db.get_statistics()
+    assert (stats.games, stats.songs, stats.songs_deleted_from_site) == (3, 5, 0)
@@ -1,11 +1,26 @@
 from pathlib import Path
 
-from smashdown.client import GameInfo, Parser, SongInfo
+import pytest
 
+from benchmark.synthetic import build_game_page, build_home_page
+from smashdown.client import (
+    GameInfo,
+    LxmlParser,
+    PageParser,
+    Parser,
+    ParsingError,
+    SongInfo,
+)
 
-def test_get_game_list_from_home_page(testdata_directory: Path) -> None:
+PARSERS = [Parser(), LxmlParser()]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_get_game_list_from_home_page(
+    testdata_directory: Path, parser: PageParser
+) -> None:
     html = (testdata_directory / "home.html").read_text()
-    games = Parser.get_game_list_from_home_page(html)
+    games = parser.get_game_list_from_home_page(html)
     assert games == [
         GameInfo(
             id=1726,
@@ -25,9 +40,12 @@ def test_get_game_list_from_home_page(testdata_directory: Path) -> None:
     ]
 
 
-def test_get_song_list_from_game_page(testdata_directory: Path) -> None:
+@pytest.mark.parametrize("parser", PARSERS)
+def test_get_song_list_from_game_page(
+    testdata_directory: Path, parser: PageParser
+) -> None:
     html = (testdata_directory / "game_1726.html").read_text()
-    songs = Parser.get_song_list_from_game_page(html)
+    songs = parser.get_song_list_from_game_page(html)
     assert songs == [
         SongInfo(
             id=96613,
@@ -42,3 +60,57 @@ def test_get_song_list_from_game_page(testdata_directory: Path) -> None:
             title="The Lost Forest",
         ),
     ]
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        build_home_page(game_count=500),
+        "",
+        "<p>no games</p>",
+        '<?xml version="1.0" encoding="utf-8"?><html><td><a href="/game/1">A</a></td>'
+        "<td>1 song</td></html>",
+        # titles with markup, entities and comments
+        '<td><a href="/game/1"><b>Caf&eacute;</b> &amp; <!-- x -->co</a></td>'
+        "<td><!-- y -->12 songs</td>",
+        # the song count is in a nested element
+        '<td><a href="/game/1">A</a></td><td><span>3 songs</span></td>',
+        '<td><a href="/game/1">A</a></td>3 songs',
+    ],
+)
+def test_game_list_parsers_are_equivalent(html: str) -> None:
+    assert LxmlParser.get_game_list_from_home_page(
+        html
+    ) == Parser.get_game_list_from_home_page(html)
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        '<td><a href="/game/x1">A</a></td><td>3 songs</td>',
+        '<td><a href="/game/1">A</a></td> <td>3 songs</td>',
+        '<td><a href="/game/1">A</a></td>text<td>3 songs</td>',
+        '<td><a href="/game/1">A</a></td><!-- 3 songs --><td>3 songs</td>',
+        '<td><a href="/game/1">A</a></td><td>3 songs!</td>',
+    ],
+)
+def test_game_list_parsers_fail_on_the_same_pages(html: str) -> None:
+    with pytest.raises(ParsingError):
+        Parser.get_game_list_from_home_page(html)
+    with pytest.raises(ParsingError):
+        LxmlParser.get_game_list_from_home_page(html)
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        build_game_page(song_count=500),
+        "",
+        '<a href="/song/1">A <i>B</i> &lt;C&gt;</a><a href="/songs">D</a>',
+        '<a href="/song/1">A</a><a href="/game/1">B</a><a>C</a>',
+    ],
+)
+def test_song_list_parsers_are_equivalent(html: str) -> None:
+    assert LxmlParser.get_song_list_from_game_page(
+        html
+    ) == Parser.get_song_list_from_game_page(html)
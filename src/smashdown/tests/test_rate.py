@@ -0,0 +1,121 @@
+import email.utils
+import time
+from pathlib import Path
+
+import pytest
+
+from smashdown.client import SmashClient
+from smashdown.rate import AdaptiveRateController, MinIntervalLimiter, parse_retry_after
+from smashdown.retry import RequestFailed
+
+from .server import StandInServer
+
+HOST = "example.com"
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("soon") is None
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    delay = parse_retry_after(date)
+    assert delay is not None and 58 <= delay <= 60
+    date = email.utils.formatdate(time.time() - 60, usegmt=True)
+    assert parse_retry_after(date) == 0
+
+
+def test_min_interval_limiter() -> None:
+    limiter = MinIntervalLimiter(min_interval=10)
+    assert limiter.reserve(HOST) == 0
+    assert limiter.reserve(HOST) == pytest.approx(10, abs=0.1)
+    assert limiter.reserve(HOST) == pytest.approx(20, abs=0.1)
+    assert limiter.reserve("other.com") == 0
+
+
+def test_adaptive_rate_controller_invalid_bounds() -> None:
+    with pytest.raises(ValueError):
+        AdaptiveRateController(min_interval=0)
+    with pytest.raises(ValueError):
+        AdaptiveRateController(min_interval=10, max_interval=5)
+
+
+def test_adaptive_rate_controller_increase() -> None:
+    controller = AdaptiveRateController(
+        min_interval=2, max_interval=100, initial_interval=10, rate_increase=0.1
+    )
+    assert controller.get_interval(HOST) == 10
+    controller.record(HOST, 200, 0.5)
+    assert controller.get_interval(HOST) == pytest.approx(5)
+    for _ in range(10):
+        controller.record(HOST, 304, 0.5)
+    # bounded by the minimum interval
+    assert controller.get_interval(HOST) == 2
+    assert controller.get_interval("other.com") == 10
+
+
+@pytest.mark.parametrize(
+    "status, latency", [(429, 0.5), (503, 0.5), (None, 0.0), (200, 10.0)]
+)
+def test_adaptive_rate_controller_decrease(status: int | None, latency: float) -> None:
+    controller = AdaptiveRateController(
+        min_interval=2, max_interval=100, initial_interval=10, target_latency=5
+    )
+    controller.record(HOST, status, latency)
+    assert controller.get_interval(HOST) == pytest.approx(20)
+    # the other responses to requests sent at the previous rate are ignored
+    controller.record(HOST, status, latency)
+    assert controller.get_interval(HOST) == pytest.approx(20)
+
+
+def test_adaptive_rate_controller_max_interval() -> None:
+    controller = AdaptiveRateController(
+        min_interval=0.001, max_interval=0.01, initial_interval=0.001
+    )
+    for _ in range(5):
+        controller.record(HOST, 503, 0.0)
+        time.sleep(0.01)
+    assert controller.get_interval(HOST) == pytest.approx(0.01)
+
+
+def test_adaptive_rate_controller_defaults() -> None:
+    controller = AdaptiveRateController()
+    # the interval of the former naps, shortened slowly while the site is healthy
+    assert controller.get_interval(HOST) == 60
+    controller.record(HOST, 200, 0.5)
+    assert 50 < controller.get_interval(HOST) < 60
+    for _ in range(1000):
+        controller.record(HOST, 200, 0.5)
+    assert controller.get_interval(HOST) == pytest.approx(10)
+
+
+def test_adaptive_rate_controller_reserve() -> None:
+    controller = AdaptiveRateController(initial_interval=10)
+    assert controller.reserve(HOST) == 0
+    assert controller.reserve(HOST) == pytest.approx(10, abs=0.1)
+    controller.record(HOST, 503, 0.5, retry_after=60)
+    # the requests already reserved are not delayed, the next ones are
+    assert controller.reserve(HOST) == pytest.approx(60, abs=0.1)
+
+
+def test_client_slows_down_on_errors(testdata_directory: Path) -> None:
+    server = StandInServer(
+        testdata_dir=testdata_directory, error_status=503, retry_after="1"
+    )
+    server.start()
+    try:
+        controller = AdaptiveRateController(
+            min_interval=0.01, max_interval=10, initial_interval=0.01
+        )
+        client = SmashClient(
+            base_url=server.base_url, limiter=controller, retry=None, breaker=None
+        )
+        with pytest.raises(RequestFailed):
+            client.get_brstm_file(1)
+        assert controller.get_interval(server.base_url[len("http://") :]) == 0.02
+        start = time.monotonic()
+        with pytest.raises(RequestFailed):
+            client.get_brstm_file(1)
+        # the Retry-After delay is respected
+        assert time.monotonic() - start >= 1
+    finally:
+        server.stop()
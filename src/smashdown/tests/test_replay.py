@@ -0,0 +1,79 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from smashdown.archive import HOME_PAGE, ArchiveWriter, HtmlArchive, get_game_page
+from smashdown.client import LxmlParser, SmashClient
+from smashdown.database import Database, Site
+from smashdown.http_cache import PageNotModified
+from smashdown.replay import ReplayClient, replay_archive
+from smashdown.updater import Updater
+
+from .server import StandInServer
+
+
+def test_replay_client(testdata_directory: Path, tmp_dir: Path) -> None:
+    archive = HtmlArchive(tmp_dir)
+    home_page = (testdata_directory / "home.html").read_text()
+    archive.add_page(HOME_PAGE, 10, home_page)
+    archive.add_page(HOME_PAGE, 20, home_page.replace("3 songs", "4 songs"))
+    archive.add_page(HOME_PAGE, 30, home_page)
+    game_page = (testdata_directory / "game_1726.html").read_text()
+    archive.add_page(get_game_page(1726), 15, game_page)
+
+    client = ReplayClient(archive=archive)
+    assert client.get_game_list()[0].song_count == 3
+    client.timestamp = 25
+    assert client.get_game_list()[0].song_count == 4
+    assert len(client.get_song_list(1726)) == 3
+    client.timestamp = 10
+    assert client.get_game_list(conditional=True)[0].song_count == 3
+    with pytest.raises(PageNotModified):
+        client.get_game_list(conditional=True)
+    client.timestamp = 20
+    assert client.get_game_list(conditional=True)[0].song_count == 4
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_replay_archive(
+    testdata_directory: Path, tmp_dir: Path, processes: int
+) -> None:
+    site_dir = tmp_dir / "site"
+    shutil.copytree(testdata_directory, site_dir)
+    server = StandInServer(testdata_dir=site_dir)
+    server.start()
+    now = 100
+    archive = HtmlArchive(tmp_dir / "archive")
+    client = SmashClient(
+        base_url=server.base_url,
+        writer=ArchiveWriter(archive, clock=lambda: now),
+        limiter=None,
+    )
+    db = Database(site=Site(base_url=server.base_url))
+    updater = Updater(client=client, db=db, clock=lambda: now)
+    try:
+        updater.update_game_list()
+        now = 101
+        updater.update_game_song_lists(max_count=10)
+        # a song is removed from the site
+        game_page = site_dir / "game_1726.html"
+        html = game_page.read_text().splitlines()
+        game_page.write_text("\n".join(line for line in html if "32272" not in line))
+        now = 200
+        updater.update_game_list()
+        now = 201
+        updater.update_game_song_lists(max_count=10)
+    finally:
+        server.stop()
+
+    rebuilt = Database(site=Site(base_url=server.base_url))
+    replay_archive(
+        HtmlArchive(tmp_dir / "archive"),
+        rebuilt,
+        parser=LxmlParser(),
+        processes=processes,
+    )
+    assert rebuilt.site == db.site
+    assert rebuilt.get_song_from_id(32272).is_deleted_from_site is True
+    assert rebuilt.get_game_from_id(1726).download_timestamps == [101, 201]
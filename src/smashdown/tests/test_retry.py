@@ -0,0 +1,214 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from random import Random
+from typing import Iterator
+
+import pytest
+import requests
+import requests_mock
+
+from smashdown.client import BrstmStream, SmashClient
+from smashdown.database import Database
+from smashdown.downloader import Downloader
+from smashdown.retry import CircuitBreaker, CircuitOpen, RequestFailed, RetryPolicy
+
+from .conftest import FakeClient
+from .server import StandInServer
+
+
+def test_retry_policy_delays() -> None:
+    policy = RetryPolicy(base_delay=1, max_delay=5, rand=Random(123))
+    for retry, bound in [(1, 1), (2, 2), (3, 4), (4, 5), (10, 5)]:
+        delays = [policy.get_delay(retry) for _ in range(100)]
+        assert all(0 <= delay <= bound for delay in delays)
+        assert max(delays) > bound / 2
+
+
+def test_circuit_breaker() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.before_request()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+
+    time.sleep(0.05)
+    # a single trial request
+    breaker.before_request()
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_request()
+
+    time.sleep(0.05)
+    breaker.before_request()
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.before_request()
+
+
+def _build_client(base_url: str, breaker: CircuitBreaker | None = None) -> SmashClient:
+    return SmashClient(
+        base_url=base_url,
+        limiter=None,
+        retry=RetryPolicy(max_attempts=3, base_delay=0.01),
+        breaker=breaker,
+    )
+
+
+def test_transient_failures_are_retried(testdata_directory: Path) -> None:
+    client = _build_client("http://idontexist.net")
+    with requests_mock.Mocker() as m:
+        m.get(
+            "http://idontexist.net/",
+            [
+                {"status_code": 503},
+                {"exc": requests.ConnectionError},
+                {"text": (testdata_directory / "home.html").read_text()},
+            ],
+        )
+        assert len(client.get_game_list()) == 3
+        assert m.call_count == 3
+
+
+def test_transient_failures_are_retried_up_to_max_attempts(
+    testdata_directory: Path,
+) -> None:
+    server = StandInServer(testdata_dir=testdata_directory, error_status=503)
+    server.start()
+    try:
+        client = _build_client(server.base_url)
+        with pytest.raises(RequestFailed) as exc_info:
+            client.get_song_list(1726)
+        assert exc_info.value.status == 503
+        assert len(server.requests) == 3
+    finally:
+        server.stop()
+
+
+def test_hanging_requests_are_retried(stand_in_server: StandInServer) -> None:
+    stand_in_server.delay = 0.3
+    client = _build_client(stand_in_server.base_url)
+    client.timeout = (1.0, 0.05)
+    with pytest.raises(RequestFailed, match="Timeout"):
+        client.get_song_list(1726)
+    assert len(stand_in_server.requests) == 3
+
+
+def test_other_failures_are_not_retried(stand_in_server: StandInServer) -> None:
+    client = _build_client(stand_in_server.base_url)
+    with pytest.raises(RequestFailed) as exc_info:
+        client.get_song_list(1)
+    assert exc_info.value.status == 404
+    assert not exc_info.value.transient
+    assert len(stand_in_server.requests) == 1
+
+
+def test_unexpected_content_type(stand_in_server: StandInServer) -> None:
+    client = _build_client(stand_in_server.base_url)
+    # an html page instead of a brstm file
+    client.brstm_url_path_template = "/game/{id}"
+    with pytest.raises(RequestFailed, match="content type"):
+        client.get_brstm_file(1726)
+    with pytest.raises(RequestFailed, match="content type"):
+        with client.stream_brstm_file(1726, chunk_size=1024):
+            pass
+    # a brstm file instead of an html page
+    client.game_url_path_template = "/brstm/{id}"
+    with pytest.raises(RequestFailed, match="content type"):
+        client.get_song_list(96613)
+
+
+def test_circuit_breaker_stops_the_requests(testdata_directory: Path) -> None:
+    server = StandInServer(testdata_dir=testdata_directory, error_status=500)
+    server.start()
+    try:
+        client = _build_client(server.base_url, CircuitBreaker(failure_threshold=5))
+        with pytest.raises(RequestFailed):
+            client.get_song_list(1726)
+        with pytest.raises(CircuitOpen):
+            client.get_song_list(1726)
+        assert len(server.requests) == 5
+    finally:
+        server.stop()
+
+
+@dataclass
+class PartlyFailingClient(FakeClient):
+    failing_song_ids: frozenset[int] = frozenset()
+
+    @contextmanager
+    def stream_brstm_file(
+        self,
+        song_id: int,
+        chunk_size: int,
+        offset: int = 0,
+        validator: str | None = None,
+    ) -> Iterator[BrstmStream]:
+        if song_id in self.failing_song_ids:
+            raise RequestFailed("status 404", status=404, transient=False)
+        with super().stream_brstm_file(
+            song_id, chunk_size, offset, validator
+        ) as stream:
+            yield stream
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_download_failures_are_recorded(
+    fake_database: Database, testdata_directory: Path, tmp_dir: Path, workers: int
+) -> None:
+    client = PartlyFailingClient(
+        testdata_dir=testdata_directory, failing_song_ids=frozenset({96613, 77724})
+    )
+    downloader = Downloader(client=client, db=fake_database, output_dir=tmp_dir)
+    downloader.download_brstm_files(max_count=10, workers=workers)
+    downloader.download_brstm_files(max_count=10, workers=workers)
+
+    stats = fake_database.get_statistics()
+    assert stats.songs_downloaded == 3
+    assert stats.songs_with_download_failure == 2
+    song = fake_database.get_song_from_id(96613)
+    assert song.brstm_download_info is None
+    assert song.brstm_download_failure is not None
+    assert song.brstm_download_failure.count == 2
+    assert song.brstm_download_failure.reason == "status 404"
+    # the songs are still to be downloaded
+    songs = fake_database.get_songs_with_no_brstm_downloaded(None)
+    assert {s.id for s in songs} == {96613, 77724}
+
+    # a successful download clears the failure
+    client.failing_song_ids = frozenset()
+    downloader.download_brstm_files(max_count=10, workers=workers)
+    assert song.brstm_download_info is not None
+    assert song.brstm_download_failure is None
+    assert fake_database.get_statistics().songs_with_download_failure == 0
+
+
+def test_download_stops_when_the_circuit_is_open(
+    fake_database: Database, testdata_directory: Path, tmp_dir: Path
+) -> None:
+    @dataclass
+    class DownClient(FakeClient):
+        @contextmanager
+        def stream_brstm_file(
+            self,
+            song_id: int,
+            chunk_size: int,
+            offset: int = 0,
+            validator: str | None = None,
+        ) -> Iterator[BrstmStream]:
+            raise CircuitOpen("requests suspended")
+            yield  # pragma:nocover
+
+    client = DownClient(testdata_dir=testdata_directory)
+    downloader = Downloader(client=client, db=fake_database, output_dir=tmp_dir)
+    with pytest.raises(CircuitOpen):
+        downloader.download_brstm_files(max_count=10)
+    assert fake_database.get_statistics().songs_with_download_failure == 0
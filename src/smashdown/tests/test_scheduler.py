@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+
+from smashdown.database import Database, Game, Site, Song
+from smashdown.scheduler import RevisitScheduler, get_change_history
+from smashdown.sqlite_database import SQLiteDatabase
+from smashdown.updater import Updater
+
+from .conftest import FakeClient
+
+DAY = 24 * 3600
+
+
+def _build_game(
+    id: int, visits: list[int], added: list[int | None], is_deleted: bool = False
+) -> Game:
+    return Game(
+        id=id,
+        title=str(id),
+        songs=[
+            Song(id=id * 100 + i, title=str(i), added_timestamp=timestamp)
+            for i, timestamp in enumerate(added)
+        ],
+        download_timestamps=visits,
+        is_deleted_from_site=is_deleted,
+    )
+
+
+def test_change_history() -> None:
+    game = _build_game(1, [10 * DAY, 20 * DAY, 30 * DAY], [None, 10 * DAY, 30 * DAY])
+    # the songs found on the first visit (or before the time was recorded)
+    # are not changes
+    assert get_change_history(game) == (1, 20 * DAY)
+    assert get_change_history(_build_game(2, [], [])) == (0, 0)
+    # the dropped visits are still counted
+    game.drop_old_visits(1)
+    assert game.download_timestamps == [30 * DAY]
+    assert get_change_history(game) == (1, 20 * DAY)
+
+
+def test_games_with_new_songs_are_visited_first() -> None:
+    now = 100 * DAY
+    games = [
+        # never visited
+        _build_game(1, [], []),
+        # static, visited a long time ago
+        _build_game(2, [0, 50 * DAY], [0, 0]),
+        # a new song every 10 days, visited recently
+        _build_game(3, [0, 40 * DAY, 90 * DAY], [0, 20 * DAY, 40 * DAY, 90 * DAY]),
+        _build_game(4, [0, 60 * DAY], [0, 0]),
+        _build_game(5, [], [], is_deleted=True),
+    ]
+    scheduler = RevisitScheduler(prior_time=30 * DAY, clock=lambda: now)
+    site_rate = scheduler.get_site_rate(games)
+    assert site_rate == pytest.approx(3 / (200 * DAY))
+    assert scheduler.get_rate(games[2], site_rate) == pytest.approx(
+        (3 + site_rate * 30 * DAY) / (120 * DAY)
+    )
+    assert [g.id for g in scheduler.get_games_to_visit(games, None)] == [1, 3, 2, 4]
+    assert [g.id for g in scheduler.get_games_to_visit(games, 2)] == [1, 3]
+    assert [g.id for g in scheduler.get_games_to_visit(games, 1)] == [1]
+
+
+def test_without_history_the_oldest_visits_come_first(
+    fake_database: Database,
+) -> None:
+    for timestamp, game in zip([30, 10, 20], fake_database.get_games()):
+        fake_database.add_game_visit(game, timestamp)
+    fake_database._reset_frontier()
+    games = fake_database.get_games_by_last_checked(None)
+    scheduler = RevisitScheduler(clock=lambda: 100)
+    assert scheduler.get_games_to_visit(games, None) == games
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_update_by_change_rate(
+    fake_client: FakeClient, tmp_dir: Path, backend: str
+) -> None:
+    db = (
+        SQLiteDatabase(tmp_dir / "db.sqlite", base_url="http://idontexist.net")
+        if backend == "sqlite"
+        else Database(site=Site(base_url="http://idontexist.net"))
+    )
+    timestamp = 1000
+    updater = Updater(client=fake_client, db=db, clock=lambda: timestamp)
+    updater.update_game_list()
+    updater.update_game_song_lists_by_change_rate(max_count=2)
+    assert db.get_statistics().games_visited == 2
+
+    timestamp = 2000
+    updater.update_game_song_lists_by_change_rate(max_count=2)
+    assert db.get_statistics().games_visited == 3
+    # the songs are recorded with the time they were found
+    assert db.get_statistics().songs == 5
+    for game in db.get_games():
+        first_visit = game.download_timestamps[0]
+        assert all(song.added_timestamp == first_visit for song in game.songs)
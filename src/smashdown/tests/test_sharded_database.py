@@ -0,0 +1,211 @@
+from pathlib import Path
+
+import pytest
+
+from smashdown.client import Client
+from smashdown.database import (
+    KEPT_VISITS,
+    Database,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameNotFound,
+    Site,
+    Song,
+    SongNotFound,
+)
+from smashdown.downloader import Downloader
+from smashdown.frontier import DownloadOrder
+from smashdown.sharded_database import GAMES_DIR, ShardedDatabase
+from smashdown.updater import Updater
+
+
+@pytest.fixture
+def database() -> Database:
+    return Database(
+        site=Site(
+            base_url="http://idontexist.net",
+            download_timestamps=[10, 20],
+            games=[
+                Game(id=1, title="1", download_timestamps=[1, 5]),
+                Game(
+                    id=12,
+                    title="12",
+                    songs=[
+                        Song(
+                            id=1,
+                            title="1",
+                            brstm_download_failure=DownloadFailure(
+                                timestamp=1, count=2, reason="status 404"
+                            ),
+                        ),
+                        Song(
+                            id=2,
+                            title="2",
+                            brstm_download_info=FileDownloadInfo(
+                                location=Path("foo"), timestamp=2, file_md5="md5"
+                            ),
+                        ),
+                        Song(id=3, title="3", is_deleted_from_site=True),
+                    ],
+                ),
+                Game(
+                    id=3,
+                    title="3",
+                    download_timestamps=[3, 2],
+                    songs=[Song(id=4, title="4")],
+                ),
+                Game(id=24, title="24"),
+                Game(id=5, title="5", is_deleted_from_site=True),
+            ],
+        ),
+        download_order=DownloadOrder(seed=1, cursor=5),
+    )
+
+
+@pytest.fixture
+def sharded_db(database: Database, tmp_dir: Path) -> ShardedDatabase:
+    ShardedDatabase.build_from_database(tmp_dir / "db", database, bucket_size=10)
+    return ShardedDatabase(tmp_dir / "db")
+
+
+def _get_loaded_shards(db: ShardedDatabase) -> set[int]:
+    return set(db._shards)
+
+
+def test_conversion_round_trip(database: Database, sharded_db: ShardedDatabase) -> None:
+    assert sharded_db.to_database().site == database.site
+    assert sharded_db.get_download_order() == database.download_order
+    assert sorted(p.name for p in (sharded_db._directory / GAMES_DIR).iterdir()) == [
+        "0.json",
+        "1.json",
+        "2.json",
+    ]
+
+
+def test_lookups_read_only_the_shards_they_touch(sharded_db: ShardedDatabase) -> None:
+    assert _get_loaded_shards(sharded_db) == set()
+    assert sharded_db.get_game_from_id(3).songs[0].id == 4
+    assert sharded_db.get_song_from_id(4).title == "4"
+    assert _get_loaded_shards(sharded_db) == {0}
+    assert sharded_db.get_game_from_song_id(2).id == 12
+    assert _get_loaded_shards(sharded_db) == {0, 1}
+    with pytest.raises(GameNotFound):
+        sharded_db.get_game_from_id(6)
+    with pytest.raises(SongNotFound):
+        sharded_db.get_song_from_id(5)
+    assert _get_loaded_shards(sharded_db) == {0, 1}
+    game, song = sharded_db.get_song_from_downloaded_path(Path("foo"))
+    assert (game.id, song.id) == (12, 2)
+    with pytest.raises(SongNotFound):
+        sharded_db.get_song_from_downloaded_path(Path("bar"))
+
+
+def test_pending_work_and_statistics_are_read_from_the_indexes(
+    database: Database, sharded_db: ShardedDatabase
+) -> None:
+    assert sharded_db.get_statistics() == database.get_statistics()
+    games = sharded_db.get_games_by_last_checked(None)
+    assert [g.id for g in games] == [
+        g.id for g in database.get_games_by_last_checked(None)
+    ]
+    assert [g.id for g in sharded_db.get_games_by_last_checked(1)] == [24]
+    # the song with a failed download comes last
+    songs = sharded_db.get_songs_with_no_brstm_downloaded(None)
+    assert [s.id for s in songs] == [
+        s.id for s in database.get_songs_with_no_brstm_downloaded(None)
+    ]
+    assert {s.id for s in songs} == {1, 4}
+
+
+def test_only_the_changed_shards_are_saved(
+    tmp_dir: Path, sharded_db: ShardedDatabase
+) -> None:
+    files = sorted((tmp_dir / "db").rglob("*.json"))
+    mtimes = {file: file.stat().st_mtime_ns for file in files}
+    game = sharded_db.get_game_from_id(24)
+    song = Song(id=5, title="5")
+    sharded_db.add_song(game, song)
+    sharded_db.add_game_visit(game, 123)
+    sharded_db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("bar"), timestamp=1, file_md5="md5")
+    )
+    sharded_db.save()
+    changed = [file for file in files if file.stat().st_mtime_ns != mtimes[file]]
+    assert [file.relative_to(tmp_dir / "db").as_posix() for file in changed] == [
+        "games/2.json",
+        "index/2.json",
+    ]
+    assert _get_loaded_shards(sharded_db) == {2}
+
+
+def test_changes_are_saved(tmp_dir: Path, sharded_db: ShardedDatabase) -> None:
+    game = sharded_db.get_game_from_id(24)
+    song = Song(id=5, title="5")
+    sharded_db.add_game(Game(id=6, title="6"))
+    sharded_db.add_song(game, song)
+    sharded_db.set_song_deleted_from_site(sharded_db.get_song_from_id(1), True)
+    sharded_db.set_game_deleted_from_site(game, True)
+    sharded_db.add_game_visit(game, 123)
+    sharded_db.add_site_visit(456)
+    sharded_db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("bar"), timestamp=1, file_md5="md5")
+    )
+    sharded_db.set_brstm_download_failure(sharded_db.get_song_from_id(1), None)
+    sharded_db.set_brstm_download_failure(
+        sharded_db.get_song_from_id(4),
+        DownloadFailure(timestamp=3, count=1, reason="status 503"),
+    )
+    sharded_db.set_download_order(None)
+    expected = sharded_db.to_database()
+    sharded_db.save()
+
+    loaded = ShardedDatabase(tmp_dir / "db")
+    assert loaded.get_statistics() == expected.get_statistics()
+    database = loaded.to_database()
+    assert database.site == expected.site
+    assert database.download_order is None
+    assert database.site.download_timestamps == [10, 20, 456]
+    assert database.site.games[3].download_timestamps == [123]
+    assert database.site.games[3].is_deleted_from_site is True
+    assert database.site.games[5].id == 6
+    assert loaded.get_song_from_downloaded_path(Path("bar"))[1].id == 5
+    assert [s.id for s in loaded.get_songs_with_no_brstm_downloaded(None)] == [4]
+    with pytest.raises(ValueError):
+        loaded.add_game(Game(id=6, title="6"))
+
+
+def test_old_visits_are_summarized(
+    tmp_dir: Path, database: Database, sharded_db: ShardedDatabase
+) -> None:
+    for db in (database, sharded_db):
+        for i in range(KEPT_VISITS + 2):
+            db.add_game_visit(db.get_game_from_id(3), 100 + i)
+            db.add_site_visit(200 + i)
+    sharded_db.save()
+    site = database.site
+    assert ShardedDatabase(tmp_dir / "db").to_database().site == site
+    assert site.games[2].old_visits is not None
+
+    assert sharded_db.drop_old_visits(1) == database.drop_old_visits(1)
+    sharded_db.save()
+    loaded = ShardedDatabase(tmp_dir / "db")
+    assert loaded.to_database().site == site
+    assert loaded.get_statistics() == database.get_statistics()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_updater_and_downloader(
+    tmp_dir: Path, fake_client: Client, testdata_directory: Path, workers: int
+) -> None:
+    db = ShardedDatabase(tmp_dir / "db", base_url="http://idontexist.net")
+    updater = Updater(client=fake_client, db=db)
+    updater.update_game_list()
+    updater.update_game_song_lists(max_count=3)
+    downloader = Downloader(client=fake_client, db=db, output_dir=tmp_dir)
+    downloader.download_brstm_files(max_count=10, workers=workers)
+
+    stats = ShardedDatabase(tmp_dir / "db").get_statistics()
+    assert (stats.games, stats.games_visited) == (3, 3)
+    assert (stats.songs, stats.songs_downloaded) == (5, 5)
+    assert (tmp_dir / "1726_3d_dot_game_heroes/32272_main_theme.brstm").exists()
@@ -0,0 +1,230 @@
+from pathlib import Path
+
+import pytest
+
+from smashdown.client import Client
+from smashdown.database import (
+    KEPT_VISITS,
+    Database,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    GameNotFound,
+    Site,
+    Song,
+    SongNotFound,
+)
+from smashdown.downloader import Downloader
+from smashdown.sqlite_database import ADDED_COLUMNS, SQLiteDatabase
+from smashdown.updater import Updater
+
+
+@pytest.fixture
+def database() -> Database:
+    return Database(
+        site=Site(
+            base_url="http://idontexist.net",
+            download_timestamps=[10, 20],
+            games=[
+                Game(id=1, title="1", download_timestamps=[1, 5]),
+                Game(
+                    id=2,
+                    title="2",
+                    songs=[
+                        Song(
+                            id=1,
+                            title="1",
+                            brstm_download_failure=DownloadFailure(
+                                timestamp=1, count=2, reason="status 404"
+                            ),
+                        ),
+                        Song(
+                            id=2,
+                            title="2",
+                            brstm_download_info=FileDownloadInfo(
+                                location=Path("foo"), timestamp=2, file_md5="md5"
+                            ),
+                        ),
+                        Song(id=3, title="3", is_deleted_from_site=True),
+                    ],
+                ),
+                Game(
+                    id=3,
+                    title="3",
+                    download_timestamps=[3, 2],
+                    songs=[Song(id=4, title="4")],
+                ),
+                Game(id=4, title="4"),
+                Game(id=5, title="5", is_deleted_from_site=True),
+            ],
+        )
+    )
+
+
+@pytest.fixture
+def sqlite_db(database: Database, tmp_dir: Path) -> SQLiteDatabase:
+    return SQLiteDatabase.build_from_database(tmp_dir / "db.sqlite", database)
+
+
+def test_conversion_round_trip(database: Database, sqlite_db: SQLiteDatabase) -> None:
+    assert sqlite_db.to_database().site == database.site
+
+
+def test_lookups(sqlite_db: SQLiteDatabase) -> None:
+    assert sqlite_db.get_game_from_id(3).songs[0].id == 4
+    assert sqlite_db.get_song_from_id(2).title == "2"
+    assert sqlite_db.get_game_from_song_id(2).id == 2
+    game, song = sqlite_db.get_song_from_downloaded_path(Path("foo"))
+    assert (game.id, song.id) == (2, 2)
+    with pytest.raises(GameNotFound):
+        sqlite_db.get_game_from_id(6)
+    with pytest.raises(SongNotFound):
+        sqlite_db.get_song_from_id(5)
+    with pytest.raises(SongNotFound):
+        sqlite_db.get_song_from_downloaded_path(Path("bar"))
+
+
+def test_get_games_by_last_checked(
+    database: Database, sqlite_db: SQLiteDatabase
+) -> None:
+    games = sqlite_db.get_games_by_last_checked(2)
+    assert [g.id for g in games] == [4, 2]
+    games = sqlite_db.get_games_by_last_checked(None)
+    assert [g.id for g in games] == [4, 2, 3, 1]
+    assert [g.id for g in games] == [
+        g.id for g in database.get_games_by_last_checked(None)
+    ]
+
+
+def test_visit_older_than_the_last_one(
+    database: Database, sqlite_db: SQLiteDatabase
+) -> None:
+    for db in (database, sqlite_db):
+        db.add_game_visit(db.get_game_from_id(1), 8)
+        # recorded late: the game is still last checked at 8
+        db.add_game_visit(db.get_game_from_id(1), 2)
+    assert sqlite_db.get_game_from_id(1).last_checked == 8
+    games = sqlite_db.get_games_by_last_checked(None)
+    assert [g.id for g in games] == [4, 2, 3, 1]
+    assert [g.id for g in games] == [
+        g.id for g in database.get_games_by_last_checked(None)
+    ]
+    assert sqlite_db.get_statistics() == database.get_statistics()
+
+
+def test_get_songs_with_no_brstm_downloaded(sqlite_db: SQLiteDatabase) -> None:
+    songs = sqlite_db.get_songs_with_no_brstm_downloaded(None)
+    assert {s.id for s in songs} == {1, 4}
+    assert len(sqlite_db.get_songs_with_no_brstm_downloaded(1)) == 1
+
+
+def test_get_statistics(database: Database, sqlite_db: SQLiteDatabase) -> None:
+    assert sqlite_db.get_statistics() == database.get_statistics()
+
+
+def test_changes_are_committed_on_save(
+    tmp_dir: Path, sqlite_db: SQLiteDatabase
+) -> None:
+    game = sqlite_db.get_game_from_id(4)
+    song = Song(id=5, title="5")
+    sqlite_db.add_game(Game(id=6, title="6"))
+    sqlite_db.add_song(game, song)
+    sqlite_db.set_song_deleted_from_site(sqlite_db.get_song_from_id(1), True)
+    sqlite_db.set_game_deleted_from_site(game, True)
+    sqlite_db.add_game_visit(game, 123)
+    sqlite_db.add_site_visit(456)
+    sqlite_db.set_brstm_download_info(
+        song, FileDownloadInfo(location=Path("bar"), timestamp=1, file_md5="md5")
+    )
+    sqlite_db.set_brstm_download_failure(sqlite_db.get_song_from_id(1), None)
+    sqlite_db.set_brstm_download_failure(
+        sqlite_db.get_song_from_id(4),
+        DownloadFailure(timestamp=3, count=1, reason="status 503"),
+    )
+    expected = sqlite_db.to_database().site
+    assert game == expected.games[3]
+    sqlite_db.save()
+    sqlite_db.close()
+
+    loaded = SQLiteDatabase(tmp_dir / "db.sqlite")
+    site = loaded.to_database().site
+    assert site == expected
+    assert site.download_timestamps == [10, 20, 456]
+    assert site.games[3].download_timestamps == [123]
+    assert site.games[3].is_deleted_from_site is True
+    assert site.games[5].id == 6
+    assert loaded.get_song_from_id(1).is_deleted_from_site is True
+    assert loaded.get_song_from_downloaded_path(Path("bar"))[1].id == 5
+    assert loaded.get_song_from_id(1).brstm_download_failure is None
+    assert loaded.get_song_from_id(4).brstm_download_failure == DownloadFailure(
+        timestamp=3, count=1, reason="status 503"
+    )
+
+
+def test_missing_columns_are_added(tmp_dir: Path, sqlite_db: SQLiteDatabase) -> None:
+    # a file created by the first version of the schema
+    sqlite_db._connection.execute("DROP INDEX songs_by_download_rank")
+    sqlite_db._connection.execute("DROP INDEX songs_by_download_key")
+    for table, columns in ADDED_COLUMNS.items():
+        for column in columns:
+            sqlite_db._connection.execute(
+                f"ALTER TABLE {table} DROP COLUMN {column[0]}"
+            )
+    sqlite_db.save()
+    sqlite_db.close()
+
+    loaded = SQLiteDatabase(tmp_dir / "db.sqlite")
+    assert loaded.get_song_from_id(1).brstm_download_failure is None
+    assert loaded.get_song_from_id(2).brstm_download_info is not None
+    songs = loaded.get_songs_with_no_brstm_downloaded(None)
+    assert {s.id for s in songs} == {1, 4}
+    assert loaded.to_database().site.old_visits is None
+
+
+def test_old_visits_are_summarized(
+    tmp_dir: Path, database: Database, sqlite_db: SQLiteDatabase
+) -> None:
+    for db in (database, sqlite_db):
+        for i in range(KEPT_VISITS + 2):
+            db.add_game_visit(db.get_game_from_id(3), 100 + i)
+            db.add_site_visit(200 + i)
+    site = database.site
+    assert sqlite_db.to_database().site == site
+    assert len(site.games[2].download_timestamps) == KEPT_VISITS
+    assert site.games[2].old_visits is not None
+    assert site.old_visits is not None
+
+    assert sqlite_db.drop_old_visits(1) == database.drop_old_visits(1)
+    assert site.games[0].download_timestamps == [5]
+    sqlite_db.compact()
+    sqlite_db.close()
+    assert SQLiteDatabase(tmp_dir / "db.sqlite").to_database().site == site
+
+
+def test_changes_are_rolled_back_without_save(
+    tmp_dir: Path, sqlite_db: SQLiteDatabase
+) -> None:
+    sqlite_db.add_game(Game(id=6, title="6"))
+    sqlite_db.close()
+
+    loaded = SQLiteDatabase(tmp_dir / "db.sqlite")
+    with pytest.raises(GameNotFound):
+        loaded.get_game_from_id(6)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_updater_and_downloader(
+    tmp_dir: Path, fake_client: Client, testdata_directory: Path, workers: int
+) -> None:
+    db = SQLiteDatabase(tmp_dir / "db.sqlite", base_url="http://idontexist.net")
+    updater = Updater(client=fake_client, db=db)
+    updater.update_game_list()
+    updater.update_game_song_lists(max_count=3)
+    downloader = Downloader(client=fake_client, db=db, output_dir=tmp_dir)
+    # the connection can only be used by the thread that created it
+    downloader.download_brstm_files(max_count=10, workers=workers)
+
+    stats = db.get_statistics()
+    assert (stats.games, stats.games_visited) == (3, 3)
+    assert (stats.songs, stats.songs_downloaded) == (5, 5)
+    assert (tmp_dir / "1726_3d_dot_game_heroes/32272_main_theme.brstm").exists()
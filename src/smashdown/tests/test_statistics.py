@@ -0,0 +1,106 @@
+import os
+from pathlib import Path
+
+from smashdown.database import (
+    Database,
+    DatabaseStatistics,
+    DownloadFailure,
+    FileDownloadInfo,
+    Game,
+    Song,
+    read_statistics,
+)
+from smashdown.sharded_database import ShardedDatabase
+from smashdown.sqlite_database import SQLiteDatabase
+from smashdown.updater import Updater
+
+from .conftest import FakeClient
+
+
+def _change(db: Database) -> None:
+    game = Game(id=1, title="1", songs=[Song(id=1, title="1")])
+    db.add_game(game)
+    db.add_song(game, Song(id=2, title="2"))
+    db.add_game_visit(game, 50)
+    db.add_game_visit(db.get_game_from_id(1726), 10)
+    db.add_game_visit(db.get_game_from_id(5063), 20)
+    db.set_game_deleted_from_site(db.get_game_from_id(1726), True)
+    db.set_song_deleted_from_site(db.get_song_from_id(2), True)
+    db.set_brstm_download_info(
+        db.get_song_from_id(1),
+        FileDownloadInfo(location=Path("1.brstm"), timestamp=1, file_md5="md5"),
+    )
+    db.set_brstm_download_failure(
+        db.get_song_from_id(96613),
+        DownloadFailure(timestamp=1, count=1, reason="status 404"),
+    )
+
+
+def test_statistics_are_maintained(fake_database: Database, tmp_dir: Path) -> None:
+    assert fake_database.get_statistics() == fake_database.compute_statistics()
+    _change(fake_database)
+    stats = fake_database.get_statistics()
+    assert stats == fake_database.compute_statistics()
+    assert stats == DatabaseStatistics(
+        games=4,
+        games_visited=3,
+        games_not_visited=1,
+        games_deleted_from_site=1,
+        songs=7,
+        songs_downloaded=1,
+        songs_not_downloaded=6,
+        songs_deleted_from_site=1,
+        songs_with_download_failure=1,
+        # the deleted games are not visited anymore: the oldest visit is the
+        # one of the games still on the site
+        game_oldest_visit=20,
+    )
+
+    sqlite_db = SQLiteDatabase.build_from_database(Path(":memory:"), fake_database)
+    assert sqlite_db.get_statistics() == stats
+    sharded_db = ShardedDatabase.build_from_database(tmp_dir / "db", fake_database)
+    assert sharded_db.get_statistics() == stats
+
+
+def test_oldest_visit_is_read_without_building_the_frontier(
+    fake_database: Database, tmp_dir: Path
+) -> None:
+    db_file = tmp_dir / "db.json"
+    _change(fake_database)
+    fake_database.with_output_file(db_file).save()
+    loaded = Database.build_from_file(db_file)
+    assert loaded.frontier is not None
+    assert loaded.get_statistics().game_oldest_visit == 20
+    assert loaded._frontier is None
+    loaded.add_game_visit(loaded.get_game_from_id(5063), 60)
+    assert loaded.get_statistics().game_oldest_visit == 50
+
+
+def test_statistics_are_saved(fake_database: Database, tmp_dir: Path) -> None:
+    db_file = tmp_dir / "db.json"
+    fake_database.with_output_file(db_file).save()
+    assert read_statistics(db_file) == fake_database.get_statistics()
+
+    fake_database.with_journal()
+    _change(fake_database)
+    fake_database.save()
+    stats = read_statistics(db_file)
+    assert stats == fake_database.compute_statistics()
+    loaded = Database.build_from_file(db_file)
+    assert loaded._statistics is not None
+    Updater(client=FakeClient(Path()), db=loaded).record_song_list(
+        loaded.get_game_from_id(1), [], 100
+    )
+    assert loaded.get_statistics() == loaded.compute_statistics()
+    assert loaded.get_statistics() != stats
+
+    # out of date once the database has changed
+    with db_file.open("ab") as fh:
+        fh.write(b"\n")
+    assert read_statistics(db_file) is None
+    loaded = Database.build_from_file(db_file)
+    assert loaded._statistics is None
+    assert loaded.get_statistics() == stats
+
+    os.remove(db_file.with_name("db.json.statistics"))
+    assert read_statistics(db_file) is None
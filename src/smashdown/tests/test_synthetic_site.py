@@ -0,0 +1,38 @@
+from collections.abc import Generator
+
+import pytest
+from typer.testing import CliRunner
+
+from benchmark import crawl
+from benchmark.site import SyntheticSite
+from smashdown.client import SmashClient
+
+
+@pytest.fixture
+def synthetic_site() -> Generator[SyntheticSite, None, None]:
+    site = SyntheticSite(game_count=20, songs_per_game=3, brstm_size=1000)
+    site.start()
+    yield site
+    site.stop()
+
+
+def test_synthetic_site(synthetic_site: SyntheticSite) -> None:
+    client = SmashClient(base_url=synthetic_site.base_url, limiter=None)
+    games = client.get_game_list()
+    assert [game.id for game in games] == list(range(1, 21))
+    assert sum(game.song_count for game in games) == synthetic_site.song_count
+    for game in games:
+        songs = client.get_song_list(game.id)
+        assert [(s.id, s.title) for s in songs] == synthetic_site.games[game.id].songs
+        assert len(songs) == game.song_count
+    assert 500 <= len(client.get_brstm_file(1)) <= 1500
+    assert synthetic_site.request_count == 22
+
+
+def test_crawl_benchmark() -> None:
+    result = CliRunner().invoke(
+        crawl.app,
+        ["--game-count", "5", "--download-count", "3", "--brstm-size", "1000"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "download-musics" in result.output
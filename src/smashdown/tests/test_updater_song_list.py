@@ -1,14 +1,15 @@
 import random
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import pytest
 
-from smashdown.client import Client
+from smashdown.client import Client, SongInfo
 from smashdown.database import Database, Game, Site, Song
 from smashdown.updater import Updater
 
-from .conftest import build_site_with_games_and_songs
+from .conftest import FakeClient, build_site_with_games_and_songs
 
 
 @pytest.mark.parametrize(
@@ -77,6 +78,64 @@ def test_song_list_updater(
             assert song.is_deleted_from_site == (song.id in removed)
 
 
+@dataclass
+class SlowClient(FakeClient):
+    delays: dict[int, float] = field(default_factory=dict)
+    failing_game_ids: set[int] = field(default_factory=set)
+
+    def get_song_list(self, game_id: int, conditional: bool = False) -> list[SongInfo]:
+        time.sleep(self.delays.get(game_id, 0.0))
+        if game_id in self.failing_game_ids:
+            raise ConnectionError
+        return super().get_song_list(game_id)
+
+
+SOURCE = [
+    (1726, [96613, 93397, 111]),
+    (4126, [222, 77724, 96008]),
+    (5063, [333]),
+]
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_song_list_updater_workers_same_result_as_sequential(
+    testdata_directory: Path, workers: int
+) -> None:
+    # the games are visited in the order 5063, 4126, 1726: the first ones are
+    # the slowest, so that they are received in the reverse order
+    client = SlowClient(testdata_dir=testdata_directory, delays={5063: 0.1, 4126: 0.05})
+    sites = []
+    for run_workers in [1, workers]:
+        site = build_site_with_games_and_songs(testdata_directory, SOURCE)
+        updater = Updater(
+            client=client, db=Database(site=site), clock=lambda: 1000, save_batch_size=2
+        )
+        updater.update_game_song_lists(max_count=10, workers=run_workers)
+        sites.append(site)
+    assert sites[0] == sites[1]
+    assert [g.download_timestamps for g in sites[1].games] == [[1000]] * 3
+    assert [s.id for s in sites[1].games[1].songs] == [222, 77724, 96008]
+    assert sites[1].games[1].songs[0].is_deleted_from_site is True
+
+
+def test_song_list_updater_workers_failure(
+    testdata_directory: Path, tmp_dir: Path
+) -> None:
+    client = SlowClient(
+        testdata_dir=testdata_directory, delays={5063: 0.1}, failing_game_ids={4126}
+    )
+    site = build_site_with_games_and_songs(testdata_directory, SOURCE)
+    db = Database(site=site).with_output_file(tmp_dir / "db.json")
+    updater = Updater(client=client, db=db, clock=lambda: 1000)
+    with pytest.raises(ConnectionError):
+        updater.update_game_song_lists(max_count=10, workers=3)
+
+    # like a sequential update, the games before the failure are saved, and
+    # the games after are not updated even if their page was received
+    saved = Database.build_from_file(tmp_dir / "db.json")
+    assert [g.download_timestamps for g in saved.site.games] == [[], [], [1000]]
+
+
 def test_song_list_updater__reappearing_removed_songs_are_not_marked_as_removed(
     testdata_directory: Path,
     fake_client: Client,
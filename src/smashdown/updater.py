@@ -1,91 +1,201 @@
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from random import Random
+from typing import Callable
 
 from smashdown.client import Client, GameInfo, SongInfo
-from smashdown.database import Database, Game, Song
+from smashdown.database import DatabaseBackend, Game, Song
+from smashdown.http_cache import PageNotModified
+from smashdown.scheduler import RevisitScheduler
+
+
+def merge_game_list(
+    db: DatabaseBackend, game_list: list[GameInfo], timestamp: int
+) -> None:
+    """Merge the game list of the home page into the database, and record the
+    visit of the site at `timestamp`."""
+    games_on_site: dict[int, GameInfo] = {game.id: game for game in game_list}
+    games_in_db: dict[int, Game] = {game.id: game for game in db.get_games()}
+
+    logging.debug("Looking for games removed from website.")
+    for game_in_db in games_in_db.values():
+        if game_in_db.id not in games_on_site:
+            logging.info(
+                f"Game {game_in_db.id} ({game_in_db.title}) has been removed from website."
+            )
+            db.set_game_deleted_from_site(game_in_db, True)
+
+    logging.debug("Looking for games added.")
+    for game_on_site in games_on_site.values():
+        if game_on_site.id not in games_in_db:
+            new_game = Game(
+                id=game_on_site.id,
+                title=game_on_site.title,
+            )
+            db.add_game(new_game)
+            logging.info(f"Game {new_game.id} ({new_game.title}) has been added.")
+        else:
+            # the song may have re-appeared, so we update:
+            db.set_game_deleted_from_site(games_in_db[game_on_site.id], False)
+
+    db.add_site_visit(timestamp)
+
+
+def merge_song_list(
+    db: DatabaseBackend, game: Game, song_list: list[SongInfo], timestamp: int
+) -> None:
+    """Merge the song list of the game page into the `game`, and record the
+    visit of the game at `timestamp`."""
+    songs_on_site: dict[int, SongInfo] = {song.id: song for song in song_list}
+    songs_in_db: dict[int, Song] = {song.id: song for song in game.songs}
+
+    logging.debug("Looking for songs removed from website.")
+    for song_in_db in songs_in_db.values():
+        if song_in_db.id not in songs_on_site:
+            logging.info(
+                f"Song {song_in_db.id} ({song_in_db.title}) has been removed from website."
+            )
+            db.set_song_deleted_from_site(song_in_db, True)
+
+    logging.debug("Looking for songs added.")
+    for song_on_site in songs_on_site.values():
+        if song_on_site.id not in songs_in_db:
+            new_song = Song(
+                id=song_on_site.id,
+                title=song_on_site.title,
+                added_timestamp=timestamp,
+            )
+            db.add_song(game, new_song)
+            logging.info(f"Song {new_song.id} ({new_song.title}) has been added.")
+        else:
+            # the song may have re-appeared, so we update:
+            db.set_song_deleted_from_site(songs_in_db[song_on_site.id], False)
+
+    db.add_game_visit(game, timestamp)
 
 
 @dataclass
 class Updater:
     client: Client
-    db: Database
+    db: DatabaseBackend
     rand: Random = field(default_factory=Random)
+    clock: Callable[[], float] = time.time
+    save_batch_size: int = 20
 
     def update_game_list(self) -> None:
-        game_list = self.client.get_game_list()
-        games_on_site: dict[int, GameInfo] = {game.id: game for game in game_list}
-        games_in_db: dict[int, Game] = {game.id: game for game in self.db.site.games}
-
-        logging.debug("Looking for games removed from website.")
-        for game_in_db in games_in_db.values():
-            if game_in_db.id not in games_on_site:
-                logging.info(
-                    f"Game {game_in_db.id} ({game_in_db.title}) has been removed from website."
-                )
-                game_in_db.is_deleted_from_site = True
-
-        logging.debug("Looking for games added.")
-        for game_on_site in games_on_site.values():
-            if game_on_site.id not in games_in_db:
-                new_game = Game(
-                    id=game_on_site.id,
-                    title=game_on_site.title,
-                )
-                self.db.site.games.append(new_game)
-                logging.info(f"Game {new_game.id} ({new_game.title}) has been added.")
-            else:
-                # the song may have re-appeared, so we update:
-                games_in_db[game_on_site.id].is_deleted_from_site = False
-
-        self.db.site.download_timestamps.append(int(time.time()))
+        game_list, timestamp = self.fetch_game_list()
+        self.record_game_list(game_list, timestamp)
         self.db.save()
 
     def update_game_song_list(self, game_id: int) -> None:
         game = self.db.get_game_from_id(game_id)
-        song_list = self.client.get_song_list(game_id)
-        songs_on_site: dict[int, SongInfo] = {song.id: song for song in song_list}
-        songs_in_db: dict[int, Song] = {song.id: song for song in game.songs}
-
-        logging.debug("Looking for songs removed from website.")
-        for song_in_db in songs_in_db.values():
-            if song_in_db.id not in songs_on_site:
-                logging.info(
-                    f"Song {song_in_db.id} ({song_in_db.title}) has been removed from website."
-                )
-                song_in_db.is_deleted_from_site = True
-
-        logging.debug("Looking for songs added.")
-        for song_on_site in songs_on_site.values():
-            if song_on_site.id not in songs_in_db:
-                new_song = Song(
-                    id=song_on_site.id,
-                    title=song_on_site.title,
-                )
-                game.songs.append(new_song)
-                logging.info(f"Song {new_song.id} ({new_song.title}) has been added.")
-            else:
-                # the song may have re-appeared, so we update:
-                songs_in_db[song_on_site.id].is_deleted_from_site = False
-
-        game.download_timestamps.append(int(time.time()))
+        song_list, timestamp = self.fetch_song_list(game_id)
+        self.record_song_list(game, song_list, timestamp)
         self.db.save()
 
-    def update_game_song_lists(self, max_count: int) -> None:
-        for game in self.db.get_games_by_last_checked(max_count):
-            self.update_game_song_list(game.id)
-
-    def update_game_song_lists_by_using_home_page(self, max_count: int) -> None:
+    def update_game_song_lists(self, max_count: int, workers: int = 1) -> None:
+        games = self.db.get_games_by_last_checked(max_count)
+        self._update_game_song_lists([game.id for game in games], workers)
+
+    def update_game_song_lists_by_change_rate(
+        self, max_count: int, workers: int = 1
+    ) -> None:
+        scheduler = RevisitScheduler(clock=self.clock)
+        games = scheduler.get_games_to_visit(
+            self.db.get_games_by_last_checked(None), max_count
+        )
+        self._update_game_song_lists([game.id for game in games], workers)
+
+    def update_game_song_lists_by_using_home_page(
+        self, max_count: int, workers: int = 1
+    ) -> None:
         games = self._get_games_with_fewer_songs_than_in_database(max_count)
-        for game in games:
-            self.update_game_song_list(game.id)
+        self._update_game_song_lists([game.id for game in games], workers)
+
+    def _update_game_song_lists(self, game_ids: list[int], workers: int) -> None:
+        """Update the song lists of the games, in order.
+
+        With several `workers`, the game pages are fetched and parsed by a
+        pool of threads, but the song lists are merged by the calling thread
+        in the order of `game_ids`, each with the timestamp of its fetch, so
+        that the result is the same as a sequential update.  The database is
+        saved every `save_batch_size` games.
+        """
+        if workers <= 1:
+            for game_id in game_ids:
+                self.update_game_song_list(game_id)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.fetch_song_list, game_id) for game_id in game_ids
+            ]
+            unsaved_count = 0
+            try:
+                for game_id, future in zip(game_ids, futures):
+                    song_list, timestamp = future.result()
+                    game = self.db.get_game_from_id(game_id)
+                    self.record_song_list(game, song_list, timestamp)
+                    unsaved_count += 1
+                    if unsaved_count >= self.save_batch_size:
+                        self.db.save()
+                        unsaved_count = 0
+            except Exception:
+                # like a sequential update, stop at the first failure
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                if unsaved_count:
+                    self.db.save()
+
+    def fetch_game_list(self) -> tuple[list[GameInfo] | None, int]:
+        # doesn't use the database: may be called by a worker.  The game list
+        # is None if the home page hasn't been modified.
+        try:
+            game_list: list[GameInfo] | None = self.client.get_game_list(
+                conditional=True
+            )
+        except PageNotModified:
+            game_list = None
+        return game_list, int(self.clock())
+
+    def record_game_list(
+        self, game_list: list[GameInfo] | None, timestamp: int
+    ) -> None:
+        if game_list is None:
+            # nothing to merge, but the site has been visited
+            self.db.add_site_visit(timestamp)
+        else:
+            merge_game_list(self.db, game_list, timestamp)
+
+    def fetch_song_list(self, game_id: int) -> tuple[list[SongInfo] | None, int]:
+        # doesn't use the database: called by the workers.  The song list is
+        # None if the game page hasn't been modified.
+        try:
+            song_list: list[SongInfo] | None = self.client.get_song_list(
+                game_id, conditional=True
+            )
+        except PageNotModified:
+            song_list = None
+        return song_list, int(self.clock())
+
+    def record_song_list(
+        self, game: Game, song_list: list[SongInfo] | None, timestamp: int
+    ) -> None:
+        if song_list is None:
+            # nothing to merge, but the game has been visited
+            self.db.add_game_visit(game, timestamp)
+        else:
+            merge_song_list(self.db, game, song_list, timestamp)
 
     def _get_games_with_fewer_songs_than_in_database(
         self, max_count: int
     ) -> list[GameInfo]:
         game_list = self.client.get_game_list()
-        games_in_db: dict[int, Game] = {game.id: game for game in self.db.site.games}
+        games_in_db: dict[int, Game] = {game.id: game for game in self.db.get_games()}
 
         games_with_fewer_songs_than_expected: list[GameInfo] = []
         for game in game_list:
@@ -8,5 +8,9 @@ def url_parser(value: str) -> str:
     return str(HttpUrl(value))
 
 
-def compute_md5_hash(file: Path) -> str:
-    return hashlib.md5(file.read_bytes()).hexdigest()
+def compute_md5_hash(file: Path, chunk_size: int = 1024 * 1024) -> str:
+    md5 = hashlib.md5()
+    with file.open("rb") as fh:
+        while chunk := fh.read(chunk_size):
+            md5.update(chunk)
+    return md5.hexdigest()